@@ -0,0 +1,212 @@
+"""
+Texture atlas.
+
+Packs many small textures into a few large pages, so objects with different
+textures share one GL texture and draw without a bind in between. A mesh is
+moved onto its texture's tile by remapping its uvs at load time (remap_uvs).
+
+Tiles are placed by a skyline bottom-left packer. Every tile is surrounded by
+PADDING pixels of its own edge pixels, and tiles start on multiples of
+PADDING. Pages only get mip levels down to the one where that padding is a
+single pixel, so filtering never mixes neighbouring tiles. The alignment also
+keeps BC blocks from straddling two tiles.
+
+Textures too big for a page keep their own texture, and so do meshes whose
+uvs leave 0..1: a tile can't repeat.
+
+The layout is cached in .py3d_cache/atlas, keyed by the source images' content
+hashes. The pages themselves go through the baked texture cache (see
+texture_cache.py), so a cached atlas loads without decoding any image.
+"""
+import hashlib
+import json
+import os
+import numpy as np
+from OpenGL.GL import glDeleteTextures
+import texture_cache
+from textures import upload_texture
+
+CACHE_DIR = os.path.join(".py3d_cache", "atlas")
+PAGE_SIZE = 4096
+PADDING = 8  # pixels around every tile, also the tile alignment
+MAX_LEVELS = 4  # mip levels 0-3, PADDING is 1 pixel at level 3
+FORMAT_VERSION = 1
+UV_TOLERANCE = 1e-4
+
+
+def _align(value, alignment=PADDING):
+    return -(-value // alignment) * alignment
+
+
+def pack_skyline(sizes, page_size=PAGE_SIZE, padding=PADDING):
+    """
+    Place rectangles with a skyline bottom-left packer, opening new pages as needed.
+    :param sizes: {name: (width, height)}, each must fit a page with its padding
+    :return: (list of (page width, page height), {name: (page, x, y)} tile origins inside the padding)
+    """
+    pages = []  # skylines, [[x, y, width], ...] from left to right
+    placed = {}
+    # Tallest first, the usual order for skyline packers
+    for name in sorted(sizes, key=lambda n: (-sizes[n][1], -sizes[n][0], n)):
+        width, height = (_align(v) + 2 * padding for v in sizes[name])
+        best = None
+        for page, skyline in enumerate(pages):
+            for i, (x, _, _) in enumerate(skyline):
+                if x + width > page_size:
+                    break
+                # Resting height: the highest segment under the rectangle
+                y, right, j = 0, x + width, i
+                while j < len(skyline) and skyline[j][0] < right:
+                    y = max(y, skyline[j][1])
+                    j += 1
+                if y + height <= page_size and (best is None or (y, x) < best[1:]):
+                    best = (page, y, x)
+            if best is not None:
+                break
+        if best is None:
+            pages.append([[0, 0, page_size]])
+            best = (len(pages) - 1, 0, 0)
+        page, y, x = best
+        _raise_skyline(pages[page], x, y + height, width)
+        placed[name] = (page, x + padding, y + padding)
+
+    # Pages shrink to what they hold
+    extents = [[0, 0] for _ in pages]
+    for name, (page, x, y) in placed.items():
+        extents[page][0] = max(extents[page][0], x + _align(sizes[name][0]) + padding)
+        extents[page][1] = max(extents[page][1], y + _align(sizes[name][1]) + padding)
+    return [tuple(extent) for extent in extents], placed
+
+
+def _raise_skyline(skyline, x, top, width):
+    """Put a segment at height top over [x, x + width) and merge neighbours of equal height"""
+    right = x + width
+    pieces = []
+    for sx, sy, sw in skyline:
+        if sx + sw <= x or sx >= right:
+            pieces.append([sx, sy, sw])
+            continue
+        if sx < x:
+            pieces.append([sx, sy, x - sx])
+        if sx + sw > right:
+            pieces.append([right, sy, sx + sw - right])
+    pieces.append([x, top, width])
+    pieces.sort()
+    skyline[:] = []
+    for piece in pieces:
+        if skyline and skyline[-1][1] == piece[1]:
+            skyline[-1][2] += piece[2]
+        else:
+            skyline.append(piece)
+
+
+def remap_uvs(uvs, rect):
+    """Move 0..1 uvs onto a tile, rect is (u offset, v offset, u scale, v scale)"""
+    u0, v0, su, sv = rect
+    uvs = np.clip(np.asarray(uvs, dtype=np.float32), 0.0, 1.0)
+    return uvs * np.array([su, sv], dtype=np.float32) + np.array([u0, v0], dtype=np.float32)
+
+
+def _compose_page(size, tiles, padding=PADDING):
+    """
+    Paste tiles into one page, each padded with copies of its edge pixels.
+    :param tiles: [(x, y, path), ...]
+    :return: PIL RGBA image, bottom row first
+    """
+    from PIL import Image
+    width, height = size
+    page = np.zeros((height, width, 4), dtype=np.uint8)
+    page[..., 3] = 255  # unused space, never sampled, kept opaque so opaque atlases can use BC1
+    for x, y, path in tiles:
+        with Image.open(path) as image:
+            pixels = np.asarray(image.transpose(Image.FLIP_TOP_BOTTOM).convert("RGBA"))
+        h, w = pixels.shape[:2]
+        padded = np.pad(pixels, ((padding, padding + _align(h) - h), (padding, padding + _align(w) - w), (0, 0)),
+                        mode="edge")
+        page[y - padding:y - padding + len(padded), x - padding:x - padding + padded.shape[1]] = padded
+    return Image.fromarray(page, "RGBA")
+
+
+def _layout_key(digests, page_size):
+    key = hashlib.blake2b(digest_size=16)
+    key.update(json.dumps([sorted(digests.items()), page_size, PADDING, MAX_LEVELS, FORMAT_VERSION]).encode())
+    return key.hexdigest()
+
+
+def load_layout(paths, page_size=PAGE_SIZE, cache_dir=CACHE_DIR):
+    """
+    Pack the images, or read the cached layout of the same images.
+    :param paths: {name: image path}
+    :return: (key, layout) with layout = {"pages": [[width, height], ...], "tiles": {name: [page, x, y, width, height]}}
+    """
+    digests = {name: texture_cache.file_digest(path) for name, path in paths.items()}
+    key = _layout_key(digests, page_size)
+    cached = os.path.join(cache_dir, key + ".json")
+    try:
+        with open(cached) as f:
+            return key, json.load(f)
+    except (OSError, ValueError):
+        pass
+
+    from PIL import Image
+    sizes = {}
+    for name, path in paths.items():
+        with Image.open(path) as image:  # only reads the header
+            if max(_align(v) + 2 * PADDING for v in image.size) <= page_size:
+                sizes[name] = image.size
+    pages, placed = pack_skyline(sizes, page_size)
+    layout = {"pages": [list(page) for page in pages],
+              "tiles": {name: [page, x, y, *sizes[name]] for name, (page, x, y) in placed.items()}}
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp = f"{cached}.{os.getpid()}.tmp"
+        with open(tmp, 'w') as f:
+            json.dump(layout, f)
+        os.replace(tmp, cached)
+    except OSError as e:
+        print(f"Could not write atlas cache: {e}")
+    return key, layout
+
+
+class TextureAtlas:
+    def __init__(self, paths, compression=True, texture_cache_dir=texture_cache.CACHE_DIR, page_size=PAGE_SIZE):
+        """
+        Pack and upload the textures, needs a GL context.
+        :param paths: {name: image path}, textures that are too big are left out (see place())
+        :param compression: Block-compress the pages, like TextureManager.use_compression()
+        :param texture_cache_dir: Where baked pages are cached, None to compose them every time
+        """
+        key, layout = load_layout(paths, page_size)
+        self.pages = []  # GL textures
+        for index, size in enumerate(layout["pages"]):
+            tiles = [(x, y, paths[name]) for name, (page, x, y, _, _) in layout["tiles"].items() if page == index]
+            baked = texture_cache.load_baked(
+                texture_cache.cache_key(f"atlas-{key}-{index}", compression),
+                lambda: texture_cache.bake_image(_compose_page(size, tiles), compression, MAX_LEVELS),
+                texture_cache_dir)
+            self.pages.append(upload_texture(baked))
+
+        # name -> (page texture, (u offset, v offset, u scale, v scale))
+        self.tiles = {}
+        for name, (page, x, y, width, height) in layout["tiles"].items():
+            page_width, page_height = layout["pages"][page]
+            self.tiles[name] = (self.pages[page], (x / page_width, y / page_height,
+                                                   width / page_width, height / page_height))
+
+    def place(self, name, *uvs):
+        """
+        Where meshes textured with name end up.
+        :param uvs: Texture coordinates of the meshes, they must all stay within 0..1.
+        :return: (page texture, rect for remap_uvs), or None if they have to keep their own texture
+        """
+        if name not in self.tiles:
+            return None
+        for coordinates in uvs:
+            if len(coordinates) and (coordinates.min() < -UV_TOLERANCE or coordinates.max() > 1 + UV_TOLERANCE):
+                return None  # repeats the texture
+        return self.tiles[name]
+
+    def delete(self):
+        for texture in self.pages:
+            glDeleteTextures(1, [texture])
+        self.pages = []
@@ -0,0 +1,113 @@
+"""
+Deterministic benchmark suite.
+
+Every scene is loaded, uploaded and then rendered offscreen for a fixed number of
+frames along a scripted camera path, with no frame limiter and no vsync. Each
+frame ends with glFinish(), so frame times measure the GPU work and not just how
+fast commands are queued. The results are written as JSON, which makes render
+paths, machines and releases comparable run to run.
+"""
+import json
+import math
+import platform
+import sys
+import time
+from OpenGL.GL import glFinish, glGetString, GL_RENDERER, GL_VENDOR, GL_VERSION
+
+# Bundled objects, the sample .obj and generated spheres of increasing size
+SCENES = [
+    "cube",
+    "prism",
+    "octahedron",
+    "diamond",
+    "sphere",
+    "blahaj.obj",
+    "sphere:lat=500,long=500",
+    "sphere:lat=1000,long=1000",
+]
+
+
+def camera_path(frame, frames):
+    """(angle_x, angle_y) at a frame, one full turn around the object with a slow nod"""
+    t = frame / frames
+    return 30.0 * math.sin(2 * math.pi * t), 180.0 + 360.0 * t
+
+
+def percentile(sorted_samples, p):
+    """Linearly interpolated percentile of already sorted samples"""
+    if not sorted_samples:
+        return 0.0
+    k = (len(sorted_samples) - 1) * p / 100.0
+    lo = math.floor(k)
+    hi = min(lo + 1, len(sorted_samples) - 1)
+    return sorted_samples[lo] + (sorted_samples[hi] - sorted_samples[lo]) * (k - lo)
+
+
+def peak_rss_bytes():
+    """Peak resident set size of this process so far, None where it can't be read"""
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024  # macOS reports bytes, Linux KiB
+
+
+def time_frames(draw_frame, frames, warmup=0):
+    """
+    Call draw_frame(frame, frames) warmup + frames times.
+    :return: Frame times in seconds of the measured (non-warmup) frames.
+    """
+    times = []
+    for i in range(warmup + frames):
+        start = time.perf_counter()
+        draw_frame(max(i - warmup, 0), frames)
+        glFinish()
+        if i >= warmup:
+            times.append(time.perf_counter() - start)
+    return times
+
+
+def summarize(scene, render_path, triangles, load_time, upload_time, frame_times):
+    ordered = sorted(frame_times)
+    total = sum(frame_times)
+    peak = peak_rss_bytes()
+    return {
+        "scene": scene,
+        "render_path": render_path,
+        "triangles": triangles,
+        "load_ms": load_time * 1000.0,
+        "upload_ms": upload_time * 1000.0,
+        "frames": len(frame_times),
+        "frame_ms": {
+            "mean": total / max(len(frame_times), 1) * 1000.0,
+            "p50": percentile(ordered, 50) * 1000.0,
+            "p95": percentile(ordered, 95) * 1000.0,
+            "p99": percentile(ordered, 99) * 1000.0,
+            "max": (ordered[-1] if ordered else 0.0) * 1000.0,
+        },
+        "triangles_per_second": triangles * len(frame_times) / total if total else 0.0,
+        # High-water mark of the whole process, so it only ever grows from scene to scene
+        "peak_rss_mb": peak / (1024 * 1024) if peak is not None else None,
+    }
+
+
+def system_info():
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "gl_renderer": glGetString(GL_RENDERER).decode(),
+        "gl_vendor": glGetString(GL_VENDOR).decode(),
+        "gl_version": glGetString(GL_VERSION).decode(),
+    }
+
+
+def write_report(report, path=None):
+    """Write the report as JSON to path, or to stdout"""
+    text = json.dumps(report, indent=2)
+    if path:
+        with open(path, "w") as f:
+            f.write(text + "\n")
+        print(f"Benchmark report written to {path}")
+    else:
+        print(text)
@@ -0,0 +1,121 @@
+"""
+Orbit camera.
+
+One object owns everything that shapes the view: projection mode, fov, aspect,
+near/far planes and the orbit (pan, zoom, rotation around the object). Its
+matrices, their GL-layout copies and the frustum planes are built lazily and
+cached. Changing an input only marks them stale, so a still camera costs no
+matrix math at all, and every consumer (GL state, the core renderer, culling,
+LOD selection, scenes, the overlay) reads the same matrices.
+
+The aspect ratio is meant to be set from the real viewport size, see resize().
+"""
+from OpenGL.GL import glMatrixMode, glLoadMatrixf, GL_PROJECTION, GL_MODELVIEW
+from culling import extract_planes
+from transforms import NEAR, FAR, projection_matrix, model_matrix, gl_matrix
+
+MODE_NAMES = ["Perspective", "Orthographic", "Isometric", "Oblique", "Fisheye"]
+
+
+def _projection_input(name):
+    """Property that marks the projection stale when its value changes"""
+    attribute = "_" + name
+
+    def get(self):
+        return getattr(self, attribute)
+
+    def set(self, value):
+        if value != getattr(self, attribute):
+            setattr(self, attribute, value)
+            self._projection = None
+            self._planes = None
+            self.version += 1
+    return property(get, set)
+
+
+class Camera:
+    fov = _projection_input("fov")
+    aspect = _projection_input("aspect")
+    near = _projection_input("near")
+    far = _projection_input("far")
+    mode = _projection_input("mode")  # 0 = Perspective, 1 = Ortho, 2 = Isometric, 3 = Oblique, 4 = Fisheye
+    distance = _projection_input("distance")
+
+    def __init__(self, fov=60, aspect=1024 / 768, near=NEAR, far=FAR, mode=0, distance=5.0):
+        self.version = 0  # bumped whenever an input changes
+        self._fov, self._aspect, self._near, self._far = fov, aspect, near, far
+        self._mode, self._distance = mode, distance
+        self._orbit = ((0.0, 0.0, 0.0), 1.0, 0.0, 0.0)
+        self._projection = self._view = self._planes = None
+        self._gl_projection = self._gl_view = None
+        self._loaded_version = None
+
+    def resize(self, width, height):
+        """Follow the viewport, call with the drawable size on every resize"""
+        self.aspect = width / max(height, 1)
+
+    def orbit(self, pan=(0.0, 0.0, 0.0), zoom=1.0, angle_x=0.0, angle_y=0.0):
+        """Place the object: pan, then zoom, then rotate around x and y (degrees)"""
+        orbit = (tuple(pan), zoom, angle_x, angle_y)
+        if orbit != self._orbit:
+            self._orbit = orbit
+            self._view = None
+            self._planes = None
+            self.version += 1
+
+    @property
+    def mode_name(self):
+        return MODE_NAMES[self.mode]
+
+    def _update(self):
+        """Rebuild whichever matrices are stale"""
+        if self._projection is None:
+            self._projection = projection_matrix(self._mode, self._aspect, self._distance, self._fov,
+                                                 self._near, self._far)
+            self._gl_projection = gl_matrix(self._projection)
+        if self._view is None:
+            self._view = model_matrix(*self._orbit)
+            self._gl_view = gl_matrix(self._view)
+
+    @property
+    def projection(self):
+        """Row-major projection matrix"""
+        self._update()
+        return self._projection
+
+    @property
+    def view(self):
+        """Row-major modelview matrix of the orbit"""
+        self._update()
+        return self._view
+
+    @property
+    def gl_projection(self):
+        """Column-major float32, as glLoadMatrixf takes and glGetFloatv returns"""
+        self._update()
+        return self._gl_projection
+
+    @property
+    def gl_view(self):
+        self._update()
+        return self._gl_view
+
+    @property
+    def planes(self):
+        """Frustum planes in object space, see culling.extract_planes"""
+        if self._planes is None:
+            self._planes = extract_planes(self.gl_projection, self.gl_view)
+        return self._planes
+
+    def load(self):
+        """
+        Put the matrices into the fixed-function stacks, only when they changed since the last load.
+        Anything else touching the stacks has to push/pop around it.
+        """
+        if self._loaded_version == self.version:
+            return
+        glMatrixMode(GL_PROJECTION)
+        glLoadMatrixf(self.gl_projection)
+        glMatrixMode(GL_MODELVIEW)
+        glLoadMatrixf(self.gl_view)
+        self._loaded_version = self.version
@@ -0,0 +1,150 @@
+"""
+OpenGL 3.3 core profile renderer.
+
+No fixed-function state at all: the projection and modelview matrices come from
+transforms.py and are uploaded together as one uniform block per frame, and
+texturing is done by a small shader. Each mesh keeps its vertex layout in a
+vertex array object, so drawing it is a bind and one glDrawElements. A frame is
+about half a dozen GL calls however the view is set up.
+
+The HUD is drawn by a second tiny shader that makes its quad from gl_VertexID,
+so it needs no vertex buffer either.
+"""
+import ctypes
+import numpy as np
+from OpenGL.GL import *
+from OpenGL.GL.shaders import compileShader
+from transforms import gl_matrix
+from vbo import MeshBuffer, VERTEX_STRIDE
+
+POSITION_ATTRIBUTE = 0
+UV_ATTRIBUTE = 1
+TRANSFORMS_BINDING = 0  # uniform buffer binding point of the Transforms block
+
+VERTEX_SHADER = """
+#version 330 core
+layout(location = 0) in vec3 position;
+layout(location = 1) in vec2 uv;
+
+layout(std140) uniform Transforms {
+    mat4 projection;
+    mat4 modelview;
+};
+
+out vec2 frag_uv;
+
+void main() {
+    gl_Position = projection * modelview * vec4(position, 1.0);
+    frag_uv = uv;
+}
+"""
+
+FRAGMENT_SHADER = """
+#version 330 core
+uniform sampler2D texture0;
+in vec2 frag_uv;
+out vec4 color;
+
+void main() {
+    color = texture(texture0, frag_uv);
+}
+"""
+
+OVERLAY_VERTEX_SHADER = """
+#version 330 core
+uniform vec4 rect;  // top-left and bottom-right corner in clip space
+out vec2 frag_uv;
+
+void main() {
+    vec2 corner = vec2(gl_VertexID & 1, gl_VertexID >> 1);
+    frag_uv = vec2(corner.x, 1.0 - corner.y);
+    gl_Position = vec4(mix(rect.xy, rect.zw, corner), 0.0, 1.0);
+}
+"""
+
+
+def _link_program(vertex_source, fragment_source):
+    program = glCreateProgram()
+    shaders = [compileShader(source, kind) for source, kind in
+               ((vertex_source, GL_VERTEX_SHADER), (fragment_source, GL_FRAGMENT_SHADER))]
+    for shader in shaders:
+        glAttachShader(program, shader)
+    glLinkProgram(program)
+    if not glGetProgramiv(program, GL_LINK_STATUS):
+        raise RuntimeError(glGetProgramInfoLog(program).decode())
+    for shader in shaders:
+        glDeleteShader(shader)
+    return program
+
+
+class CoreMesh:
+    """A MeshBuffer plus the vertex array object describing its layout"""
+
+    def __init__(self, positions, uvs, indices, stream=False):
+        # Bound first, core profiles have no default VAO to hold the element buffer binding
+        self.vao = glGenVertexArrays(1)
+        glBindVertexArray(self.vao)
+        self.buffer = MeshBuffer(positions, uvs, indices, stream)
+        glBindBuffer(GL_ARRAY_BUFFER, self.buffer.vbo)
+        glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, self.buffer.ebo)  # recorded in the VAO
+        glEnableVertexAttribArray(POSITION_ATTRIBUTE)
+        glVertexAttribPointer(POSITION_ATTRIBUTE, 3, GL_FLOAT, GL_FALSE, VERTEX_STRIDE, ctypes.c_void_p(0))
+        glEnableVertexAttribArray(UV_ATTRIBUTE)
+        glVertexAttribPointer(UV_ATTRIBUTE, 2, GL_FLOAT, GL_FALSE, VERTEX_STRIDE, ctypes.c_void_p(12))
+        glBindVertexArray(0)
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+
+    def draw(self):
+        if not self.buffer.drawable:
+            return  # streaming, nothing uploaded yet
+        glBindVertexArray(self.vao)
+        glDrawElements(GL_TRIANGLES, self.buffer.drawable, GL_UNSIGNED_INT, ctypes.c_void_p(0))
+
+    def delete(self):
+        glDeleteVertexArrays(1, [self.vao])
+        self.buffer.delete()
+
+
+class CoreRenderer:
+    def __init__(self):
+        self.program = _link_program(VERTEX_SHADER, FRAGMENT_SHADER)
+        glUniformBlockBinding(self.program, glGetUniformBlockIndex(self.program, "Transforms"), TRANSFORMS_BINDING)
+
+        # projection + modelview, 2 column-major mat4s
+        self.transforms = np.zeros((2, 4, 4), dtype=np.float32)
+        self.uniform_buffer = glGenBuffers(1)
+        glBindBuffer(GL_UNIFORM_BUFFER, self.uniform_buffer)
+        glBufferData(GL_UNIFORM_BUFFER, self.transforms.nbytes, None, GL_DYNAMIC_DRAW)
+        glBindBufferBase(GL_UNIFORM_BUFFER, TRANSFORMS_BINDING, self.uniform_buffer)
+
+        self.overlay_program = _link_program(OVERLAY_VERTEX_SHADER, FRAGMENT_SHADER)
+        self.overlay_rect = glGetUniformLocation(self.overlay_program, "rect")
+        self.empty_vao = glGenVertexArrays(1)  # core profile draws always need one bound
+
+    def begin(self, projection, modelview):
+        """Use the mesh shader with these (NumPy, row-major) matrices, one buffer upload"""
+        self.transforms[0] = gl_matrix(projection)
+        self.transforms[1] = gl_matrix(modelview)
+        glUseProgram(self.program)
+        glBindBuffer(GL_UNIFORM_BUFFER, self.uniform_buffer)
+        glBufferSubData(GL_UNIFORM_BUFFER, 0, self.transforms.nbytes, self.transforms)
+
+    def draw_overlay(self, texture, window_size, scaled_size):
+        """Draw a texture in the top-left corner, scaled_size pixels large, blended over the frame"""
+        width, height = window_size
+        glUseProgram(self.overlay_program)
+        glUniform4f(self.overlay_rect, -1.0, 1.0, -1.0 + 2.0 * scaled_size[0] / width, 1.0 - 2.0 * scaled_size[1] / height)
+        glBindVertexArray(self.empty_vao)
+        glBindTexture(GL_TEXTURE_2D, texture)
+        glDisable(GL_DEPTH_TEST)
+        glEnable(GL_BLEND)
+        glBlendFunc(GL_SRC_ALPHA, GL_ONE_MINUS_SRC_ALPHA)
+        glDrawArrays(GL_TRIANGLE_STRIP, 0, 4)
+        glDisable(GL_BLEND)
+        glEnable(GL_DEPTH_TEST)
+
+    def delete(self):
+        glDeleteProgram(self.program)
+        glDeleteProgram(self.overlay_program)
+        glDeleteBuffers(1, [self.uniform_buffer])
+        glDeleteVertexArrays(1, [self.empty_vao])
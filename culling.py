@@ -0,0 +1,62 @@
+"""
+View-frustum culling.
+
+Mesh bounds (an axis-aligned box and a bounding sphere around its center) are
+computed once per mesh from the vertex array. The six frustum planes are pulled
+out of projection x modelview (Gribb/Hartmann), which puts them in the mesh's
+own coordinate space. That works the same for every projection mode, including
+the oblique shear and the fisheye frustum, and the bounds never have to be
+transformed.
+"""
+import numpy as np
+from OpenGL.GL import glGetFloatv, GL_PROJECTION_MATRIX, GL_MODELVIEW_MATRIX
+
+
+class Bounds:
+    def __init__(self, positions):
+        positions = np.asarray(positions, dtype=np.float32).reshape(-1, 3)
+        if len(positions):
+            self.minimum = positions.min(axis=0)
+            self.maximum = positions.max(axis=0)
+        else:
+            self.minimum = self.maximum = np.zeros(3, dtype=np.float32)
+        self.center = (self.minimum + self.maximum) / 2
+        self.radius = float(np.sqrt(((positions - self.center) ** 2).sum(axis=1).max())) if len(positions) else 0.0
+
+    def visible(self, planes):
+        """Whether any part of the bounds can be inside the frustum (conservative)"""
+        distances = planes[:, :3] @ self.center + planes[:, 3]
+        if (distances < -self.radius).any():
+            return False
+        if (distances >= self.radius).all():
+            return True  # sphere fully inside, no need for the box test
+        # Box corner furthest along each plane normal
+        corners = np.where(planes[:, :3] >= 0, self.maximum, self.minimum)
+        return bool(((corners * planes[:, :3]).sum(axis=1) + planes[:, 3] >= 0).all())
+
+
+def extract_planes(projection, modelview):
+    """
+    Frustum planes (6, 4) as a*x + b*y + c*z + d >= 0 for points inside, normalized.
+    Matrices are 4x4 arrays as returned by glGetFloatv (column-major).
+    """
+    clip = (np.asarray(modelview, dtype=np.float64).reshape(4, 4) @
+            np.asarray(projection, dtype=np.float64).reshape(4, 4)).T
+    planes = np.array([
+        clip[3] + clip[0],  # left
+        clip[3] - clip[0],  # right
+        clip[3] + clip[1],  # bottom
+        clip[3] - clip[1],  # top
+        clip[3] + clip[2],  # near
+        clip[3] - clip[2],  # far
+    ])
+    return planes / np.linalg.norm(planes[:, :3], axis=1, keepdims=True)
+
+
+def current_matrices():
+    return glGetFloatv(GL_PROJECTION_MATRIX), glGetFloatv(GL_MODELVIEW_MATRIX)
+
+
+def current_frustum():
+    """Frustum planes for the current GL projection and modelview matrices"""
+    return extract_planes(*current_matrices())
@@ -0,0 +1,171 @@
+"""
+GL call accounting.
+
+install() swaps every gl* function in the given modules' namespaces (they all
+star-import OpenGL.GL) for a counting wrapper. Per frame it tracks the number of
+calls per function, the bytes handed to buffer/texture uploads and the GL
+objects created and deleted, and the overlay shows the last complete frame.
+The wrappers cost a little themselves, so this is only installed on request;
+the main loop gets a NullGLStats otherwise.
+
+check_errors() goes with --fast-gl, which turns off PyOpenGL's glGetError after
+every call: errors are then drained once per frame instead.
+"""
+import importlib
+from collections import Counter
+import OpenGL.GL
+from OpenGL.GL import *
+
+_ENTRY_POINT_MODULE = type(OpenGL.GL.glClear).__module__  # PyOpenGL's ctypes entry point classes live here
+
+# Modules that issue GL calls, besides the main script
+GL_MODULES = ("vbo", "scene", "overlay", "textures", "core_renderer", "camera", "culling", "headless")
+
+_COMPONENTS = {GL_RGBA: 4, GL_BGRA: 4, GL_RGB: 3, GL_BGR: 3, GL_RG: 2, GL_RED: 1, GL_ALPHA: 1,
+               GL_LUMINANCE: 1, GL_DEPTH_COMPONENT: 1}
+_TYPE_BYTES = {GL_UNSIGNED_BYTE: 1, GL_BYTE: 1, GL_UNSIGNED_SHORT: 2, GL_SHORT: 2, GL_HALF_FLOAT: 2,
+               GL_UNSIGNED_INT: 4, GL_INT: 4, GL_FLOAT: 4}
+
+
+def _nbytes(data):
+    if data is None:
+        return 0
+    if hasattr(data, "nbytes"):
+        return int(data.nbytes)
+    if isinstance(data, (bytes, bytearray, memoryview)):
+        return len(data)
+    return 0  # a size only (allocation) or a pointer into a bound buffer
+
+
+def _texel_bytes(width, height, fmt, kind):
+    return int(width) * int(height) * _COMPONENTS.get(fmt, 4) * _TYPE_BYTES.get(kind, 1)
+
+
+# function -> bytes uploaded, from its arguments
+_UPLOADS = {
+    "glBufferData": lambda a: _nbytes(a[2] if len(a) == 4 else a[1]),
+    "glBufferSubData": lambda a: int(a[2]) if len(a) == 4 else _nbytes(a[2]),
+    "glTexImage2D": lambda a: 0 if a[8] is None else _texel_bytes(a[3], a[4], a[6], a[7]),
+    "glTexSubImage2D": lambda a: _texel_bytes(a[4], a[5], a[6], a[7]),
+    "glCompressedTexImage2D": lambda a: int(a[6]),
+    "glCompressedTexSubImage2D": lambda a: int(a[7]),
+}
+
+# function -> (object kind, how many objects from its arguments)
+_CREATES = {
+    "glGenTextures": ("textures", lambda a: int(a[0])),
+    "glGenBuffers": ("buffers", lambda a: int(a[0])),
+    "glGenVertexArrays": ("vertex arrays", lambda a: int(a[0])),
+    "glGenFramebuffers": ("framebuffers", lambda a: int(a[0])),
+    "glGenRenderbuffers": ("renderbuffers", lambda a: int(a[0])),
+    "glGenLists": ("display lists", lambda a: int(a[0])),
+    "glCreateProgram": ("programs", lambda a: 1),
+}
+_DELETES = {
+    "glDeleteTextures": ("textures", lambda a: int(a[0]) if len(a) > 1 else len(a[0])),
+    "glDeleteBuffers": ("buffers", lambda a: int(a[0]) if len(a) > 1 else len(a[0])),
+    "glDeleteVertexArrays": ("vertex arrays", lambda a: int(a[0]) if len(a) > 1 else len(a[0])),
+    "glDeleteFramebuffers": ("framebuffers", lambda a: int(a[0]) if len(a) > 1 else len(a[0])),
+    "glDeleteRenderbuffers": ("renderbuffers", lambda a: int(a[0]) if len(a) > 1 else len(a[0])),
+    "glDeleteLists": ("display lists", lambda a: int(a[1])),
+    "glDeleteProgram": ("programs", lambda a: 1),
+}
+
+
+class GLStats:
+    enabled = True
+
+    def __init__(self):
+        self.calls = Counter()    # function -> calls, this frame
+        self.uploaded = 0         # bytes, this frame
+        self.created = Counter()  # object kind -> count, this frame
+        self.deleted = Counter()
+        self.totals = Counter()   # function -> calls, all frames
+        self.frames = 0
+        self.last = (0, 0, Counter(), Counter())  # (calls, bytes, created, deleted) of the last whole frame
+
+    def install(self, *modules):
+        """Wrap the gl* functions of modules (module objects or names, see GL_MODULES)"""
+        import OpenGL.GLU  # only imported here, it takes longer than everything else in this module
+        for module in modules:
+            if isinstance(module, str):
+                module = importlib.import_module(module)
+            for name, function in list(vars(module).items()):
+                # Only the OpenGL entry points themselves (also raw ones imported from OpenGL.raw), not
+                # gl_matrix & co. Unavailable ones are falsy, wrapping them would hide that from feature checks.
+                if (name.startswith("gl") and bool(function) and
+                        (function in (vars(OpenGL.GL).get(name), vars(OpenGL.GLU).get(name)) or
+                         type(function).__module__ == _ENTRY_POINT_MODULE)):
+                    setattr(module, name, self._wrap(name, function))
+
+    def _wrap(self, name, function):
+        calls = self.calls
+        upload = _UPLOADS.get(name)
+        creates = _CREATES.get(name)
+        deletes = _DELETES.get(name)
+
+        def counted(*args, **kwargs):
+            calls[name] += 1
+            if upload is not None:
+                self.uploaded += upload(args)
+            if creates is not None:
+                self.created[creates[0]] += creates[1](args)
+            elif deletes is not None:
+                self.deleted[deletes[0]] += deletes[1](args)
+            return function(*args, **kwargs)
+
+        counted.counted = function
+        counted.__name__ = name
+        return counted
+
+    def end_frame(self):
+        self.last = (sum(self.calls.values()), self.uploaded, self.created.copy(), self.deleted.copy())
+        self.totals.update(self.calls)
+        self.frames += 1
+        self.calls.clear()  # cleared in place, the wrappers hold on to it
+        self.uploaded = 0
+        self.created.clear()
+        self.deleted.clear()
+
+    def overlay_lines(self):
+        calls, uploaded, created, deleted = self.last
+        return [
+            f"GL calls: {calls}",
+            f"GL upload: {uploaded / 1024:.1f} KB",
+            f"GL objects: +{sum(created.values())} -{sum(deleted.values())}",
+        ]
+
+    def summary(self, top=15):
+        """Average calls per frame of the busiest functions"""
+        frames = max(self.frames, 1)
+        lines = [f"GL calls per frame over {self.frames} frames: {sum(self.totals.values()) / frames:.1f}"]
+        lines += [f"  {name}: {count / frames:.2f}" for name, count in self.totals.most_common(top)]
+        return "\n".join(lines)
+
+
+class NullGLStats:
+    enabled = False
+
+    def install(self, *modules):
+        pass
+
+    def end_frame(self):
+        pass
+
+    def overlay_lines(self):
+        return []
+
+    def summary(self, top=15):
+        return ""
+
+
+def check_errors(reported, limit=16):
+    """Drain glGetError once (for --fast-gl), each distinct error is printed the first time only"""
+    from OpenGL.GLU import gluErrorString
+    for _ in range(limit):
+        error = glGetError()
+        if error == GL_NO_ERROR:
+            return
+        if error not in reported:
+            reported.add(error)
+            print(f"GL error {int(error):#06x}: {gluErrorString(error).decode(errors='replace')}")
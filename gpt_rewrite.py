@@ -6,6 +6,10 @@ from OpenGL.GLU import *
 from PIL import Image
 import numpy as np
 import importlib
+import os
+from obj_loader import load_obj
+from mesh_tools import compile_mesh
+from vbo import MeshBuffer
 
 class ObjectViewer:
     def __init__(self, object_module=None, texture_path=None):
@@ -28,6 +32,8 @@ class ObjectViewer:
         self.font = pygame.font.Font(None, 36)
 
         self.load_object(object_module)
+        positions, uvs, indices = compile_mesh(self.vertices, self.faces, self.texture_coords, self.uv_layout)
+        self.mesh_buffer = MeshBuffer(positions, uvs, indices)
 
         # Load texture AFTER OpenGL is initialized!
         self.texture = self.load_texture(self.texture_path or "textures/1.jpg")
@@ -35,7 +41,13 @@ class ObjectViewer:
 
 
     def load_object(self, module_name):
+        self.uv_layout = None
         try:
+            if module_name.lower().endswith(".obj"):
+                path = module_name if os.path.exists(module_name) else os.path.join("objects", module_name)
+                self.vertices, self.faces, self.texture_coords = load_obj(path)
+                self.uv_layout = "vertex"  # a mesh without shared vertices would look per corner too
+                return
             module = importlib.import_module(f"objects.{module_name}")
             self.vertices = module.vertices
             self.faces = module.faces
@@ -161,19 +173,7 @@ class ObjectViewer:
     def draw_object(self):
         glEnable(GL_TEXTURE_2D)
         glBindTexture(GL_TEXTURE_2D, self.texture)
-
-        glBegin(GL_TRIANGLES)
-    
-        for face in self.faces:
-            for idx in face:
-                if idx >= len(self.texture_coords):  # Check if index is valid
-                    print(f"Error: Index {idx} out of range for texture_coords (len={len(self.texture_coords)})")
-                    continue  # Skip this iteration to prevent crashing
-            
-                glTexCoord2fv(self.texture_coords[idx])
-                glVertex3fv(self.vertices[idx])
-
-        glEnd()
+        self.mesh_buffer.draw()
     def draw_overlay(self):
         overlay_surface = pygame.Surface((300, 200), pygame.SRCALPHA)
         overlay_surface.fill((0, 0, 0, 128))
@@ -285,7 +285,7 @@ class ObjectViewer:
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description='3D Object Viewer')
-    parser.add_argument('-o', '--object', type=str, help='Name of the object module in objects package')
+    parser.add_argument('-o', '--object', type=str, help='Name of the object module in objects package, or an .obj file')
     parser.add_argument('-t', '--texture', type=str, help='Path to texture image')
     args = parser.parse_args()
 
@@ -0,0 +1,173 @@
+"""
+Offscreen batch rendering.
+
+Renders a set of camera angles x projection modes into a framebuffer object and
+writes every view straight to a PNG, with no window and no event loop. On Linux
+without a display the context comes from EGL (Mesa's llvmpipe software
+rasterizer works on GPU-less boxes), elsewhere from a hidden pygame window.
+PNG encoding runs on worker threads so the GPU keeps rendering meanwhile.
+"""
+import ctypes
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from OpenGL.GL import *
+
+PROJECTION_NAMES = ["perspective", "orthographic", "isometric", "oblique", "fisheye"]
+
+
+def create_context(width, height, core=False):
+    """Make an offscreen-capable GL context current, a 3.3 core profile one if core is set"""
+    if os.environ.get("PYOPENGL_PLATFORM") == "egl":
+        return _create_egl_context(core)
+    import pygame
+    pygame.display.init()
+    if core:
+        request_core_profile()
+    pygame.display.set_mode((width, height), pygame.OPENGL | pygame.HIDDEN)
+    return None
+
+
+def request_core_profile():
+    """Ask pygame for an OpenGL 3.3 core profile context, call before set_mode"""
+    import pygame
+    pygame.display.gl_set_attribute(pygame.GL_CONTEXT_MAJOR_VERSION, 3)
+    pygame.display.gl_set_attribute(pygame.GL_CONTEXT_MINOR_VERSION, 3)
+    pygame.display.gl_set_attribute(pygame.GL_CONTEXT_PROFILE_MASK, pygame.GL_CONTEXT_PROFILE_CORE)
+    pygame.display.gl_set_attribute(pygame.GL_CONTEXT_FORWARD_COMPATIBLE_FLAG, 1)  # macOS only hands out core contexts this way
+
+
+def _create_egl_context(core=False):
+    from OpenGL import EGL
+
+    display = EGL.eglGetDisplay(EGL.EGL_DEFAULT_DISPLAY)
+    if not EGL.eglInitialize(display, None, None):
+        raise RuntimeError("Could not initialize EGL")
+    attributes = (EGL.EGLint * 13)(
+        EGL.EGL_SURFACE_TYPE, EGL.EGL_PBUFFER_BIT,
+        EGL.EGL_RED_SIZE, 8, EGL.EGL_GREEN_SIZE, 8, EGL.EGL_BLUE_SIZE, 8,
+        EGL.EGL_DEPTH_SIZE, 24,
+        EGL.EGL_RENDERABLE_TYPE, EGL.EGL_OPENGL_BIT,
+        EGL.EGL_NONE,
+    )
+    config = EGL.EGLConfig()
+    count = EGL.EGLint()
+    EGL.eglChooseConfig(display, attributes, ctypes.pointer(config), 1, ctypes.pointer(count))
+    if not count.value:
+        raise RuntimeError("No EGL config with desktop OpenGL support")
+    EGL.eglBindAPI(EGL.EGL_OPENGL_API)
+    context_attributes = None
+    if core:
+        context_attributes = (EGL.EGLint * 7)(
+            EGL.EGL_CONTEXT_MAJOR_VERSION, 3, EGL.EGL_CONTEXT_MINOR_VERSION, 3,
+            EGL.EGL_CONTEXT_OPENGL_PROFILE_MASK, EGL.EGL_CONTEXT_OPENGL_CORE_PROFILE_BIT,
+            EGL.EGL_NONE,
+        )
+    context = EGL.eglCreateContext(display, config, EGL.EGL_NO_CONTEXT, context_attributes)
+    if not context:
+        raise RuntimeError("Could not create an EGL context" + (" with an OpenGL 3.3 core profile" if core else ""))
+
+    # Everything is drawn into our own framebuffer, the pbuffer only has to exist
+    surface = EGL.eglCreatePbufferSurface(display, config, (EGL.EGLint * 5)(EGL.EGL_WIDTH, 1, EGL.EGL_HEIGHT, 1, EGL.EGL_NONE))
+    EGL.eglMakeCurrent(display, surface, surface, context)
+    return display, surface, context
+
+
+class Framebuffer:
+    def __init__(self, width, height, samples=0):
+        self.width = width
+        self.height = height
+        self.samples = samples
+        self.pixels = np.empty((height, width, 4), dtype=np.uint8)
+
+        self.fbo, self.color, self.depth = self._create(samples)
+        # Multisampled renderbuffers can't be read directly, they get resolved into a plain one
+        self.resolve = self._create(0) if samples > 1 else None
+
+    def _create(self, samples):
+        fbo = glGenFramebuffers(1)
+        color, depth = glGenRenderbuffers(2)
+        glBindFramebuffer(GL_FRAMEBUFFER, fbo)
+        for buffer, fmt, attachment in ((color, GL_RGBA8, GL_COLOR_ATTACHMENT0), (depth, GL_DEPTH_COMPONENT24, GL_DEPTH_ATTACHMENT)):
+            glBindRenderbuffer(GL_RENDERBUFFER, buffer)
+            if samples > 1:
+                glRenderbufferStorageMultisample(GL_RENDERBUFFER, samples, fmt, self.width, self.height)
+            else:
+                glRenderbufferStorage(GL_RENDERBUFFER, fmt, self.width, self.height)
+            glFramebufferRenderbuffer(GL_FRAMEBUFFER, attachment, GL_RENDERBUFFER, buffer)
+        if glCheckFramebufferStatus(GL_FRAMEBUFFER) != GL_FRAMEBUFFER_COMPLETE:
+            raise RuntimeError("Framebuffer is incomplete")
+        return fbo, color, depth
+
+    def bind(self):
+        glBindFramebuffer(GL_FRAMEBUFFER, self.fbo)
+        glViewport(0, 0, self.width, self.height)
+
+    def read_pixels(self):
+        """Read the rendered image as a top-down (height, width, 4) array (reused between calls)"""
+        source = self.fbo
+        if self.resolve is not None:
+            glBindFramebuffer(GL_READ_FRAMEBUFFER, self.fbo)
+            glBindFramebuffer(GL_DRAW_FRAMEBUFFER, self.resolve[0])
+            glBlitFramebuffer(0, 0, self.width, self.height, 0, 0, self.width, self.height, GL_COLOR_BUFFER_BIT, GL_NEAREST)
+            source = self.resolve[0]
+        glBindFramebuffer(GL_READ_FRAMEBUFFER, source)
+        glPixelStorei(GL_PACK_ALIGNMENT, 1)
+        glReadPixels(0, 0, self.width, self.height, GL_RGBA, GL_UNSIGNED_BYTE, self.pixels)
+        glBindFramebuffer(GL_FRAMEBUFFER, self.fbo)
+        return self.pixels[::-1]
+
+    def delete(self):
+        for fbo, color, depth in filter(None, [(self.fbo, self.color, self.depth), self.resolve]):
+            glDeleteFramebuffers(1, [fbo])
+            glDeleteRenderbuffers(2, [color, depth])
+
+
+def parse_projection(name):
+    """Accept a projection mode index (0-4) or name"""
+    if name.isdigit():
+        return int(name)
+    return PROJECTION_NAMES.index(name.lower())
+
+
+def parse_angles(text):
+    """'0,180;30,45' -> [(0.0, 180.0), (30.0, 45.0)]"""
+    return [tuple(float(v) for v in pair.split(",")) for pair in text.split(";") if pair]
+
+
+def _save_png(pixels, path, compress_level):
+    from PIL import Image
+    Image.fromarray(pixels, "RGBA").save(path, compress_level=compress_level)
+
+
+def render_views(draw_scene, views, size, output_dir, prefix="view", samples=4, compress_level=1, workers=4):
+    """
+    Render every (angle_x, angle_y, projection mode) view offscreen and save it as a PNG.
+    :param draw_scene: Called as draw_scene(angle_x, angle_y, projection_mode, aspect) with the framebuffer bound.
+    :return: List of written paths.
+    """
+    width, height = size
+    os.makedirs(output_dir, exist_ok=True)
+    framebuffer = Framebuffer(width, height, samples)
+    framebuffer.bind()
+
+    paths = []
+    saves = []
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as encoder:
+        for angle_x, angle_y, mode in views:
+            glClear(GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT)
+            draw_scene(angle_x, angle_y, mode, width / height)
+            path = os.path.join(output_dir, f"{prefix}_{PROJECTION_NAMES[mode]}_{angle_x:g}_{angle_y:g}.png")
+            # read_pixels reuses its buffer, the encoder gets its own copy
+            saves.append(encoder.submit(_save_png, framebuffer.read_pixels().copy(), path, compress_level))
+            paths.append(path)
+    for save in saves:
+        save.result()  # re-raise encoding/IO errors
+    elapsed = time.perf_counter() - start
+
+    framebuffer.delete()
+    glBindFramebuffer(GL_FRAMEBUFFER, 0)
+    print(f"Rendered {len(paths)} images in {elapsed:.2f}s ({len(paths) / max(elapsed, 1e-9):.1f} images/s)")
+    return paths
@@ -0,0 +1,204 @@
+"""
+Level of detail.
+
+decimate() is a quadric error edge-collapse simplifier (Garland & Heckbert).
+Collapsing edges one at a time from a priority queue is far too slow in Python,
+so it works in vectorized passes instead. In each pass every vertex picks its
+cheapest outgoing edge. The vertices whose pick is cheaper than all of their
+neighbours' picks collapse together; they never share a triangle, so their
+collapses can't interfere. That selection is repeated a few rounds per pass to
+collapse as many vertices as possible. Collapses keep the target endpoint (and
+its uv). Vertices whose collapse would flip a triangle sit the pass out. Vertices
+on open edges or uv seams are locked, so silhouettes and seams don't tear.
+
+Levels are picked per object from the size it covers on screen, aiming for
+about TRIANGLES_PER_PIXEL triangles per covered pixel.
+"""
+import numpy as np
+
+VERSION = 1  # part of the cache key, bump when decimate() output changes
+RATIOS = (0.5, 0.25, 0.1)  # of the full triangle count
+MIN_TRIANGLES = 2000        # smaller meshes don't get a chain
+TRIANGLES_PER_PIXEL = 0.5
+
+# Upper triangle of a symmetric 4x4 quadric, stored as 10 values
+_ROWS, _COLS = np.triu_indices(4)
+
+
+def _plane_quadrics(positions, triangles):
+    """Area weighted plane quadric of every triangle, (T, 10)"""
+    p0, p1, p2 = (positions[triangles[:, i]] for i in range(3))
+    normals = np.cross(p1 - p0, p2 - p0)
+    lengths = np.linalg.norm(normals, axis=1)
+    unit = normals / np.where(lengths > 0, lengths, 1.0)[:, None]
+    planes = np.concatenate([unit, -(unit * p0).sum(axis=1, keepdims=True)], axis=1)
+    return planes[:, _ROWS] * planes[:, _COLS] * (lengths / 2)[:, None]
+
+
+def _vertex_quadrics(positions, triangles):
+    faces = _plane_quadrics(positions, triangles)
+    quadrics = np.zeros((len(positions), 10))
+    for corner in range(3):
+        for k in range(10):
+            quadrics[:, k] += np.bincount(triangles[:, corner], weights=faces[:, k], minlength=len(positions))
+    return quadrics
+
+
+def _monomials(points):
+    """Terms of p^T Q p for p = (x, y, z, 1) matching the 10 stored quadric values"""
+    homogeneous = np.concatenate([points, np.ones((len(points), 1))], axis=1)
+    terms = homogeneous[:, _ROWS] * homogeneous[:, _COLS]
+    terms[:, _ROWS != _COLS] *= 2
+    return terms
+
+
+def _collapse_costs(quadrics, monomials, src, dst, chunk=1 << 20):
+    """
+    Error of moving src onto dst: p_dst^T (Q_src + Q_dst) p_dst.
+    Collapses keep the endpoint, so the monomials never change and come precomputed.
+    """
+    own = np.einsum("ij,ij->i", monomials, quadrics)  # p^T Q p of every vertex at itself
+    costs = np.empty(len(src))
+    for start in range(0, len(src), chunk):
+        s, d = src[start:start + chunk], dst[start:start + chunk]
+        costs[start:start + chunk] = np.einsum("ij,ij->i", monomials[d], quadrics[s]) + own[d]
+    return costs
+
+
+def _normals(positions, triangles):
+    p0, p1, p2 = (positions[triangles[:, i]] for i in range(3))
+    return np.cross(p1 - p0, p2 - p0)
+
+
+def _flipping(points, triangles, target_of):
+    """Vertices whose collapse onto target_of would turn a surviving triangle over (more than ~80 degrees)"""
+    bad = np.zeros(len(points), dtype=bool)
+    before = _normals(points, triangles)
+    before_length = np.linalg.norm(before, axis=1)
+    for corner in range(3):
+        vertex = triangles[:, corner]
+        moved = target_of[vertex]
+        others = np.delete(triangles, corner, axis=1)
+        # Triangles that contain the whole edge disappear, they can't flip
+        relevant = (moved != vertex) & (moved != others[:, 0]) & (moved != others[:, 1])
+        after_triangles = triangles[relevant].copy()
+        after_triangles[:, corner] = moved[relevant]
+        after = _normals(points, after_triangles)
+        flipped = ((before[relevant] * after).sum(axis=1) <=
+                   0.2 * before_length[relevant] * np.linalg.norm(after, axis=1))
+        bad[vertex[relevant][flipped]] = True
+    return bad
+
+
+def _independent_collapses(src, dst, rank, available, rounds=8):
+    """
+    Greedily pick collapsing vertices in rank order, no two of them adjacent.
+    Each round takes the available vertices that rank below all available neighbours.
+    """
+    count = len(rank)
+    chosen = np.zeros(count, dtype=bool)
+    available = available.copy()
+    for _ in range(rounds):
+        ranks = np.where(available, rank, count)
+        neighbour_rank = np.full(count, count, dtype=np.int64)
+        np.minimum.at(neighbour_rank, src, ranks[dst])
+        np.minimum.at(neighbour_rank, dst, ranks[src])
+        picked = available & (ranks < neighbour_rank)
+        if not picked.any():
+            break
+        chosen |= picked
+        # Neighbours of a collapsing vertex must stay where they are this pass
+        available &= ~picked
+        available[dst[picked[src]]] = False
+        available[src[picked[dst]]] = False
+    return np.flatnonzero(chosen)
+
+
+def decimate(positions, indices, uvs, target):
+    """
+    Simplify a triangle mesh to about `target` triangles.
+    :return: (positions (N, 3) float32, indices (T, 3) uint32, uvs (N, 2) float32) of the used vertices only
+    """
+    points = np.asarray(positions, dtype=np.float64).reshape(-1, 3)
+    triangles = np.asarray(indices, dtype=np.int64).reshape(-1, 3)
+    count = len(points)
+    quadrics = _vertex_quadrics(points, triangles)
+    monomials = _monomials(points)
+    identity = np.arange(count)
+
+    # Edges used by anything but exactly two triangles are open (borders, uv seams) or non-manifold
+    src = triangles.reshape(-1)
+    dst = np.roll(triangles, -1, axis=1).reshape(-1)
+    _, inverse, uses = np.unique(np.minimum(src, dst) * count + np.maximum(src, dst),
+                                 return_inverse=True, return_counts=True)
+    open_edges = uses[inverse.reshape(-1)] != 2
+    locked = np.zeros(count, dtype=bool)
+    locked[src[open_edges]] = True
+    locked[dst[open_edges]] = True
+
+    while len(triangles) > target:
+        src = triangles.reshape(-1)
+        dst = np.roll(triangles, -1, axis=1).reshape(-1)
+        movable = ~locked[src]
+        moving_src, moving_dst = src[movable], dst[movable]
+        costs = _collapse_costs(quadrics, monomials, moving_src, moving_dst)
+
+        # Cheapest outgoing edge of every vertex
+        best = np.full(count, np.inf)
+        np.minimum.at(best, moving_src, costs)
+        picked = costs == best[moving_src]
+        target_of = identity.copy()
+        target_of[moving_src[picked]] = moving_dst[picked]
+        available = np.isfinite(best) & ~_flipping(points, triangles, target_of)
+        if not available.any():
+            break
+
+        # Unique ranks, cheapest first
+        candidates = np.flatnonzero(available)
+        rank = np.full(count, count, dtype=np.int64)
+        rank[candidates[np.argsort(best[candidates], kind="stable")]] = np.arange(len(candidates))
+        collapsing = _independent_collapses(src, dst, rank, available)
+
+        # Each interior collapse removes two triangles, don't overshoot the target
+        needed = max((len(triangles) - target + 1) // 2, 1)
+        if len(collapsing) > needed:
+            collapsing = collapsing[np.argsort(rank[collapsing])[:needed]]
+        if not len(collapsing):
+            break
+
+        np.add.at(quadrics, target_of[collapsing], quadrics[collapsing])
+        remap = identity.copy()
+        remap[collapsing] = target_of[collapsing]
+        remapped = remap[triangles]
+        degenerate = ((remapped[:, 0] == remapped[:, 1]) | (remapped[:, 1] == remapped[:, 2]) |
+                      (remapped[:, 2] == remapped[:, 0]))
+        triangles = remapped[~degenerate]
+
+    # Drop triangles that collapsed onto an existing one, then unused vertices
+    _, first = np.unique(np.sort(triangles, axis=1), axis=0, return_index=True)
+    triangles = triangles[np.sort(first)]
+    used, triangles = np.unique(triangles, return_inverse=True)
+    texture_coords = np.asarray(uvs, dtype=np.float32).reshape(-1, 2)
+    return (points[used].astype(np.float32), triangles.reshape(-1, 3).astype(np.uint32),
+            texture_coords[used])
+
+
+def screen_radii(centers, radii, projection, modelview, viewport_height):
+    """
+    Projected radius in pixels of bounding spheres given in object space.
+    Matrices as returned by glGetFloatv, works wherever the perspective lives.
+    """
+    clip = (np.asarray(modelview, dtype=np.float64).reshape(4, 4) @
+            np.asarray(projection, dtype=np.float64).reshape(4, 4)).T
+    centers = np.atleast_2d(centers)
+    w = centers @ clip[3, :3] + clip[3, 3]
+    scale = np.linalg.norm(clip[1, :3])  # object units -> clip space y
+    radius = np.atleast_1d(radii) * scale / np.where(w > 1e-6, w, 1e-6)
+    return radius * viewport_height / 2
+
+
+def select_levels(triangle_counts, radii_px):
+    """Finest level within the triangle budget of each projected size (coarsest if none fits)"""
+    budget = np.pi * np.asarray(radii_px, dtype=np.float64) ** 2 * TRIANGLES_PER_PIXEL
+    too_fine = np.asarray(triangle_counts)[None, :] > np.atleast_1d(budget)[:, None]
+    return np.minimum(too_fine.sum(axis=1), len(triangle_counts) - 1)
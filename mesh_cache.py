@@ -0,0 +1,218 @@
+"""
+Compiled mesh cache.
+
+The first load of an object module or .obj file writes its triangle arrays to a
+binary file in .py3d_cache/meshes. Later launches memory-map that file instead of
+re-running the module or re-parsing the OBJ, so startup is bound by disk reads.
+
+Entries are keyed by source path + content hash + generator parameters. An index
+file remembers each source's size/mtime so unchanged sources aren't re-hashed,
+and the last time each entry was used so the cache can be capped with LRU eviction.
+Only the source file itself is hashed, edits to modules it imports aren't noticed.
+
+Several processes can share the cache (headless jobs, a benchmark next to the
+viewer): files are written through per-process temp files, and the index is
+merged with the one on disk right before it is replaced, under a file lock
+where the platform has flock.
+"""
+import hashlib
+import json
+import os
+import time
+from contextlib import contextmanager
+import numpy as np
+from mesh_tools import compile_mesh
+
+try:
+    import fcntl
+except ImportError:  # Windows, the merge alone has to do
+    fcntl = None
+
+CACHE_DIR = os.path.join(".py3d_cache", "meshes")
+MAX_CACHE_BYTES = 512 * 1024 * 1024
+FORMAT_VERSION = 1
+
+_MAGIC = b"PY3DMESH"
+_HEADER_SIZE = 32  # magic, version, padding, vertex count, triangle count
+_INDEX_FILE = "index.json"
+_LOCK_FILE = "index.lock"
+
+
+def _hash_file(path):
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _load_index(cache_dir):
+    try:
+        with open(os.path.join(cache_dir, _INDEX_FILE)) as f:
+            index = json.load(f)
+    except (OSError, ValueError):
+        index = {}
+    index.setdefault("sources", {})
+    index.setdefault("entries", {})
+    return index
+
+
+def _merge_index(index, current):
+    """
+    Fold entries another process saved since index was loaded into it.
+    Entries whose mesh file is gone were evicted by someone, those are dropped on both sides.
+    """
+    for source, known in current["sources"].items():
+        index["sources"].setdefault(source, known)
+    for key, entry in current["entries"].items():
+        ours = index["entries"].get(key)
+        if ours is None or entry.get("last_used", 0) > ours.get("last_used", 0):
+            index["entries"][key] = entry
+
+
+@contextmanager
+def _index_lock(cache_dir):
+    """Keep other processes from saving the index in between our read and write"""
+    if fcntl is None:
+        yield
+        return
+    with open(os.path.join(cache_dir, _LOCK_FILE), 'a') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def _save_index(cache_dir, index):
+    path = os.path.join(cache_dir, _INDEX_FILE)
+    with _index_lock(cache_dir):
+        _merge_index(index, _load_index(cache_dir))
+        for key in [key for key in index["entries"] if not os.path.exists(os.path.join(cache_dir, key + ".mesh"))]:
+            del index["entries"][key]
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, 'w') as f:
+            json.dump(index, f)
+        os.replace(tmp, path)
+
+
+def _source_digest(index, source):
+    """Content hash of source, only re-hashed when its size or mtime changed"""
+    stat = os.stat(source)
+    known = index["sources"].get(source)
+    if known and known["size"] == stat.st_size and known["mtime_ns"] == stat.st_mtime_ns:
+        return known["digest"]
+    digest = _hash_file(source)
+    index["sources"][source] = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "digest": digest}
+    return digest
+
+
+def cache_key(source, digest, params=None):
+    key = hashlib.blake2b(digest_size=16)
+    key.update(source.encode())
+    key.update(digest.encode())
+    key.update(json.dumps(params or {}, sort_keys=True).encode())
+    key.update(str(FORMAT_VERSION).encode())
+    return key.hexdigest()
+
+
+def write_mesh(path, positions, uvs, indices):
+    """Write compiled arrays to path (atomically, via a temp file)"""
+    header = np.zeros(_HEADER_SIZE, dtype=np.uint8)
+    header[:8] = np.frombuffer(_MAGIC, dtype=np.uint8)
+    header[8:12] = np.frombuffer(np.uint32(FORMAT_VERSION).tobytes(), dtype=np.uint8)
+    header[16:32] = np.frombuffer(np.array([len(positions), len(indices)], dtype='<u8').tobytes(), dtype=np.uint8)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, 'wb') as f:
+        f.write(header.tobytes())
+        f.write(np.ascontiguousarray(positions, dtype='<f4').tobytes())
+        f.write(np.ascontiguousarray(uvs, dtype='<f4').tobytes())
+        f.write(np.ascontiguousarray(indices, dtype='<u4').tobytes())
+    os.replace(tmp, path)
+
+
+def read_mesh(path):
+    """
+    Memory-map a compiled mesh file.
+    :return: (positions, uvs, indices) as read-only views of the file, or None if it is corrupt or outdated.
+    """
+    if os.path.getsize(path) < _HEADER_SIZE:
+        return None
+    data = np.memmap(path, dtype=np.uint8, mode='r')
+    if data[:8].tobytes() != _MAGIC:
+        return None
+    if data[8:12].view('<u4')[0] != FORMAT_VERSION:
+        return None
+    vertex_count, triangle_count = (int(n) for n in data[16:32].view('<u8'))
+    uv_start = _HEADER_SIZE + vertex_count * 12
+    index_start = uv_start + vertex_count * 8
+    if len(data) != index_start + triangle_count * 12:
+        return None
+    positions = data[_HEADER_SIZE:uv_start].view('<f4').reshape(-1, 3)
+    uvs = data[uv_start:index_start].view('<f4').reshape(-1, 2)
+    indices = data[index_start:].view('<u4').reshape(-1, 3)
+    return positions, uvs, indices
+
+
+def _evict(cache_dir, index, keep, max_bytes):
+    """Drop least recently used entries until the cache fits in max_bytes"""
+    entries = index["entries"]
+    total = sum(entry["bytes"] for entry in entries.values())
+    for key in sorted(entries, key=lambda k: entries[k]["last_used"]):
+        if total <= max_bytes:
+            break
+        if key == keep:
+            continue
+        total -= entries[key]["bytes"]
+        _remove_entry(cache_dir, index, key)
+
+
+def _remove_entry(cache_dir, index, key):
+    index["entries"].pop(key, None)
+    try:
+        os.remove(os.path.join(cache_dir, key + ".mesh"))
+    except FileNotFoundError:
+        pass
+
+
+def load_mesh(source, build, params=None, cache_dir=CACHE_DIR, max_bytes=MAX_CACHE_BYTES):
+    """
+    Return compiled (positions, uvs, indices) for a source file, building and caching it on a miss.
+    :param source: Path of the object module or .obj file the mesh comes from.
+    :param build: Called on a cache miss, returns (vertices, faces, texture_coords[, uv layout]) for compile_mesh.
+    :param params: Generator parameters that change the output, part of the cache key.
+    """
+    source = os.path.abspath(source)
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+    except OSError as e:
+        print(f"Mesh cache unavailable: {e}")
+        return compile_mesh(*build())
+    index = _load_index(cache_dir)
+    digest = _source_digest(index, source)
+    key = cache_key(source, digest, params)
+    path = os.path.join(cache_dir, key + ".mesh")
+
+    # Entries compiled from an older version of this source can never be hit again
+    for old_key, entry in list(index["entries"].items()):
+        if entry["source"] == source and entry["digest"] != digest:
+            _remove_entry(cache_dir, index, old_key)
+
+    mesh = None
+    if key in index["entries"] and os.path.exists(path):
+        mesh = read_mesh(path)
+    if mesh is None:
+        compiled = compile_mesh(*build())
+        try:
+            write_mesh(path, *compiled)
+        except OSError as e:
+            print(f"Could not write mesh cache: {e}")
+            return compiled
+        mesh = read_mesh(path)
+        index["entries"][key] = {"source": source, "digest": digest, "params": params or {},
+                                 "bytes": os.path.getsize(path)}
+
+    index["entries"][key]["last_used"] = time.time()
+    _evict(cache_dir, index, key, max_bytes)
+    _save_index(cache_dir, index)
+    return mesh
@@ -0,0 +1,199 @@
+"""
+Helpers that turn the different mesh layouts used by the viewer into plain
+triangle arrays (float32 positions/uvs, uint32 indices) ready for the GPU.
+"""
+import itertools
+import numpy as np
+
+VERSION = 3  # part of the mesh cache key, bump when compiled meshes change (2: explicit uv layouts, 3: generated ones)
+
+
+def fan_triangulate(sizes):
+    """
+    Triangulate polygons as fans.
+    :param sizes: Corner count of each polygon, corners stored back to back.
+    :return: (T, 3) int64 array of corner positions.
+    """
+    sizes = np.asarray(sizes, dtype=np.int64)
+    starts = np.cumsum(sizes) - sizes
+    tris = sizes - 2
+    owner = np.repeat(np.arange(len(sizes)), tris)
+    k = np.arange(tris.sum()) - np.repeat(np.cumsum(tris) - tris, tris) + 1
+    base = starts[owner]
+    return np.stack([base, base + k, base + k + 1], axis=1)
+
+
+def flatten_faces(faces):
+    """
+    Flatten a list of faces with mixed corner counts.
+    :return: (corner indices, corner count per face) as int64 arrays.
+    """
+    if isinstance(faces, np.ndarray) and faces.ndim == 2:
+        return faces.reshape(-1).astype(np.int64), np.full(len(faces), faces.shape[1], dtype=np.int64)
+    sizes = np.fromiter((len(face) for face in faces), dtype=np.int64, count=len(faces))
+    flat = np.fromiter(itertools.chain.from_iterable(faces), dtype=np.int64, count=int(sizes.sum()))
+    return flat, sizes
+
+
+def uv_layout(vertex_count, flat, sizes, uv_count, layout=None):
+    """
+    How texture coordinates line up with the faces, decided by their count unless layout names one:
+    - "corner": one per face corner, in face order (checked first, it's the only unambiguous one)
+    - "vertex": one per vertex
+    - "face": legacy, one per corner position within a face, the same for every face (the bundled cube)
+    Data that is already per vertex (compiled meshes, OBJ files) should say so, a mesh without shared
+    vertices has as many corners as vertices.
+    :raise ValueError: When the count fits none of them, or not the given layout.
+    """
+    counts = {"corner": len(flat), "vertex": vertex_count, "face": sizes.max() if len(sizes) else 0}
+    if layout is not None:
+        if counts[layout] != uv_count:
+            raise ValueError(f"{uv_count} texture coordinates, a {layout} layout needs {counts[layout]}")
+        return layout
+    if uv_count == len(flat):
+        return "corner"
+    if uv_count == vertex_count:
+        return "vertex"
+    if len(sizes) and uv_count == sizes.max():
+        return "face"
+    raise ValueError(f"{uv_count} texture coordinates fit neither the {len(flat)} face corners, "
+                     f"the {vertex_count} vertices nor the {sizes.max() if len(sizes) else 0} corners of a face")
+
+
+def corner_texture_coords(vertex_count, flat, sizes, texture_coords, layout=None):
+    """Texture coordinate of every face corner, see uv_layout for the accepted layouts"""
+    layout = uv_layout(vertex_count, flat, sizes, len(texture_coords), layout)
+    if layout == "corner":
+        return texture_coords
+    if layout == "vertex":
+        return texture_coords[flat]
+    corner = np.arange(len(flat)) - np.repeat(np.cumsum(sizes) - sizes, sizes)
+    return texture_coords[corner]
+
+
+def grid_faces(rows, cols):
+    """
+    Triangles of a (rows + 1) x (cols + 1) vertex grid stored row by row, two per cell.
+    :return: (rows * cols * 2, 3) int64 array.
+    """
+    current = (np.arange(rows)[:, None] * (cols + 1) + np.arange(cols)[None, :]).reshape(-1)
+    below = current + cols + 1
+    return np.stack([
+        np.stack([current, below, below + 1], axis=1),
+        np.stack([current, below + 1, current + 1], axis=1),
+    ], axis=1).reshape(-1, 3)
+
+
+def subdivide_quad(corners, uvs, segments):
+    """Split a quad into segments x segments cells, bilinearly interpolating positions and uvs"""
+    s = np.linspace(0.0, 1.0, segments + 1)[:, None, None]
+    t = np.linspace(0.0, 1.0, segments + 1)[None, :, None]
+    weights = [(1 - s) * (1 - t), s * (1 - t), s * t, (1 - s) * t]
+    positions = sum(w * c for w, c in zip(weights, corners)).reshape(-1, 3)
+    texture_coords = sum(w * c for w, c in zip(weights, uvs)).reshape(-1, 2)
+    return positions, texture_coords, grid_faces(segments, segments)
+
+
+def subdivide_triangle(corners, uvs, segments):
+    """Split a triangle into segments^2 triangles using a barycentric grid"""
+    i, j = np.meshgrid(np.arange(segments + 1), np.arange(segments + 1), indexing='ij')
+    keep = i + j <= segments
+    a = (i[keep] / segments)[:, None]
+    b = (j[keep] / segments)[:, None]
+    positions = (1 - a - b) * corners[0] + a * corners[1] + b * corners[2]
+    texture_coords = (1 - a - b) * uvs[0] + a * uvs[1] + b * uvs[2]
+
+    # Row i holds segments + 1 - i vertices
+    def vertex_id(row, col):
+        return row * (segments + 1) - row * (row - 1) // 2 + col
+
+    i, j = i[keep], j[keep]
+    up = (i + j < segments)
+    down = (i + j < segments - 1)
+    triangles = np.concatenate([
+        np.stack([vertex_id(i[up], j[up]), vertex_id(i[up] + 1, j[up]), vertex_id(i[up], j[up] + 1)], axis=1),
+        np.stack([vertex_id(i[down] + 1, j[down]), vertex_id(i[down] + 1, j[down] + 1),
+                  vertex_id(i[down], j[down] + 1)], axis=1),
+    ])
+    return positions, texture_coords, triangles
+
+
+def subdivide_faces(vertices, faces, texture_coords, subdivisions=0):
+    """
+    Build a parametric version of an object module's mesh.
+    Every triangle and quad is split into (subdivisions + 1)^2 pieces, each face
+    keeps its own vertices so texture coordinates don't bleed across edges.
+    :return: (vertices (N, 3) float32, faces (T, 3) uint32, texture_coords (N, 2) float32, "vertex"),
+             the uv layout has to be given, an unsubdivided triangle mesh has as many vertices as corners
+    """
+    vertices = np.asarray(vertices, dtype=np.float64).reshape(-1, 3)
+    texture_coords = np.asarray(texture_coords, dtype=np.float64).reshape(-1, 2)
+    flat, sizes = flatten_faces(faces)
+    uvs = corner_texture_coords(len(vertices), flat, sizes, texture_coords)
+    segments = int(subdivisions) + 1
+
+    parts = []
+    offset = 0
+    for start, size in zip(np.cumsum(sizes) - sizes, sizes):
+        corners = vertices[flat[start:start + size]]
+        corner_uvs = uvs[start:start + size]
+        if size == 3:
+            positions, face_uvs, triangles = subdivide_triangle(corners, corner_uvs, segments)
+        elif size == 4:
+            positions, face_uvs, triangles = subdivide_quad(corners, corner_uvs, segments)
+        else:
+            raise ValueError(f"cannot subdivide a face with {size} corners")
+        parts.append((positions, face_uvs, triangles + offset))
+        offset += len(positions)
+
+    return (np.concatenate([p[0] for p in parts]).astype(np.float32),
+            np.concatenate([p[2] for p in parts]).astype(np.uint32),
+            np.concatenate([p[1] for p in parts]).astype(np.float32),
+            "vertex")
+
+
+def check_faces(flat, sizes, vertex_count, uv_count, layout=None):
+    """
+    Reject out of range indices once at load time, so draw loops never have to check.
+    :raise ValueError: On a negative or too large vertex index, or a uv count that fits no layout.
+    """
+    if len(flat) and (flat.min() < 0 or flat.max() >= vertex_count):
+        bad = flat[(flat < 0) | (flat >= vertex_count)][0]
+        raise ValueError(f"face references vertex {bad}, mesh has {vertex_count} vertices")
+    return uv_layout(vertex_count, flat, sizes, uv_count, layout)
+
+
+def corner_vertices(vertices, flat, uvs):
+    """
+    Merge face corners into vertices, one per unique (position, uv) pair.
+    Corners share a vertex wherever they share both, uv seams get one vertex per side.
+    :return: (positions (N, 3), uvs (N, 2), vertex of every corner (C,) int64)
+    """
+    # uvs are keyed on their exact bit patterns, then paired with the position index
+    uv_bits = np.ascontiguousarray(uvs, dtype=np.float32).view(np.uint64).reshape(-1)
+    _, uv_id = np.unique(uv_bits, return_inverse=True)
+    _, first, corner_vertex = np.unique(flat * (int(uv_id.max(initial=0)) + 1) + uv_id.reshape(-1),
+                                             return_index=True, return_inverse=True)
+    return vertices[flat[first]], uvs[first], corner_vertex.reshape(-1)
+
+
+def compile_mesh(vertices, faces, texture_coords, layout=None):
+    """
+    Compile object data into indexed triangle arrays.
+    :param layout: How texture_coords are laid out, see uv_layout. Guessed from their count when None.
+    :return: (positions (N, 3) float32, uvs (N, 2) float32, indices (T, 3) uint32)
+    :raise ValueError: When faces reference vertices or uvs that don't exist.
+    """
+    vertices = np.asarray(vertices, dtype=np.float32).reshape(-1, 3)
+    texture_coords = np.asarray(texture_coords, dtype=np.float32).reshape(-1, 2)
+    flat, sizes = flatten_faces(faces)
+    layout = check_faces(flat, sizes, len(vertices), len(texture_coords), layout)
+    triangles = fan_triangulate(sizes)
+
+    if layout == "vertex":
+        return vertices, texture_coords, flat[triangles].astype(np.uint32)
+
+    # Per corner uvs, corners with the same position and uv become one vertex
+    uvs = corner_texture_coords(len(vertices), flat, sizes, texture_coords, layout)
+    positions, uvs, corner_vertex = corner_vertices(vertices, flat, uvs)
+    return positions, uvs, corner_vertex[triangles].astype(np.uint32)
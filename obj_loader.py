@@ -0,0 +1,329 @@
+"""
+Wavefront OBJ loader.
+
+Everything is parsed in bulk: lines are classified by their keyword with numpy,
+the payloads of each record kind are gathered into one blob and numpy turns that
+text into arrays. There is no per-line Python loop on the fast path, so
+multi-million triangle scans load in seconds.
+
+Big files are parsed on all cores: the file is cut into newline aligned byte
+ranges, and a process pool parses each range out of an mmap of the file. A
+worker hands its arrays back in one shared memory block rather than pickling
+them. Face indices are only resolved after the merge, once the global vertex
+counts are known, and relative (negative) indices get the number of records
+in the earlier ranges added to their own count.
+"""
+import mmap
+import os
+import re
+import numpy as np
+from mesh_tools import fan_triangulate
+
+# Only used when a file mixes corner formats (e.g. "1/2" and "3//4" in one face)
+_CORNER_RE = re.compile(rb'(-?\d+)(?:/(-?\d*)(?:/(-?\d*))?)?')
+_LEADING_WS_RE = re.compile(rb'^[ \t]+', re.M)
+_WHITESPACE = np.array([b' ', b'\t', b'\r', b'\n']).view(np.uint8)
+PARALLEL_MIN_BYTES = 64 * 1024 * 1024  # smaller files parse faster than a process pool starts
+RANGE_BYTES = 256 * 1024 * 1024  # upper bound of one worker's range, bounds its memory use
+_KEYWORDS = ("v", "vt", "vn")
+
+
+def _split_records(data):
+    """
+    Classify every line of the file by its record keyword.
+    :return: (bytes array, {keyword: (line starts, line ends)}) with ends pointing one past the newline.
+    """
+    if not data.endswith(b'\n'):
+        data += b'\n'
+    arr = np.frombuffer(data, dtype=np.uint8)
+    if arr[0] in _WHITESPACE[:2] or re.search(rb'\n[ \t]', data):
+        # Indented records are rare, strip them once rather than on every line
+        data = _LEADING_WS_RE.sub(b'', data)
+        arr = np.frombuffer(data, dtype=np.uint8)
+
+    ends = np.flatnonzero(arr == 10) + 1
+    starts = np.concatenate(([0], ends[:-1]))
+    last = len(arr) - 1
+    c0, c1, c2 = (arr[np.minimum(starts + i, last)] for i in range(3))
+    sep1 = np.isin(c1, _WHITESPACE)
+    sep2 = np.isin(c2, _WHITESPACE)
+
+    records = {}
+    for keyword, selected in (
+        ("v", (c0 == ord('v')) & sep1),
+        ("vt", (c0 == ord('v')) & (c1 == ord('t')) & sep2),
+        ("vn", (c0 == ord('v')) & (c1 == ord('n')) & sep2),
+        ("f", (c0 == ord('f')) & sep1),
+    ):
+        records[keyword] = (starts[selected], ends[selected])
+    return arr, records
+
+
+def _gather(arr, starts, ends, skip):
+    """
+    Concatenate whole lines [starts, ends) into one blob and blank out their first
+    `skip` bytes (the keyword). Records of one kind are normally written back to
+    back, so this copies a handful of large slices rather than one per line.
+    """
+    if not len(starts):
+        return b''
+    breaks = np.flatnonzero(starts[1:] != ends[:-1]) + 1
+    run_starts = starts[np.concatenate(([0], breaks))]
+    run_ends = ends[np.concatenate((breaks - 1, [len(ends) - 1]))]
+    blob = np.concatenate([arr[a:b] for a, b in zip(run_starts, run_ends)])
+
+    lengths = ends - starts
+    offsets = np.cumsum(lengths) - lengths
+    # Never blank the newline itself, a bare keyword must still end its line
+    keyword = np.minimum(offsets[:, None] + np.arange(skip), (offsets + lengths - 2)[:, None])
+    blob[keyword] = 32
+    return blob.tobytes()
+
+
+def _tokens_per_line(blob):
+    """Count whitespace separated tokens on every line of a newline terminated blob"""
+    arr = np.frombuffer(blob, dtype=np.uint8)
+    ws = (arr == 32) | (arr == 9) | (arr == 10) | (arr == 13)
+    starts = ~ws
+    starts[1:] &= ws[:-1]
+    newlines = np.flatnonzero(arr == 10)
+    line_starts = np.concatenate(([0], newlines[:-1] + 1))
+    return np.add.reduceat(starts, line_starts, dtype=np.int64)
+
+
+def _parse_floats(blob, count, width, minimum=None):
+    """
+    Turn a blob of `count` record payloads into a (count, width) float32 array.
+    Values past `width` are ignored, missing ones (down to `minimum` per record) are 0.
+    """
+    if not count:
+        return np.zeros((0, width), dtype=np.float32)
+    counts = _tokens_per_line(blob)
+    values = np.fromstring(blob, dtype=np.float32, sep=' ')
+    if values.size != counts.sum() or counts.min() < (width if minimum is None else minimum):
+        raise ValueError("malformed vertex record")
+    if counts.min() == counts.max() >= width:
+        return np.ascontiguousarray(values.reshape(-1, counts[0])[:, :width])
+    # Ragged or short rows (optional w / vertex colours, `vt u`): gather the first `width` values of each line
+    first = np.cumsum(counts) - counts
+    columns = np.arange(width)
+    gathered = values[np.minimum(first[:, None] + columns, values.size - 1)]
+    return np.where(columns < counts[:, None], gathered, np.float32(0))
+
+
+def _parse_corners(blob, total):
+    """Parse face corners into a (total, 3) int64 array of raw v/vt/vn indices (0 = absent)"""
+    first = blob.split(None, 1)[0]
+    slashes = first.count(b'/')
+    double = b'//' in first
+    consistent = (blob.count(b'/') == total * slashes and
+                  blob.count(b'//') == (total if double else 0))
+    if consistent:
+        text = blob.replace(b'//', b'/0/').replace(b'/', b' ') if slashes else blob
+        values = np.fromstring(text, dtype=np.int64, sep=' ')
+        if values.size == total * (slashes + 1):
+            corners = np.zeros((total, 3), dtype=np.int64)
+            corners[:, :slashes + 1] = values.reshape(total, slashes + 1)
+            return corners
+
+    # Mixed formats, fall back to the (slower) per corner regex
+    found = _CORNER_RE.findall(blob)
+    if len(found) != total:
+        raise ValueError("malformed face record")
+    return np.array([(int(v), int(t or 0), int(n or 0)) for v, t, n in found], dtype=np.int64)
+
+
+def _resolve(indices, count, before):
+    """Convert 1-based (or negative, relative) OBJ indices to 0-based, -1 for absent"""
+    resolved = np.where(indices > 0, indices - 1, -1)
+    negative = indices < 0
+    if negative.any():
+        resolved[negative] = before[negative] + indices[negative]
+    if resolved.size and (resolved.max() >= count or (resolved[indices != 0] < 0).any()):
+        raise ValueError("face index out of range")
+    return resolved
+
+
+def _parse_chunk(data):
+    """
+    Parse whole lines of OBJ text, leaving face indices unresolved.
+    :return: dict with the 'positions', 'texcoords' and 'normals' of the chunk, int64 'corners' (K, 3) of raw
+             v/vt/vn indices (0 = absent), 'sizes' (corners per face) and, when there are relative indices,
+             int64 'before' (K, 3): v/vt/vn records of the chunk above each corner's face
+    """
+    arr, records = _split_records(data)
+    positions, texcoords, normals = (
+        _parse_floats(_gather(arr, *records[keyword], len(keyword)), len(records[keyword][0]), width, minimum)
+        for keyword, width, minimum in (("v", 3, 3), ("vt", 2, 1), ("vn", 3, 3))
+    )
+    chunk = {"positions": positions, "texcoords": texcoords, "normals": normals}
+
+    face_starts, face_ends = records["f"]
+    if not len(face_starts):
+        chunk["corners"] = np.zeros((0, 3), dtype=np.int64)
+        chunk["sizes"] = np.zeros(0, dtype=np.int64)
+        return chunk
+    blob = _gather(arr, face_starts, face_ends, 1)
+    sizes = _tokens_per_line(blob)
+    if sizes.min() < 3:
+        raise ValueError("face with fewer than 3 corners")
+    corners = _parse_corners(blob, int(sizes.sum()))
+    chunk["corners"] = corners
+    chunk["sizes"] = sizes
+
+    # Relative indices count back from the number of records seen before the face
+    if (corners < 0).any():
+        face_offsets = np.repeat(face_starts, sizes)
+        chunk["before"] = np.stack([np.searchsorted(records[keyword][0], face_offsets)
+                                    for keyword in _KEYWORDS], axis=1)
+    return chunk
+
+
+def _merge(chunks):
+    """Join the chunks of one file in order and resolve their face indices, see parse_obj()"""
+    merged = {key: np.concatenate([chunk[key] for chunk in chunks])
+              for key in ("positions", "texcoords", "normals", "corners", "sizes")}
+    corners, sizes = merged["corners"], merged["sizes"]
+    if not len(sizes):
+        raise ValueError("no faces found")
+
+    before = np.zeros_like(corners)
+    if any("before" in chunk for chunk in chunks):
+        # Records of the earlier chunks come before every face of a chunk
+        counts = np.array([[len(chunk[key]) for key in ("positions", "texcoords", "normals")] for chunk in chunks])
+        preceding = np.cumsum(counts, axis=0) - counts
+        start = 0
+        for chunk, offset in zip(chunks, preceding):
+            end = start + len(chunk["corners"])
+            before[start:end] = chunk["before"] + offset if "before" in chunk else offset
+            start = end
+
+    corners = np.stack([
+        _resolve(corners[:, 0], len(merged["positions"]), before[:, 0]),
+        _resolve(corners[:, 1], len(merged["texcoords"]), before[:, 1]),
+        _resolve(corners[:, 2], len(merged["normals"]), before[:, 2]),
+    ], axis=1)
+    if (corners[:, 0] < 0).any():
+        raise ValueError("face corner without a vertex index")
+
+    return {
+        "positions": merged["positions"],
+        "texcoords": merged["texcoords"],
+        "normals": merged["normals"],
+        "triangles": corners[fan_triangulate(sizes)],
+    }
+
+
+def parse_obj(data):
+    """
+    Parse OBJ text into raw arrays.
+    :param data: File contents as bytes.
+    :return: dict with float32 'positions' (N, 3), 'texcoords' (N, 2), 'normals' (N, 3)
+             and int64 'triangles' (T, 3, 3) holding 0-based v/vt/vn indices per corner (-1 = absent).
+    """
+    return _merge([_parse_chunk(data)])
+
+
+def split_ranges(data, count):
+    """Cut data (bytes or mmap) into up to count (start, end) ranges of whole lines"""
+    size = len(data)
+    bounds = [0]
+    for i in range(1, count):
+        newline = data.find(b'\n', max(size * i // count - 1, bounds[-1]))
+        if newline < 0:
+            break
+        bounds.append(newline + 1)
+    if bounds[-1] < size:
+        bounds.append(size)
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+def _share(arrays):
+    """Copy arrays into one new shared memory block, return its name and (key, dtype, shape, offset) layout"""
+    from multiprocessing import shared_memory
+    layout, size = [], 0
+    for key, array in arrays.items():
+        layout.append((key, array.dtype.str, array.shape, size))
+        size += -(-array.nbytes // 8) * 8
+    block = shared_memory.SharedMemory(create=True, size=max(size, 1))
+    try:
+        for key, dtype, shape, offset in layout:
+            np.ndarray(shape, dtype, buffer=block.buf, offset=offset)[...] = arrays[key]
+    except BaseException:
+        block.close()
+        block.unlink()
+        raise
+    block.close()  # the parent unlinks it
+    return block.name, layout
+
+
+def _parse_range(path, start, end):
+    """Process pool worker: parse one range of the file, the result goes back through shared memory"""
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        data = mapped[start:end]
+    return _share(_parse_chunk(data))
+
+
+def _parse_parallel(path, mapped, workers):
+    from concurrent.futures import ProcessPoolExecutor
+    import multiprocessing
+    from multiprocessing import shared_memory
+    ranges = split_ranges(mapped, max(workers, -(-len(mapped) // RANGE_BYTES)))
+    # Never fork: the viewer loads meshes on a thread next to its GL context
+    method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+
+    blocks, chunks = [], []
+    try:
+        with ProcessPoolExecutor(min(workers, len(ranges)), mp_context=multiprocessing.get_context(method)) as pool:
+            futures = [pool.submit(_parse_range, path, start, end) for start, end in ranges]
+            for future in futures:
+                name, layout = future.result()
+                block = shared_memory.SharedMemory(name=name)
+                blocks.append(block)
+                chunks.append({key: np.ndarray(shape, dtype, buffer=block.buf, offset=offset)
+                               for key, dtype, shape, offset in layout})
+        return _merge(chunks)
+    finally:
+        chunks.clear()  # the views have to go before their blocks can close
+        for block in blocks:
+            block.close()
+            block.unlink()
+
+
+def parse_obj_file(path, workers=None):
+    """
+    parse_obj() of a file, on several processes when it's big.
+    :param workers: Worker processes, os.cpu_count() by default, 1 parses in this process
+    """
+    workers = workers or os.cpu_count() or 1
+    with open(path, 'rb') as f:
+        if workers == 1 or os.fstat(f.fileno()).st_size < PARALLEL_MIN_BYTES:
+            return parse_obj(f.read())
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            return _parse_parallel(path, mapped, workers)
+
+
+def load_obj(path, workers=None):
+    """
+    Load an OBJ file in the viewer's (vertices, faces, texture_coords) layout.
+    Each unique v/vt pair becomes one vertex, so texture_coords is per vertex
+    and faces can be fed straight to an index buffer.
+    :param workers: See parse_obj_file()
+    """
+    parsed = parse_obj_file(path, workers)
+
+    positions = parsed["positions"]
+    texcoords = parsed["texcoords"]
+    corners = parsed["triangles"].reshape(-1, 3)
+
+    stride = len(texcoords) + 1
+    keys = corners[:, 0] * stride + (corners[:, 1] + 1)
+    unique, inverse = np.unique(keys, return_inverse=True)
+
+    vertices = positions[unique // stride]
+    uv_index = unique % stride - 1
+    texture_coords = np.zeros((len(unique), 2), dtype=np.float32)
+    has_uv = uv_index >= 0
+    texture_coords[has_uv] = texcoords[uv_index[has_uv]]
+    faces = inverse.reshape(-1, 3).astype(np.uint32)
+    return vertices, faces, texture_coords
@@ -1,4 +1,5 @@
 # cube.py
+from mesh_tools import subdivide_faces
 
 # Define the vertices for the cube
 vertices = [
@@ -25,4 +26,8 @@ faces = [
 # Define texture coordinates for each face
 texture_coords = [
     [0, 0], [1, 0], [1, 1], [0, 1]
-]
\ No newline at end of file
+]
+
+def generate(size=1.0, subdivisions=0):
+    """Cube with every face split into (subdivisions + 1)^2 quads, e.g. -o cube:subdivisions=8"""
+    return subdivide_faces([[c * float(size) for c in v] for v in vertices], faces, texture_coords, subdivisions)
@@ -1,3 +1,5 @@
+from mesh_tools import subdivide_faces
+
 vertices = [
     [0, 1, 0],    # Top vertex
     [1, 0, 0],    # Right vertex
@@ -28,3 +30,8 @@ texture_coords = [
     [0.5, 1.0], [0.0, 0.0], [1.0, 0.0],
     [0.5, 1.0], [0.0, 0.0], [1.0, 0.0]
 ]
+
+
+def generate(size=1.0, subdivisions=0):
+    """Every face split into (subdivisions + 1)^2 pieces, e.g. -o octahedron:subdivisions=8"""
+    return subdivide_faces([[c * float(size) for c in v] for v in vertices], faces, texture_coords, subdivisions)
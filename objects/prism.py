@@ -1,3 +1,5 @@
+from mesh_tools import subdivide_faces
+
 vertices = [
     [0, 1, 0],     # Top (0)
     [-1, -1, -1],  # Base front left (1)
@@ -15,6 +17,13 @@ faces = [
 ]
 
 texture_coords = [
-    [0.5, 1.0], [0.0, 0.0], [1.0, 0.0],  # For triangular faces
+    [0.5, 1.0], [0.0, 0.0], [1.0, 0.0],  # For triangular faces, one per corner
+    [0.5, 1.0], [0.0, 0.0], [1.0, 0.0],
+    [0.5, 1.0], [0.0, 0.0], [1.0, 0.0],
+    [0.5, 1.0], [0.0, 0.0], [1.0, 0.0],
     [0.0, 0.0], [1.0, 0.0], [1.0, 1.0], [0.0, 1.0]  # For square base
-]
\ No newline at end of file
+]
+
+def generate(size=1.0, subdivisions=0):
+    """Every face split into (subdivisions + 1)^2 pieces, e.g. -o prism:subdivisions=8"""
+    return subdivide_faces([[c * float(size) for c in v] for v in vertices], faces, texture_coords, subdivisions)
@@ -1,41 +1,33 @@
-import math
+import numpy as np
+from mesh_tools import grid_faces
 
 def generate_sphere(radius=1.0, lat_divisions=20, long_divisions=20):
-    vertices = []
-    faces = []
-    texture_coords = []
-    
-    # Generate vertices
-    for lat in range(lat_divisions + 1):
-        lat_angle = (math.pi * lat) / lat_divisions
-        for long in range(long_divisions + 1):
-            long_angle = (2 * math.pi * long) / long_divisions
-            
-            # Calculate vertex position
-            x = radius * math.sin(lat_angle) * math.cos(long_angle)
-            y = radius * math.cos(lat_angle)
-            z = radius * math.sin(lat_angle) * math.sin(long_angle)
-            
-            vertices.append([x, y, z])
-            
-            # Calculate texture coordinates
-            u = long / long_divisions
-            v = lat / lat_divisions
-            texture_coords.append([u, v])
-    
-    # Generate faces
-    for lat in range(lat_divisions):
-        for long in range(long_divisions):
-            # Calculate vertex indices
-            current = lat * (long_divisions + 1) + long
-            next_lat = (lat + 1) * (long_divisions + 1) + long
-            
-            # Create two triangles for each face
-            faces.append([current, next_lat, next_lat + 1])
-            faces.append([current, next_lat + 1, current + 1])
-    
+    # Angles for every grid row (latitude) and column (longitude)
+    lat = np.arange(lat_divisions + 1)[:, None]
+    long = np.arange(long_divisions + 1)[None, :]
+    lat_angle = np.pi * lat / lat_divisions
+    long_angle = 2 * np.pi * long / long_divisions
+
+    # Calculate vertex positions
+    x = radius * np.sin(lat_angle) * np.cos(long_angle)
+    y = radius * np.cos(lat_angle) * np.ones_like(long_angle)
+    z = radius * np.sin(lat_angle) * np.sin(long_angle)
+    vertices = np.stack([x, y, z], axis=-1).reshape(-1, 3).astype(np.float32)
+
+    # Calculate texture coordinates
+    u = np.broadcast_to(long / long_divisions, x.shape)
+    v = np.broadcast_to(lat / lat_divisions, x.shape)
+    texture_coords = np.stack([u, v], axis=-1).reshape(-1, 2).astype(np.float32)
+
+    # Two triangles for each grid cell
+    faces = grid_faces(lat_divisions, long_divisions).astype(np.uint32)
+
     return vertices, faces, texture_coords
 
+def generate(radius=1.0, lat=20, long=20):
+    """Parametric entry point, e.g. -o sphere:lat=2000,long=2000"""
+    return (*generate_sphere(float(radius), int(lat), int(long)), "vertex")
+
 # Generate the sphere with desired parameters
 radius = 1.0
 lat_divisions = 20
@@ -0,0 +1,127 @@
+"""
+HUD overlay that lives in one persistent GL texture.
+
+Glyphs are rasterized once into an atlas surface, so changing a line only blits
+glyphs from the atlas instead of calling the font renderer. Lines are checked for
+changes at most `refresh_rate` times per second, and only the band of rows that
+actually changed is re-uploaded with glTexSubImage2D. Scaling to the window is
+done by the GPU when the quad is drawn.
+"""
+import time
+import pygame
+from OpenGL.GL import *
+
+BACKGROUND = (0, 0, 0, 128)
+TEXT_COLOR = (255, 255, 255)
+
+
+class GlyphAtlas:
+    def __init__(self, font, chars=None):
+        chars = chars or [chr(c) for c in range(32, 127)]
+        glyphs = [font.render(ch, True, TEXT_COLOR) for ch in chars]
+        self.height = max(g.get_height() for g in glyphs)
+        self.surface = pygame.Surface((sum(g.get_width() for g in glyphs), self.height), pygame.SRCALPHA)
+        self.rects = {}
+        x = 0
+        for ch, glyph in zip(chars, glyphs):
+            self.surface.blit(glyph, (x, 0))
+            self.rects[ch] = pygame.Rect(x, 0, glyph.get_width(), glyph.get_height())
+            x += glyph.get_width()
+
+    def blit_text(self, target, text, pos):
+        x, y = pos
+        for ch in text:
+            rect = self.rects.get(ch) or self.rects["?"]
+            target.blit(self.surface, (x, y), rect)
+            x += rect.width
+
+
+class HudOverlay:
+    def __init__(self, font, size=(280, 337), refresh_rate=4, margin=10, spacing=5):
+        self.size = size
+        self.refresh_interval = 1.0 / refresh_rate if refresh_rate else 0.0
+        self.margin = margin
+        self.line_height = font.get_height() + spacing
+        self.atlas = GlyphAtlas(font)
+        self.surface = pygame.Surface(size, pygame.SRCALPHA)
+        self.surface.fill(BACKGROUND)
+        self.lines = []
+        self.next_refresh = 0.0
+
+        # Allocated once, later updates only touch the rows that changed
+        self.texture = glGenTextures(1)
+        glBindTexture(GL_TEXTURE_2D, self.texture)
+        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_LINEAR)
+        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_LINEAR)
+        glTexImage2D(GL_TEXTURE_2D, 0, GL_RGBA, size[0], size[1], 0, GL_RGBA, GL_UNSIGNED_BYTE,
+                     pygame.image.tostring(self.surface, "RGBA", True))
+        glBindTexture(GL_TEXTURE_2D, 0)
+
+    def update(self, lines, now=None):
+        """Redraw and upload the lines whose text changed, at most refresh_rate times per second"""
+        now = time.perf_counter() if now is None else now
+        if now < self.next_refresh:
+            return
+        self.next_refresh = now + self.refresh_interval
+
+        changed = [i for i, line in enumerate(lines) if i >= len(self.lines) or self.lines[i] != line]
+        changed += range(len(lines), len(self.lines))  # lines that disappeared
+        self.lines = list(lines)
+        if not changed:
+            return
+
+        width, height = self.size
+        for i in changed:
+            row = pygame.Rect(0, self.margin + i * self.line_height, width, self.line_height)
+            self.surface.fill(BACKGROUND, row)
+            if i < len(lines):
+                self.atlas.blit_text(self.surface, lines[i], (self.margin, row.y))
+
+        # Upload the band of rows spanning every changed line
+        top = max(0, self.margin + min(changed) * self.line_height)
+        bottom = min(height, self.margin + (max(changed) + 1) * self.line_height)
+        if top >= bottom:
+            return
+        band = self.surface.subsurface(pygame.Rect(0, top, width, bottom - top))
+        glBindTexture(GL_TEXTURE_2D, self.texture)
+        glTexSubImage2D(GL_TEXTURE_2D, 0, 0, height - bottom, width, bottom - top, GL_RGBA, GL_UNSIGNED_BYTE,
+                        pygame.image.tostring(band, "RGBA", True))
+        glBindTexture(GL_TEXTURE_2D, 0)
+
+    def draw(self, window_size, scaled_size):
+        """Draw the overlay in the top-left corner, scaled to scaled_size pixels"""
+        scaled_width, scaled_height = scaled_size
+
+        # Setup orthographic projection
+        glMatrixMode(GL_PROJECTION)
+        glPushMatrix()
+        glLoadIdentity()
+        glOrtho(0, window_size[0], window_size[1], 0, -1, 1)
+        glMatrixMode(GL_MODELVIEW)
+        glPushMatrix()
+        glLoadIdentity()
+
+        glEnable(GL_BLEND)
+        glBlendFunc(GL_SRC_ALPHA, GL_ONE_MINUS_SRC_ALPHA)
+        glEnable(GL_TEXTURE_2D)
+        glBindTexture(GL_TEXTURE_2D, self.texture)
+
+        glBegin(GL_QUADS)
+        glTexCoord2f(0, 1); glVertex2f(0, 0)
+        glTexCoord2f(1, 1); glVertex2f(scaled_width, 0)
+        glTexCoord2f(1, 0); glVertex2f(scaled_width, scaled_height)
+        glTexCoord2f(0, 0); glVertex2f(0, scaled_height)
+        glEnd()
+
+        glDisable(GL_TEXTURE_2D)
+        glDisable(GL_BLEND)
+
+        # Restore matrices
+        glPopMatrix()
+        glMatrixMode(GL_PROJECTION)
+        glPopMatrix()
+        glMatrixMode(GL_MODELVIEW)
+        glBindTexture(GL_TEXTURE_2D, 0)
+
+    def delete(self):
+        glDeleteTextures(1, [self.texture])
@@ -0,0 +1,102 @@
+"""
+Frame pacing and fixed-timestep simulation.
+
+FramePacer schedules frames against absolute perf_counter() deadlines, so errors
+don't accumulate the way they do with clock.tick(). It sleeps for most of the
+wait and busy-waits the last bit, because sleep() can overshoot by a millisecond
+or more (much more on Windows). The spin margin follows the worst overshoot seen
+recently.
+
+FixedTimestep turns variable frame times into a whole number of constant
+simulation steps. alpha is how far rendering is between the last two steps, so
+the view can be interpolated instead of moving in uneven jumps.
+"""
+import time
+from collections import deque
+from time import perf_counter
+
+MIN_SPIN = 0.0005
+MAX_SPIN = 0.02
+
+
+class FramePacer:
+    def __init__(self, target_fps=0, history=120):
+        self.period = 0.0
+        self.set_target(target_fps)
+        self.spin = 0.002  # busy-wait this long before each deadline
+        self.frame_times = deque(maxlen=history)
+        self.last = perf_counter()
+        self.deadline = self.last
+
+    def set_target(self, target_fps):
+        """0 = unlimited (or paced by vsync)"""
+        self.period = 1.0 / target_fps if target_fps else 0.0
+
+    def wait(self):
+        """Wait for the next frame deadline, returns the time since the previous frame in seconds"""
+        now = perf_counter()
+        if self.period:
+            deadline = self.deadline + self.period
+            if deadline < now - self.period:
+                deadline = now  # more than a frame behind, don't rush to catch up
+            if deadline - now > self.spin:
+                before = perf_counter()
+                time.sleep(deadline - now - self.spin)
+                overshoot = perf_counter() - before - (deadline - now - self.spin)
+                self.spin = min(max(self.spin * 0.99, overshoot * 1.25, MIN_SPIN), MAX_SPIN)
+            while perf_counter() < deadline:
+                pass
+            self.deadline = deadline
+            now = perf_counter()
+        else:
+            self.deadline = now
+
+        frame_time = now - self.last
+        self.last = now
+        self.frame_times.append(frame_time)
+        return frame_time
+
+    @property
+    def fps(self):
+        total = sum(self.frame_times)
+        return len(self.frame_times) / total if total else 0.0
+
+    @property
+    def jitter(self):
+        """Standard deviation of the recent frame times in milliseconds"""
+        count = len(self.frame_times)
+        if count < 2:
+            return 0.0
+        mean = sum(self.frame_times) / count
+        return (sum((t - mean) ** 2 for t in self.frame_times) / count) ** 0.5 * 1000.0
+
+
+class FixedTimestep:
+    def __init__(self, rate=120, max_steps=8):
+        self.step = 1.0 / rate
+        self.max_steps = max_steps
+        self.accumulator = 0.0
+
+    def advance(self, frame_time):
+        """Add a frame's worth of time, returns how many simulation steps to run"""
+        self.accumulator += frame_time
+        steps = int(self.accumulator / self.step)
+        if steps > self.max_steps:
+            # After a long stall skip ahead instead of simulating the whole gap
+            self.accumulator = 0.0
+            return self.max_steps
+        self.accumulator -= steps * self.step
+        return steps
+
+    @property
+    def alpha(self):
+        return self.accumulator / self.step
+
+
+def lerp(a, b, t):
+    return a + (b - a) * t
+
+
+def lerp_angle(a, b, t):
+    """Interpolate angles in degrees the short way around, so 359 -> 1 doesn't spin backwards"""
+    return a + ((b - a + 180.0) % 360.0 - 180.0) * t
@@ -0,0 +1,118 @@
+"""
+Per-phase frame profiler.
+
+The main loop calls lap(name) after each phase (events, input, drawing, ...), so
+every phase costs one perf_counter() call and one list append. Recent frames are
+averaged for the overlay, and the whole recording can be exported as a Chrome
+trace (open it in chrome://tracing or https://ui.perfetto.dev) or as CSV.
+When profiling is off the loop gets a NullProfiler whose methods do nothing.
+"""
+import csv
+import json
+from collections import deque
+from time import perf_counter
+
+
+class FrameProfiler:
+    enabled = True
+
+    def __init__(self, window=60, max_frames=100000):
+        self.window = window
+        self.frames = deque(maxlen=max_frames)  # [(phase, start, end), ...] per frame, for export
+        self.recent = deque()  # {phase: seconds} of the last `window` frames
+        self.totals = {}       # phase -> summed seconds over self.recent
+        self.phases = []       # phase names in the order they were first seen
+        self.current = None
+        self.last = 0.0
+
+    def begin_frame(self):
+        self.current = []
+        self.last = perf_counter()
+
+    def lap(self, name):
+        """Close the phase that ran since the previous lap (or the start of the frame)"""
+        now = perf_counter()
+        self.current.append((name, self.last, now))
+        self.last = now
+
+    def end_frame(self):
+        if not self.current:
+            return
+        self.frames.append(self.current)
+
+        durations = {}
+        for name, start, end in self.current:
+            durations[name] = durations.get(name, 0.0) + end - start
+        self.current = None
+
+        # Keep running sums so the rolling average doesn't rescan the window every frame
+        self.recent.append(durations)
+        for name, seconds in durations.items():
+            if name not in self.totals:
+                self.totals[name] = 0.0
+                self.phases.append(name)
+            self.totals[name] += seconds
+        if len(self.recent) > self.window:
+            for name, seconds in self.recent.popleft().items():
+                self.totals[name] -= seconds
+
+    def averages(self):
+        """Average milliseconds per phase over the recent frames, in phase order"""
+        count = max(len(self.recent), 1)
+        return [(name, self.totals[name] / count * 1000.0) for name in self.phases]
+
+    def overlay_lines(self):
+        averages = self.averages()
+        lines = [f"Frame: {sum(ms for _, ms in averages):.2f} ms"]
+        lines += [f"  {name}: {ms:.2f} ms" for name, ms in averages]
+        return lines
+
+    def export(self, path):
+        """Write the recorded frames to path, as CSV if it ends in .csv and as a Chrome trace otherwise"""
+        if not self.frames:
+            return
+        origin = self.frames[0][0][1]
+        if path.lower().endswith(".csv"):
+            with open(path, "w", newline="") as f:
+                writer = csv.writer(f)
+                writer.writerow(["frame", "phase", "start_ms", "duration_ms"])
+                for frame, phases in enumerate(self.frames):
+                    for name, start, end in phases:
+                        writer.writerow([frame, name, f"{(start - origin) * 1000.0:.4f}", f"{(end - start) * 1000.0:.4f}"])
+        else:
+            events = []
+            for frame, phases in enumerate(self.frames):
+                # One enclosing event per frame with its phases nested underneath
+                start, end = phases[0][1], phases[-1][2]
+                events.append(_trace_event("frame", start, end, origin, {"frame": frame}))
+                events += [_trace_event(name, start, end, origin) for name, start, end in phases]
+            with open(path, "w") as f:
+                json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+        print(f"Frame profile written to {path}")
+
+
+def _trace_event(name, start, end, origin, args=None):
+    event = {"name": name, "cat": "frame", "ph": "X", "pid": 1, "tid": 1,
+             "ts": (start - origin) * 1e6, "dur": (end - start) * 1e6}
+    if args:
+        event["args"] = args
+    return event
+
+
+class NullProfiler:
+    enabled = False
+
+    def begin_frame(self):
+        pass
+
+    def lap(self, name):
+        pass
+
+    def end_frame(self):
+        pass
+
+    def overlay_lines(self):
+        return []
+
+    def export(self, path):
+        pass
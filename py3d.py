@@ -1,19 +1,59 @@
 import argparse
-import pygame
-import pygame.font
-import numpy 
+import os
+import sys
+import time
+from startup import StartupTimeline, NullStartupTimeline
+
+# Started before anything heavy is imported, so the timeline covers the imports too
+startup = StartupTimeline() if "--profile-startup" in sys.argv else NullStartupTimeline()
+
+# Headless runs and benchmarks have to pick the GL platform before OpenGL is first imported
+if ("--headless" in sys.argv or "bench" in sys.argv[1:2]) and sys.platform.startswith("linux") and not os.environ.get("DISPLAY"):
+    os.environ.setdefault("PYOPENGL_PLATFORM", "egl")
+    os.environ.setdefault("EGL_PLATFORM", "surfaceless")
+
+# PyOpenGL reads its checking flags once, when OpenGL is first imported
+if "--fast-gl" in sys.argv:
+    import OpenGL
+    OpenGL.ERROR_CHECKING = False  # no glGetError round trip after every call, the loop checks once per frame
+    OpenGL.ERROR_LOGGING = False
+    if os.environ.get("PYOPENGL_PLATFORM") == "egl":
+        # PyOpenGL 3.1 leaves this undefined with error checking off, and then OpenGL.EGL fails to import
+        import OpenGL.raw.EGL._errors
+        OpenGL.raw.EGL._errors.__dict__.setdefault("_error_checker", None)
+
 import threading
 import queue
 import numpy as np
-from pygame.locals import *
-from pygame import HWSURFACE, DOUBLEBUF
+startup.mark("import numpy")
 from OpenGL.GL import *
-from OpenGL.GLU import *
-from PIL import Image
+startup.mark("import OpenGL.GL")
+import mesh_cache
+import lod
+from vbo import MeshBuffer
+from textures import TextureManager
+import mesh_tools
+from mesh_tools import compile_mesh
+import mesh_optimizer
+from profiler import FrameProfiler, NullProfiler
+from gl_stats import GLStats, NullGLStats, GL_MODULES, check_errors
+from pacer import FramePacer, FixedTimestep, lerp, lerp_angle
+from culling import Bounds
+from transforms import gl_matrix
+from camera import Camera
+startup.mark("import viewer modules")
+# Only imported when a run needs them: pygame (a third of a second, and headless/bench runs on EGL never
+# open a window), PIL (first texture decode / PNG), the HUD and its font, scenes, the core profile
+# renderer and the GL call counters.
+pygame = None
 
 loaded_textures = []
+released_meshes = []  # release callables of the render paths and the scene the main loop draws, called by cleanup()
+mesh_load_cancel = threading.Event()  # set by cleanup(), the loader thread stops between detail levels
+texture_manager = TextureManager()
+missing_texture = None
 command_queue = queue.Queue()
-prev_tex_id = None  # Store the previous texture globally
+HUD_SIZE = (280, 337)
 
 
 # Will probably remove this, easily causes a memory leak
@@ -29,69 +69,165 @@ def console_input():
         # do nothing
         print("")
         
-def load_texture(image_path, old_texture=None):
-    global loaded_textures
-    
-    # Delete the old texture if it exists
-    if old_texture:
-        glDeleteTextures(1, [old_texture])
-        loaded_textures.remove(old_texture)  # Remove from tracking list
-    
-    # Generate new texture
-    texture = glGenTextures(1)
+def load_texture(image_path):
+    # Resident textures are returned straight from the cache, so switching is just a bind
+    texture = texture_manager.get(image_path)
     glBindTexture(GL_TEXTURE_2D, texture)
-
-    with Image.open(image_path) as image:
-        image = image.transpose(Image.FLIP_TOP_BOTTOM)
-        img_data = image.convert("RGBA").tobytes()
-
-    glTexImage2D(GL_TEXTURE_2D, 0, GL_RGBA, image.width, image.height, 0, GL_RGBA, GL_UNSIGNED_BYTE, img_data)
-    glGenerateMipmap(GL_TEXTURE_2D)
-
-    glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_LINEAR_MIPMAP_LINEAR)
-    glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_LINEAR)
-
-    # Track the new texture
-    loaded_textures.append(texture)
-
     return texture
 
 def draw_object(vertices, faces, texture_coords):
-    glBegin(GL_QUADS if len(faces[0]) == 4 else GL_TRIANGLES)
+    # Compiled meshes are triangles with one texture coordinate per vertex, indices checked at load time
+    glBegin(GL_TRIANGLES)
     for face in faces:
-        for i, vertex in enumerate(face):
-            glTexCoord2f(*texture_coords[i])  # Assign correct texture coordinate
+        for vertex in face:
+            glTexCoord2fv(texture_coords[vertex])
             glVertex3fv(vertices[vertex])
     glEnd()
 
-def load_object_module(module_path):
-    """Dynamically load an object module from a module path"""
-    try:
-        import importlib
+def create_display_list(vertices, faces, texture_coords):
+    display_list = glGenLists(1)
+    glNewList(display_list, GL_COMPILE)
+    draw_object(vertices, faces, texture_coords)
+    glEndList()
+    return display_list
 
-        # Import the module using its module path
-        module_pathfull = str("objects." + module_path)
-        module = importlib.import_module(module_pathfull)
+def create_render_path(render_path, vertices, faces, texture_coords, streams=None):
+    """
+    Build the GL resources of one render path.
+    :param streams: A list to stream the vbo/core buffers through instead of uploading them here,
+                    their MeshBuffer is appended and draws what has arrived so far (see MeshBuffer.upload)
+    :return: (draw_mesh, release) callables
+    """
+    stream = streams is not None
+    if render_path == "vbo":
+        # Interleaved position + uv buffers, drawn with one glDrawElements per frame
+        mesh_buffer = MeshBuffer(vertices, texture_coords, faces, stream)
+        if stream:
+            streams.append(mesh_buffer)
+        return mesh_buffer.draw, mesh_buffer.delete
+    if render_path == "displaylist":
+        display_list = create_display_list(vertices, faces, texture_coords)
+        return lambda: glCallList(display_list), lambda: glDeleteLists(display_list, 1)
+    if render_path == "core":
+        # Vertex array object, drawn by CoreRenderer's shader (begin() must come first)
+        from core_renderer import CoreMesh
+        mesh = CoreMesh(vertices, texture_coords, faces, stream)
+        if stream:
+            streams.append(mesh.buffer)
+        return mesh.draw, mesh.delete
+    return lambda: draw_object(vertices, faces, texture_coords), lambda: None
+
+def nearest_ready_level(level, draw_levels, level_buffers):
+    """
+    The detail level to draw in place of level: itself once its render path is built and fully uploaded,
+    otherwise the closest one that is (level itself while none is, it draws what has arrived so far).
+    :param level_buffers: MeshBuffer still or once streamed per level, None where nothing was streamed
+    """
+    ready = [i for i, draw in enumerate(draw_levels)
+             if draw is not None and (level_buffers[i] is None or level_buffers[i].complete)]
+    return min(ready, key=lambda i: (abs(i - level), i)) if ready else level
+
+def find_object_file(path):
+    """Resolve an object file either as given or relative to the objects directory"""
+    if os.path.exists(path):
+        return path
+    return os.path.join("objects", path)
+
+def parse_object_spec(spec):
+    """Split an object spec like 'sphere:lat=2000,long=2000' into ('sphere', {'lat': 2000, 'long': 2000})"""
+    import ast
+    name, _, arguments = spec.partition(":")
+    params = {}
+    for argument in filter(None, arguments.split(",")):
+        key, _, value = argument.partition("=")
+        try:
+            params[key.strip()] = ast.literal_eval(value.strip())
+        except (ValueError, SyntaxError):
+            params[key.strip()] = value.strip()
+    return name, params
 
+def object_source(module_path):
+    """
+    Resolve an object spec.
+    :return: (source file, generator parameters, build function returning (vertices, faces, texture_coords[, uv layout]))
+    """
+    module_path, params = parse_object_spec(module_path)
+    if module_path.lower().endswith(".obj"):
+        from obj_loader import load_obj
+        if params:
+            raise ValueError(".obj files take no parameters")
+        source = find_object_file(module_path)
+        return source, params, lambda: (*load_obj(source), "vertex")
+
+    import importlib
+    source = os.path.join("objects", *module_path.split(".")) + ".py"
+
+    def build():
+        # Import the module using its module path
+        module = importlib.import_module("objects." + module_path)
+        if params:
+            return module.generate(**params)
         return module.vertices, module.faces, module.texture_coords
+    return source, params, build
+
+def optimized(build, report=True):
+    """Wrap a build function so its mesh is welded, cleaned and reordered for the vertex cache"""
+    def build_optimized():
+        positions, uvs, indices = mesh_optimizer.optimize_mesh(*compile_mesh(*build()), report=report)
+        return positions, indices, uvs, "vertex"
+    return build_optimized
+
+def load_object_module(module_path, use_cache=True, cache_size=mesh_cache.MAX_CACHE_BYTES):
+    """
+    Load an object module (or a Wavefront .obj file) compiled to triangle arrays.
+    Modules with a generate() function accept parameters, e.g. 'sphere:lat=2000,long=2000'.
+    Compiled meshes are optimized (see mesh_optimizer) and cached on disk, so later launches skip
+    the module/parser and the optimizer entirely.
+    """
+    try:
+        source, params, build = object_source(module_path)
+        build = optimized(build)
+        if use_cache:
+            positions, uvs, indices = mesh_cache.load_mesh(source, build, {**params, "compiler": mesh_tools.VERSION, "optimizer": mesh_optimizer.VERSION}, max_bytes=cache_size)
+        else:
+            positions, uvs, indices = compile_mesh(*build())
+        return positions, indices, uvs
 
     except Exception as e:
         print(f"Error loading object file: {e}")
         # Load fallback cube data
         from objects.cube import vertices, faces, texture_coords
-        return vertices, faces, texture_coords
-
-def draw_overlay(font, window_size, fps, angle_x, angle_y, anti_aliasing_samples, texture, wireframe_mode, mm, delta_time, fov, refresh_rate, view_mode):
-    global prev_tex_id  # Reference the previous texture
-
-    if prev_tex_id is not None:
-        glDeleteTextures([prev_tex_id])  # Delete the old texture before creating a new one
-
-    # Create an overlay surface at a fixed "virtual" resolution
-    virtual_size = (280, 310)
-    overlay_surface = pygame.Surface(virtual_size, pygame.SRCALPHA)
-    overlay_surface.fill((0, 0, 0, 128))  # Optional: semi-transparent background
+        positions, uvs, indices = compile_mesh(vertices, faces, texture_coords)
+        return positions, indices, uvs
 
+def load_lod_chain(module_path, use_cache=True, cache_size=mesh_cache.MAX_CACHE_BYTES, cancel=None):
+    """
+    Load an object and its simplified versions (lod.RATIOS of the triangles), finest first.
+    Every level is decimated from the one before and cached next to the full mesh.
+    :param cancel: threading.Event, once set no further levels are built and the ones so far are returned
+    """
+    levels = [load_object_module(module_path, use_cache, cache_size)]
+    full = len(levels[0][1])
+    if full < lod.MIN_TRIANGLES:
+        return levels
+    try:
+        source, params, _ = object_source(module_path)
+    except Exception:
+        return levels  # load_object_module already reported it and fell back to the cube
+
+    for ratio in lod.RATIOS:
+        if cancel is not None and cancel.is_set():
+            break
+        positions, indices, uvs = levels[-1]
+        build = optimized(lambda p=positions, i=indices, u=uvs, t=int(full * ratio): (*lod.decimate(p, i, u, t), "vertex"), report=False)
+        if use_cache:
+            positions, uvs, indices = mesh_cache.load_mesh(source, build, {**params, "lod": ratio, "decimator": lod.VERSION, "compiler": mesh_tools.VERSION, "optimizer": mesh_optimizer.VERSION}, max_bytes=cache_size)
+        else:
+            positions, uvs, indices = compile_mesh(*build())
+        levels.append((positions, indices, uvs))
+    return levels
+
+def draw_overlay(hud, window_size, fps, angle_x, angle_y, anti_aliasing_samples, texture, wireframe_mode, mm, delta_time, fov, refresh_rate, view_mode, render_path, profile_lines=(), renderer=None):
     # Anti-aliasing and wireframe mode text
     aa = f"{anti_aliasing_samples}x" if anti_aliasing_samples > 1 else "Off"
     wf_mode = "Wireframe" if wireframe_mode else "Solid"
@@ -108,67 +244,21 @@ def draw_overlay(font, window_size, fps, angle_x, angle_y, anti_aliasing_samples
         f"Mipmapping: {mm}",
         f"Delta Time: {delta_time:.3f}",
         f"View mode: {view_mode}",
-        f"tex_debug: {prev_tex_id}"  # Debug previous texture ID
+        f"Render path: {render_path}",
+        f"tex_debug: {hud.texture}",  # Debug overlay texture ID, stays the same for the whole run
+        *profile_lines
     ]
 
-    # Render text
-    y = 10
-    for line in lines:
-        text_surface = font.render(line, True, (255, 255, 255))
-        overlay_surface.blit(text_surface, (10, y))
-        y += text_surface.get_height() + 5
+    # Only re-uploads the rows that changed, and only a few times per second
+    hud.update(lines)
 
-    # Scale overlay
+    # Scale overlay, a taller HUD (profiler lines) keeps the same text size
     scaled_width = window_size[0] // 3.6
-    scaled_height = window_size[1] // 2.2
-    scaled_overlay = pygame.transform.smoothscale(overlay_surface, (scaled_width, scaled_height))
-
-    # Convert the scaled surface to a texture
-    overlay_data = pygame.image.tostring(scaled_overlay, "RGBA", True)
-    tex_id = glGenTextures(1)  # Generate new texture
-    glBindTexture(GL_TEXTURE_2D, tex_id)
-    glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_LINEAR)
-    glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_LINEAR)
-    glTexImage2D(GL_TEXTURE_2D, 0, GL_RGBA, scaled_width, scaled_height, 0, GL_RGBA, GL_UNSIGNED_BYTE, overlay_data)
-
-    # Store the current texture for next frame deletion
-    prev_tex_id = tex_id  
-
-    # Setup orthographic projection
-    glMatrixMode(GL_PROJECTION)
-    glPushMatrix()
-    glLoadIdentity()
-    glOrtho(0, window_size[0], window_size[1], 0, -1, 1)
-    glMatrixMode(GL_MODELVIEW)
-    glPushMatrix()
-    glLoadIdentity()
-
-    # Enable blending and texture for overlay
-    glEnable(GL_BLEND)
-    glBlendFunc(GL_SRC_ALPHA, GL_ONE_MINUS_SRC_ALPHA)
-    glEnable(GL_TEXTURE_2D)
-
-    # Draw overlay quad
-    x_pos = 0
-    y_pos = 0  # Top-left corner
-    glBegin(GL_QUADS)
-    glTexCoord2f(0, 1); glVertex2f(x_pos, y_pos)
-    glTexCoord2f(1, 1); glVertex2f(x_pos + scaled_width, y_pos)
-    glTexCoord2f(1, 0); glVertex2f(x_pos + scaled_width, y_pos + scaled_height)
-    glTexCoord2f(0, 0); glVertex2f(x_pos, y_pos + scaled_height)
-    glEnd()
-
-    # Cleanup
-    glDisable(GL_TEXTURE_2D)
-    glDisable(GL_BLEND)
-
-    # Restore matrices
-    glPopMatrix()
-    glMatrixMode(GL_PROJECTION)
-    glPopMatrix()
-    glMatrixMode(GL_MODELVIEW)
-
-    glBindTexture(GL_TEXTURE_2D, 0)  # Unbind texture
+    scaled_height = window_size[1] // 2.0 * hud.size[1] / HUD_SIZE[1]
+    if renderer is not None:
+        renderer.draw_overlay(hud.texture, window_size, (scaled_width, scaled_height))
+    else:
+        hud.draw(window_size, (scaled_width, scaled_height))
 
 # todo:
 
@@ -193,6 +283,11 @@ def generate_missing_texture(size=128, squares=8):
     return image
 
 def load_missing_texture():
+    # Only ever uploaded once, it's shown every time a texture fails or is still loading
+    global missing_texture
+    if missing_texture is not None:
+        return missing_texture
+
     img_data = generate_missing_texture()
     size = img_data.shape[0]  # assuming square texture
     texture = glGenTextures(1)
@@ -204,160 +299,389 @@ def load_missing_texture():
     # Set texture parameters.
     glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_LINEAR)
     glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_LINEAR)
-    
+
+    loaded_textures.append(texture)  # freed by cleanup()
+    missing_texture = texture
     return texture
 
-def set_projection(mode):
-    glMatrixMode(GL_PROJECTION)
-    glLoadIdentity()
-    
-    if mode == 0:  # Perspective Projection
-        gluPerspective(60, 1024 / 768, 0.1, 50.0)
-
-    elif mode == 1:  # Orthographic Projection
-        glOrtho(-2.0, 2.0, -2.0, 2.0, 0.1, 50.0)
-
-    elif mode == 2:  # Isometric Projection
-        glOrtho(-2.0, 2.0, -2.0, 2.0, 0.1, 50.0)
-        glRotatef(35.26, 1, 0, 0)  # Tilt downwards
-        glRotatef(45, 0, 1, 0)  # Rotate for isometric effect
-
-    elif mode == 3:  # Oblique Projection
-        glOrtho(-2.0, 2.0, -2.0, 2.0, 0.1, 50.0)
-        shear_matrix = np.array([
-            [1, 0.5, 0, 0],  # Shear X
-            [0, 1, 0, 0],  # No shear Y
-            [0, 0, 1, 0],  
-            [0, 0, 0, 1]
-        ], dtype=np.float32)
-        glMultMatrixf(shear_matrix.flatten())  # Apply oblique shear
-
-    elif mode == 4:  # Fisheye-Like Projection (Extreme Perspective)
-        glFrustum(-1, 1, -1, 1, 0.1, 50.0)  # Wide frustum for distortion
-        glTranslatef(0, 0, -2)  # Pull back slightly
-    
-    glMatrixMode(GL_MODELVIEW)
-    glLoadIdentity()
+def core_renderer(render_path):
+    """The shader renderer for the core path, None (fixed-function state) for the others"""
+    if render_path != "core":
+        return None
+    from core_renderer import CoreRenderer
+    return CoreRenderer()
+
+def draw_view(renderer, draw_mesh, texture, projection, modelview):
+    """Draw the mesh with NumPy matrices, through the core profile renderer when there is one"""
+    if renderer is not None:
+        renderer.begin(projection, modelview)
+    else:
+        glMatrixMode(GL_PROJECTION)
+        glLoadMatrixf(gl_matrix(projection))
+        glMatrixMode(GL_MODELVIEW)
+        glLoadMatrixf(gl_matrix(modelview))
+    glBindTexture(GL_TEXTURE_2D, texture)
+    draw_mesh()
 
 def cleanup():
-    global loaded_textures
+    global loaded_textures, missing_texture
     for tex in loaded_textures:
         glDeleteTextures(1, [tex])
     loaded_textures.clear()
-    if prev_tex_id:
-        glDeleteTextures(1, [prev_tex_id])
+    mesh_load_cancel.set()
+    for release in released_meshes:
+        release()
+    released_meshes.clear()
+    texture_manager.release_all()
+    missing_texture = None
+
+def run_headless(args):
+    """Render the requested views offscreen straight to PNG files, no window or event loop"""
+    from headless import create_context, render_views, parse_angles, parse_projection, PROJECTION_NAMES
+
+    width, height = (int(v) for v in args.size.lower().split("x"))
+    create_context(width, height, core=args.render_path == "core")
+    renderer = core_renderer(args.render_path)
+    startup.mark("GL context")
+
+    vertices, faces, texture_coords = load_object_module(args.object or "cube", not args.no_mesh_cache,
+                                                         args.mesh_cache_size * 1024 * 1024)
+    startup.mark("load mesh")
+    draw_mesh, release_mesh = create_render_path(args.render_path, vertices, faces, texture_coords)
+    startup.mark("upload mesh")
+    try:
+        texture = load_texture("textures/" + args.texture if args.texture else "textures/1.jpg")
+    except FileNotFoundError:
+        print("Texture file not found. Using fallback texture.")
+        texture = load_missing_texture()
+    startup.mark("load texture")
+
+    glClearColor(0.13, 0.17, 0.23, 1.0)
+    if renderer is None:
+        glEnable(GL_TEXTURE_2D)
+    glEnable(GL_DEPTH_TEST)
+    camera = Camera()
+
+    def draw_scene(angle_x, angle_y, mode, aspect):
+        camera.mode, camera.aspect = mode, aspect
+        camera.orbit(angle_x=angle_x, angle_y=angle_y)
+        draw_view(renderer, draw_mesh, texture, camera.projection, camera.view)
+
+    projections = range(len(PROJECTION_NAMES)) if args.projections == "all" else \
+        [parse_projection(name) for name in args.projections.split(",")]
+    views = [(angle_x, angle_y, mode) for mode in projections for angle_x, angle_y in parse_angles(args.angles)]
+    prefix = parse_object_spec(args.object or "cube")[0].replace(os.sep, "_").replace(".", "_")
+    render_views(draw_scene, views, (width, height), args.output_dir, prefix, samples=args.samples)
+    startup.mark(f"render and save {len(views)} views")
+    startup.report()
+
+    release_mesh()
+    if renderer is not None:
+        renderer.delete()
+    cleanup()
+
+def run_bench(args):
+    """Render every benchmark scene along the scripted camera path and report the timings as JSON"""
+    import bench
+    from headless import create_context, Framebuffer
+
+    width, height = (int(v) for v in args.size.lower().split("x"))
+    create_context(width, height, core=args.render_path == "core")
+    renderer = core_renderer(args.render_path)
+    framebuffer = Framebuffer(width, height, args.samples)
+    startup.mark("GL context")
+    framebuffer.bind()
+    glClearColor(0.13, 0.17, 0.23, 1.0)
+    if renderer is None:
+        glEnable(GL_TEXTURE_2D)
+    glEnable(GL_DEPTH_TEST)
+    texture = load_texture("textures/" + args.texture if args.texture else "textures/1.jpg")
+    camera = Camera(aspect=width / height)
+    startup.mark("load texture")
+    startup.report()  # the scenes time themselves
+
+    results = []
+    for scene in (args.scenes.split(";") if args.scenes else bench.SCENES):
+        start = time.perf_counter()
+        vertices, faces, texture_coords = load_object_module(scene, not args.no_mesh_cache,
+                                                             args.mesh_cache_size * 1024 * 1024)
+        loaded = time.perf_counter()
+        draw_mesh, release_mesh = create_render_path(args.render_path, vertices, faces, texture_coords)
+        glFinish()
+        uploaded = time.perf_counter()
+
+        def draw_frame(frame, frames):
+            glClear(GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT)
+            angle_x, angle_y = bench.camera_path(frame, frames)
+            camera.orbit(angle_x=angle_x, angle_y=angle_y)
+            draw_view(renderer, draw_mesh, texture, camera.projection, camera.view)
+
+        frame_times = bench.time_frames(draw_frame, args.frames, args.warmup)
+        result = bench.summarize(scene, args.render_path, len(faces), loaded - start, uploaded - loaded, frame_times)
+        results.append(result)
+        print(f"{scene}: {result['frame_ms']['p50']:.2f} ms p50, {result['triangles_per_second'] / 1e6:.2f} M tris/s",
+              file=sys.stderr)
+        release_mesh()
+
+    report = {
+        "system": bench.system_info(),
+        "settings": {
+            "render_path": args.render_path,
+            "size": [width, height],
+            "samples": args.samples,
+            "frames": args.frames,
+            "warmup": args.warmup,
+            "mesh_cache": not args.no_mesh_cache,
+            "fast_gl": args.fast_gl,
+            "texture_compression": texture_manager.compression if texture_manager.cache_dir else "off",
+        },
+        "scenes": results,
+    }
+    framebuffer.delete()
+    if renderer is not None:
+        renderer.delete()
+    cleanup()
+    bench.write_report(report, args.report)
+
+def run_bake(args):
+    """Bake textures into the texture cache ahead of time, no GL needed"""
+    import texture_cache
+    if args.texture:
+        paths = ["textures/" + args.texture]
+    else:
+        paths = sorted(os.path.join("textures", name) for name in os.listdir("textures")
+                       if name.lower().endswith((".jpg", ".jpeg", ".png", ".bmp", ".tga")))
+    compression = args.texture_compression != "none"  # nothing to ask the GL here, "auto" compresses
+    for path in paths:
+        start = time.perf_counter()
+        baked = texture_cache.load_texture(path, compression)
+        uncompressed = baked.width * baked.height * 4 * 4 // 3
+        print(f"{path}: {baked.width}x{baked.height} {baked.format}, {len(baked.levels)} levels, "
+              f"{baked.nbytes / 2 ** 20:.2f} MB (RGBA8 with mipmaps: {uncompressed / 2 ** 20:.2f} MB), "
+              f"{time.perf_counter() - start:.2f}s")
 
 def main():
+    global pygame
     try:
         parser = argparse.ArgumentParser(description='3D Object Viewer')
-        parser.add_argument('-o', '--object', type=str, help='Path to object definition file')
+        parser.add_argument('command', nargs='?', choices=['bench', 'bake'], help='"bench" runs the benchmark suite instead of the viewer, "bake" fills the texture cache for -t or every image in textures/')
+        parser.add_argument('-o', '--object', type=str, help='Object module or .obj file, with optional generator parameters (e.g. sphere:lat=2000,long=2000)')
         parser.add_argument('-t', '--texture', type=str, help='Path to texture file')
+        parser.add_argument('--scene', help='Scene file (JSON) with many objects, textures and transforms, replaces -o')
+        parser.add_argument('--render-path', choices=['immediate', 'displaylist', 'vbo', 'core'], default='vbo', help='How the mesh is drawn each frame ("core": OpenGL 3.3 core profile shaders)')
+        parser.add_argument('--overlay-rate', type=float, default=4, help='How many times per second the overlay text is refreshed (0 = every frame)')
+        parser.add_argument('--texture-budget', type=int, default=texture_manager.vram_budget // (1024 * 1024), help='VRAM budget for cached textures in MB, least recently used textures are evicted beyond it')
+        parser.add_argument('--texture-compression', choices=['auto', 'bc', 'none'], default='auto', help='Store baked textures block-compressed (BC1/BC3) or as RGBA8, "auto" compresses when the GL supports S3TC')
+        parser.add_argument('--no-atlas', action='store_true', help='Give every scene texture its own GL texture instead of packing them into atlas pages')
+        parser.add_argument('--no-texture-cache', action='store_true', help='Decode textures and let GL build the mipmaps on every load instead of using the baked texture cache')
+        parser.add_argument('--upload-budget', type=float, default=4, help='Milliseconds per frame spent streaming mesh buffers to the GPU on the vbo/core paths, the mesh draws as it arrives (0 = upload it whole)')
+        parser.add_argument('--no-mesh-cache', action='store_true', help='Always rebuild the object instead of using the compiled mesh cache')
+        parser.add_argument('--mesh-cache-size', type=int, default=mesh_cache.MAX_CACHE_BYTES // (1024 * 1024), help='Compiled mesh cache size limit in MB')
+        parser.add_argument('--headless', action='store_true', help='Render --angles x --projections offscreen to PNG files and exit')
+        parser.add_argument('--size', default='1024x768', help='Headless image size, WIDTHxHEIGHT')
+        parser.add_argument('--angles', default='0,180', help='Headless camera angles as "angle_x,angle_y;angle_x,angle_y;..."')
+        parser.add_argument('--projections', default='perspective', help='Headless projection modes, comma separated names/indices or "all"')
+        parser.add_argument('--output-dir', default='renders', help='Directory the headless PNG files are written to')
+        parser.add_argument('--samples', type=int, default=4, help='Headless/benchmark multisampling level (0 = off)')
+        parser.add_argument('--profile', action='store_true', help='Time every phase of the frame loop and show the breakdown in the overlay')
+        parser.add_argument('--profile-output', help='Write the frame profile on exit, as CSV if the name ends in .csv, otherwise as a Chrome trace JSON')
+        parser.add_argument('--gl-stats', action='store_true', help='Count GL calls, uploaded bytes and created objects per frame, show them in the overlay and print a summary on exit')
+        parser.add_argument('--fast-gl', action='store_true', help='Turn off PyOpenGL\'s per-call error checking and logging, GL errors are checked once per frame instead')
+        parser.add_argument('--profile-startup', action='store_true', help='Print how long imports and each initialization step took, up to the first frame')
+        parser.add_argument('--vsync', action='store_true', help='Let the display\'s vsync pace frames instead of the frame timer')
+        parser.add_argument('--sim-rate', type=float, default=120, help='Input/camera simulation steps per second, rendering interpolates between steps')
+        parser.add_argument('--frames', type=int, default=300, help='Benchmark frames rendered per scene')
+        parser.add_argument('--warmup', type=int, default=30, help='Benchmark frames rendered per scene before timing starts')
+        parser.add_argument('--scenes', help='Benchmark scenes separated by ";" (default: bundled objects, blahaj.obj and large spheres)')
+        parser.add_argument('--report', help='Write the benchmark JSON report to this file instead of stdout')
         args = parser.parse_args()
-        projection_mode = 0  # 0 = Perspective, 1 = Ortho, 2 = Isometric, 3 = Oblique, 4 = Fisheye
+        if args.scene and args.render_path == "core":
+            parser.error("--scene needs a compatibility profile render path")
+        texture_manager.vram_budget = args.texture_budget * 1024 * 1024
+        texture_manager.compression = args.texture_compression
+        if args.no_texture_cache:
+            texture_manager.cache_dir = None
+        startup.mark("parse arguments")
+
+        if args.command == "bench":
+            run_bench(args)
+            return
+        if args.command == "bake":
+            run_bake(args)
+            return
+        if args.headless:
+            run_headless(args)
+            return
+        import pygame
+        startup.mark("import pygame")
         wireframe_mode = False
         mm = "on"
-        view_mode = "Perspective"
         mipmapping = False
-        camera_distance = -5 
-        clock = pygame.time.Clock()
-        frame_limit = 6  # Start with frame limiting enabled
-        refresh_rate = 165  # Target FPS
+        refresh_rate = 0 if args.vsync else 165  # Target FPS, with vsync the display paces frames
+        pacer = FramePacer(refresh_rate)
+        simulation = FixedTimestep(args.sim_rate)
+        delta_time = 0.0
         fps_display_timer = 0
         angle_x = 0.0  # Rotation around x-axis
         angle_y = 180.0  # Rotation around y-axis
+        pan_x = pan_y = pan_z = 0.0  # Keypad / page up/down movement
+        zoom = 1.0
+        # View at the previous simulation step, frames are drawn between it and the current one
+        previous = [angle_x, angle_y, pan_x, pan_y, pan_z, zoom]
         rotation_speed_factor = 0.1  # Adjust this for mouse sensitivity
-        width = 1024
-        height = 768
 
 
-        # Load object data - either from specified file or fallback to cube
-        if args.object:
-            vertices, faces, texture_coords = load_object_module(args.object)
-        else:            from objects.cube import vertices, faces, texture_coords
+        # Load object data - either from specified file or fallback to cube (scenes load theirs once GL is up).
+        # Loads on a daemon thread while the window opens, the loop picks the mesh up when it's ready and
+        # quitting never waits for it.
+        if not args.scene:
+            from concurrent.futures import Future
+            mesh_future = Future()
 
+            def load_mesh():
+                try:
+                    mesh_future.set_result(load_lod_chain(args.object or "cube", not args.no_mesh_cache, args.mesh_cache_size * 1024 * 1024,
+                                                          mesh_load_cancel))
+                except Exception as e:
+                    mesh_future.set_exception(e)
+            threading.Thread(target=load_mesh, name="mesh loader", daemon=True).start()
+            levels = None
+            mesh_error = None
+            startup.mark("start mesh load")
 
-        pygame.init()
 
-        font = pygame.font.Font(None, 32)
+        # Only the window, the other subsystems (audio, joystick, ...) are never used
+        pygame.display.init()
 
         # Request multisampling (anti-aliasing) settings
-        pygame.display.gl_set_attribute(GL_MULTISAMPLEBUFFERS, 1)
-        pygame.display.gl_set_attribute(GL_MULTISAMPLESAMPLES, 4)  # Default to 4x multisampling
+        pygame.display.gl_set_attribute(pygame.GL_MULTISAMPLEBUFFERS, 1)
+        pygame.display.gl_set_attribute(pygame.GL_MULTISAMPLESAMPLES, 4)  # Default to 4x multisampling
+        if args.render_path == "core":
+            from headless import request_core_profile
+            request_core_profile()
 
         # Don't listen to your ide
-        screen = pygame.display.set_mode((1024, 768), OPENGL | RESIZABLE | DOUBLEBUF)
+        try:
+            screen = pygame.display.set_mode((1024, 768), pygame.OPENGL | pygame.RESIZABLE | pygame.DOUBLEBUF, vsync=1 if args.vsync else 0)
+        except pygame.error as e:
+            print(f"Vsync unavailable ({e}), pacing frames with the timer instead")
+            refresh_rate = 165
+            pacer.set_target(refresh_rate)
+            screen = pygame.display.set_mode((1024, 768), pygame.OPENGL | pygame.RESIZABLE | pygame.DOUBLEBUF)
         # ^^^ this IS used, don't delete it
-        fov = 40
-        gluPerspective(fov, (1024 / 768), 0.1, 50.0)
-        glTranslatef(0.0, 0.0, camera_distance)
-
-        glEnable(GL_TEXTURE_2D)
+        startup.mark("open window")
+        # Projection mode, fov and orbit all live in the camera, aspect follows the real drawable size
+        width, height = screen.get_size()
+        camera = Camera(fov=40, distance=5.0)
+        camera.resize(width, height)
+        renderer = core_renderer(args.render_path)
+        if renderer is None:  # the core renderer has no fixed-function state to set up
+            glEnable(GL_TEXTURE_2D)
         glEnable(GL_DEPTH_TEST)
 
         anti_aliasing_samples = 4  # Default anti-aliasing level
         glEnable(GL_MULTISAMPLE)
-
-        def is_visible(position, radius):
-            # Simple sphere-frustum intersection test
-            x, y, z = position
-            return abs(x) < radius and abs(y) < radius and -5 < z < -1
-        
-        def create_display_list(vertices, faces, texture_coords):
-            display_list = glGenLists(1)
-            glNewList(display_list, GL_COMPILE)
-            draw_object(vertices, faces, texture_coords)
-            glEndList()
-            return display_list
-        
-        display_list = create_display_list(vertices, faces, texture_coords)
-
-        def setup_vbo(vertices, faces):
-            # Create buffers
-            vbo = glGenBuffers(1)
-            ebo = glGenBuffers(1)
-        
-            # Bind vertex buffer
-            glBindBuffer(GL_ARRAY_BUFFER, vbo)
-            glBufferData(GL_ARRAY_BUFFER, numpy.array(vertices, dtype=numpy.float32), GL_STATIC_DRAW)
-        
-            # Bind element buffer
-            glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, ebo)
-            glBufferData(GL_ELEMENT_ARRAY_BUFFER, numpy.array(faces, dtype=numpy.uint32), GL_STATIC_DRAW)
-        
-            return vbo, ebo
-
-        vbo, ebo = setup_vbo(vertices, faces)
-
+        startup.mark("GL state")
+
+        profiler = FrameProfiler() if args.profile or args.profile_output else NullProfiler()
+        if args.profile_output:
+            import atexit
+            atexit.register(profiler.export, args.profile_output)  # the loop exits through quit() in several places
+
+        gl_stats = GLStats() if args.gl_stats else NullGLStats()
+        if gl_stats.enabled:
+            gl_stats.install(sys.modules[__name__], *GL_MODULES)
+            import atexit
+            atexit.register(lambda: print(gl_stats.summary()))
+        gl_errors = set()  # reported once each with --fast-gl
+
+        # Room for the frame total and one line per profiled phase, the GL counters and the mesh status
+        from overlay import HudOverlay
+        pygame.font.init()
+        font = pygame.font.Font(None, 32)
+        hud_height = HUD_SIZE[1] + (11 * (font.get_height() + 5) if profiler.enabled else 0) + \
+            (3 * (font.get_height() + 5) if gl_stats.enabled else 0) + (0 if args.scene else font.get_height() + 5)
+        hud = HudOverlay(font, size=(HUD_SIZE[0], hud_height), refresh_rate=args.overlay_rate)
+        loaded_textures.append(hud.texture)  # freed by cleanup()
+        startup.mark("HUD")
+
+        scene = None
+        if args.scene:
+            def scene_texture_path(name):
+                return "textures/" + name
+
+            def load_scene_texture(name):
+                try:
+                    return texture_manager.acquire(texture_manager.get(scene_texture_path(name)))
+                except FileNotFoundError:
+                    print(f"Texture file {name} not found. Using fallback texture.")
+                    return load_missing_texture()
+
+            from scene import Scene, read_scene
+            # Entries without a texture use the default one, so every texture (and atlas tile) has a name
+            instances = read_scene(args.scene, args.texture or "1.jpg")
+            # Scenes with several textures draw from a few atlas pages instead
+            atlas = None
+            paths = {name: scene_texture_path(name) for _, name, _ in instances}
+            paths = {name: path for name, path in paths.items() if os.path.exists(path)}
+            if not args.no_atlas and len(paths) > 1:
+                from atlas import TextureAtlas
+                atlas = TextureAtlas(paths, texture_manager.use_compression(), texture_manager.cache_dir)
+                loaded_textures.extend(atlas.pages)  # freed by cleanup()
+                print(f"Texture atlas: {len(atlas.tiles)} of {len(paths)} textures on {len(atlas.pages)} pages")
+            scene = Scene(instances,
+                          lambda spec: load_lod_chain(spec, not args.no_mesh_cache, args.mesh_cache_size * 1024 * 1024),
+                          load_scene_texture, atlas=atlas, release_texture=texture_manager.release)
+            released_meshes.append(scene.delete)  # buffers, program and texture pins, see cleanup()
+            render_path = scene.render_path
+        else:
+            # Exactly one render path draws the mesh each frame, with one set of resources per detail level.
+            # A level's buffers/display list are built the first time it is picked, small windows and far
+            # views never pay for the finest one.
+            render_path = args.render_path
+            draw_levels = []  # filled in once the mesh is loaded
+            level_buffers = []  # the streamed MeshBuffer of each level, see nearest_ready_level()
+            streams = []  # MeshBuffers still uploading, args.upload_budget ms of it per frame
+        lod_level = 0
+        startup.mark("scene" if scene is not None else "render path")
+
+
+        # Textures decode in the background, whatever is on screen keeps rendering until they're ready
+        # The texture on screen stays pinned in the texture manager, eviction never deletes it
+        texture = texture_manager.acquire(load_missing_texture())
+        wanted_texture = None
+
+        def show_texture(new):
+            nonlocal texture
+            texture_manager.acquire(new)
+            texture_manager.release(texture)
+            texture = new
+
+        def request_texture(path):
+            nonlocal wanted_texture
+            wanted_texture = os.path.abspath(path)
+            ready = texture_manager.request(path)
+            if ready is not None:
+                show_texture(ready)
 
         try:
             if args.texture:
-                try:
-                    texturename = str("textures/" + args.texture)
-                    texture = load_texture(texturename)
-                except FileNotFoundError:
-                    print("Texture file not found. Using fallback texture.")
-                    load_missing_texture()  # Fallback texture
-            else:        
-                texture = load_texture("textures/1.jpg")  # Use the provided texture file
+                request_texture("textures/" + args.texture)
+            else:
+                request_texture("textures/1.jpg")  # Use the provided texture file
         except FileNotFoundError:
             print("Texture file not found. Using fallback texture.")
-            load_missing_texture()  # Fallback texture
+        startup.mark("request texture")
+
 
+        first_frame = True
 
         # while true my beloved :3
         while True:
+            profiler.begin_frame()
             keys = pygame.key.get_pressed()
             glClearColor(0.13, 0.17, 0.23, 1.0)  # RGB for sky-blue
 
-            if angle_x > 360:
-                angle_x = 0
-            if angle_y > 360:
-                angle_y = 0
-            if angle_x < 0:
-                angle_x = 360
-            if angle_y < 0:
-                angle_y = 360
-
             # Process commands
             while not command_queue.empty():
                 command = command_queue.get()
@@ -367,8 +691,48 @@ def main():
                     quit()
                 elif command.startswith("texture "):
                     _, path = command.split(" ", 1)
-                    texture = load_texture(path)
-                    print(f"Texture set to {path}")
+                    try:
+                        request_texture(path)
+                        print(f"Loading texture {path}")
+                    except FileNotFoundError:
+                        print(f"Texture file {path} not found.")
+            profiler.lap("commands")
+
+            # Swap in textures whose background decode finished
+            for path, loaded in texture_manager.poll():
+                if path == wanted_texture:
+                    if loaded is None:
+                        show_texture(load_missing_texture())
+                    else:
+                        show_texture(loaded)
+                        print(f"Texture set to {path}")
+            profiler.lap("textures")
+
+            # Pick up the mesh once the loader thread has it
+            if scene is None and levels is None and mesh_future.done():
+                try:
+                    levels = mesh_future.result()
+                except Exception as e:
+                    # Anything load_object_module didn't catch itself, shown in the overlay instead of ending the viewer
+                    print(f"Error loading object: {e}")
+                    mesh_error = str(e)
+                    from objects.cube import vertices, faces, texture_coords
+                    positions, uvs, indices = compile_mesh(vertices, faces, texture_coords)
+                    levels = [(positions, indices, uvs)]
+                bounds = Bounds(levels[0][0])
+                level_triangles = [len(level[1]) for level in levels]
+                draw_levels = [None] * len(levels)
+                level_buffers = [None] * len(levels)
+                startup.mark("mesh loaded")
+            # Stream the buffers of new detail levels, a few ms per frame so the view stays interactive
+            if scene is None and streams:
+                deadline = time.perf_counter() + args.upload_budget / 1000
+                for mesh_buffer in streams:
+                    mesh_buffer.upload(deadline)
+                    if time.perf_counter() >= deadline:
+                        break
+                streams = [mesh_buffer for mesh_buffer in streams if not mesh_buffer.complete]
+            profiler.lap("upload")
 
             for event in pygame.event.get():
                 if event.type == pygame.QUIT:
@@ -384,18 +748,16 @@ def main():
                 if event.type == pygame.VIDEORESIZE:
                     width, height = event.size
                     glViewport(0, 0, width, height)
-                    glMatrixMode(GL_PROJECTION)
-                    glLoadIdentity()
-                    gluPerspective(fov, width / height, 0.1, 50.0)
-                    glMatrixMode(GL_MODELVIEW)
-                    glLoadIdentity()
-                    glTranslatef(0.0, 0.0, camera_distance)
+                    camera.resize(width, height)
 
                 if event.type == pygame.MOUSEMOTION:
                     if event.buttons[0]:  # Left mouse button is pressed
                         dx, dy = event.rel
                         angle_x += dy * rotation_speed_factor
                         angle_y += dx * rotation_speed_factor 
+                        # Not simulated, the drag shows up right away instead of a step later
+                        previous[0] += dy * rotation_speed_factor
+                        previous[1] += dx * rotation_speed_factor
                 
 
                 if event.type == pygame.KEYDOWN:
@@ -403,32 +765,12 @@ def main():
                         wireframe_mode = not wireframe_mode
                         glPolygonMode(GL_FRONT_AND_BACK, GL_LINE if wireframe_mode else GL_FILL)     
 
-                if event.type == pygame.MOUSEBUTTONDOWN:
-                    if event.button == 4:  # Scroll up
-                        fov -= 1
-                        glLoadIdentity()  # Reset matrix to apply changes
-                        gluPerspective(fov, (1024 / 768), 0.1, 50.0)  # Update perspective
-                        glTranslatef(0.0, 0.0, -5)
-                    elif event.button == 5:  # Scroll down
-                        fov += 1
-                        glLoadIdentity()  # Reset matrix to apply changes
-                        gluPerspective(fov, (1024 / 768), 0.1, 50.0)  # Update perspective
-                        glTranslatef(0.0, 0.0, -5)
+                if event.type == pygame.MOUSEBUTTONDOWN and event.button in (4, 5):
+                    camera.fov += -1 if event.button == 4 else 1  # Scroll up narrows the view
 
                 if event.type == pygame.KEYDOWN:
-                    if event.key == K_RETURN:
-                        projection_mode = (projection_mode + 1) % 5  # Cycle through projections
-                        set_projection(projection_mode)
-                        if projection_mode == 0 :
-                            view_mode = "Perspective"
-                        elif projection_mode == 1 :
-                            view_mode = "Orthographic"
-                        elif projection_mode == 2 :
-                            view_mode = "Isometric"
-                        elif projection_mode == 3 :
-                            view_mode = "Oblique"
-                        elif projection_mode == 4 :
-                            view_mode = "Fisheye"
+                    if event.key == pygame.K_RETURN:
+                        camera.mode = (camera.mode + 1) % 5  # Cycle through projections
 
                 if event.type == pygame.KEYDOWN:
                     if event.key == pygame.K_m:
@@ -445,151 +787,205 @@ def main():
                         print("\nExiting...")
                         pygame.quit()
                         quit()
+            profiler.lap("events")
 
-            if keys[K_PAGEDOWN]:
-                glTranslatef(0.0, 0.0, -0.1 * 100 * delta_time)
-            if keys[K_PAGEUP]:
-                glTranslatef(0.0, 0.0, 0.1 * 100 * delta_time)
-            if keys[K_KP2]:
-                glTranslatef(0.0, 0.1 * 100 * delta_time, 0.0)
-            if keys[K_KP8]:
-                glTranslatef(0.0, -0.1 * 100 * delta_time, 0.0)
-            if keys[K_KP6]:
-                glTranslatef(-0.1 * 100 * delta_time, 0.0, 0.0)
-            if keys[K_KP4]:
-                glTranslatef(0.1 * 100 * delta_time, 0.0, 0.0)
-
-            if keys[K_KP_PLUS]:
-                glScalef(1.1, 1.1, 1.1)
-            if keys[K_KP_MINUS]:
-                glScalef(0.9, 0.9, 0.9)
-
-
-            if keys[K_UP]:
-                if angle_x < 90 or angle_x >= 270:
-                    angle_x = (angle_x + 1.5 * 100 * delta_time)
-                else:
-                    angle_x = 90  # Prevents crossing over
-
-            if keys[K_DOWN]:
-                if angle_x > 0 and angle_x <= 90 or angle_x > 270:
-                    angle_x = (angle_x - 1.5 * 100 * delta_time)
-                else:
-                    angle_x = 270  # Prevents crossing over
-            if keys [K_LEFT]:
-                angle_y = (angle_y + 1.5 * 100 * delta_time) % 360
-            if keys[K_RIGHT]:
-                angle_y = (angle_y - 1.5 * 100 * delta_time) % 360
-            if keys[K_SPACE]:
+            if keys[pygame.K_SPACE]:
                 angle_x = 180
                 angle_y = 180
+                previous[0:2] = angle_x, angle_y  # snap, don't interpolate
 
             # i know the check for the key is a bit weird
-            if keys[K_f]:
-                    if keys[K_1]:
+            if keys[pygame.K_f]:
+                    if keys[pygame.K_1]:
                         refresh_rate = 10
-                    elif keys[K_2]:
+                    elif keys[pygame.K_2]:
                         refresh_rate = 30
-                    elif keys[K_3]:
+                    elif keys[pygame.K_3]:
                         refresh_rate = 60
-                    elif keys[K_4]:
-                        # this weirdly sets it to 165 fps
-                        # maybe it enables vsync?
+                    elif keys[pygame.K_4]:
                         refresh_rate = 144
-                    elif keys[K_5]:
+                    elif keys[pygame.K_5]:
                         refresh_rate = 165
-                    elif keys[K_0]:
+                    elif keys[pygame.K_0]:
                         refresh_rate = 0
+                    pacer.set_target(refresh_rate)
 
             # fix later
 
-            if keys[K_t]:
+            if keys[pygame.K_t]:
                 try:
-                    if keys[K_1]:
-                        texture = load_texture("textures/1.jpg")
-                        glGenerateMipmap(GL_TEXTURE_2D)
-                    if keys[K_2]:
-                        texture = load_texture("textures/2.jpg")
-                        glGenerateMipmap(GL_TEXTURE_2D)
-                    if keys[K_3]:
-                        texture = load_texture("textures/3.jpg")
-                        glGenerateMipmap(GL_TEXTURE_2D)
-                    if keys[K_4]:
-                        texture = load_texture("textures/white.jpg")
-                        glGenerateMipmap(GL_TEXTURE_2D)
+                    if keys[pygame.K_1]:
+                        request_texture("textures/1.jpg")
+                    if keys[pygame.K_2]:
+                        request_texture("textures/2.jpg")
+                    if keys[pygame.K_3]:
+                        request_texture("textures/3.jpg")
+                    if keys[pygame.K_4]:
+                        request_texture("textures/white.jpg")
                 except FileNotFoundError:
                     print("Texture file not found. Using fallback texture.")
-                    load_missing_texture()
+                    show_texture(load_missing_texture())
                 except Exception as e:
                     print(f"An error occurred while loading the texture: {e}")
 
-            if keys[K_a]:
-                if keys[K_1]:
+            if keys[pygame.K_a]:
+                if keys[pygame.K_1]:
                     anti_aliasing_samples = 2
-                elif keys[K_2]:
+                elif keys[pygame.K_2]:
                     anti_aliasing_samples = 4
-                elif keys[K_3]:
+                elif keys[pygame.K_3]:
                     anti_aliasing_samples = 8
-                elif keys[K_4]:
+                elif keys[pygame.K_4]:
                     anti_aliasing_samples = 16
-                elif keys[K_0]:
+                elif keys[pygame.K_0]:
                     anti_aliasing_samples = 0
 
                 if anti_aliasing_samples > 0:
-                    pygame.display.gl_set_attribute(GL_MULTISAMPLESAMPLES, anti_aliasing_samples)
+                    pygame.display.gl_set_attribute(pygame.GL_MULTISAMPLESAMPLES, anti_aliasing_samples)
                     glEnable(GL_MULTISAMPLE)
                 else:
                     glDisable(GL_MULTISAMPLE)
-                    
+            profiler.lap("input")
 
 
 
 
-            # Frame limiting logic
-            # just realised how bad this is
-            if frame_limit:
-                delta_time = clock.tick(refresh_rate) / 1000.0 if refresh_rate else clock.tick() / 1000.0
-            else:
-                delta_time = clock.tick() / 1000.0
+            # Frame pacing, sleeps then spins up to an exact deadline (no-op when vsync paces us)
+            delta_time = pacer.wait()
 
             # Calculate FPS
-            fps = clock.get_fps()
+            fps = pacer.fps
             fps_display_timer += delta_time
             if fps_display_timer >= 0.5:
             #    print(f"FPS: {fps:.2f}")
                 fps_display_timer = 0
-
+            profiler.lap("limiter")
+
+            # Fixed-rate simulation of the held keys, however long the frame took
+            for _ in range(simulation.advance(delta_time)):
+                step = simulation.step
+                previous = [angle_x, angle_y, pan_x, pan_y, pan_z, zoom]
+
+                if keys[pygame.K_PAGEDOWN]:
+                    pan_z -= 0.1 * 100 * step
+                if keys[pygame.K_PAGEUP]:
+                    pan_z += 0.1 * 100 * step
+                if keys[pygame.K_KP2]:
+                    pan_y += 0.1 * 100 * step
+                if keys[pygame.K_KP8]:
+                    pan_y -= 0.1 * 100 * step
+                if keys[pygame.K_KP6]:
+                    pan_x -= 0.1 * 100 * step
+                if keys[pygame.K_KP4]:
+                    pan_x += 0.1 * 100 * step
+
+                if keys[pygame.K_KP_PLUS]:
+                    zoom *= 1.1 ** (100 * step)
+                if keys[pygame.K_KP_MINUS]:
+                    zoom *= 0.9 ** (100 * step)
+
+                if keys[pygame.K_UP]:
+                    if angle_x < 90 or angle_x >= 270:
+                        angle_x = (angle_x + 1.5 * 100 * step)
+                    else:
+                        angle_x = 90  # Prevents crossing over
+
+                if keys[pygame.K_DOWN]:
+                    if angle_x > 0 and angle_x <= 90 or angle_x > 270:
+                        angle_x = (angle_x - 1.5 * 100 * step)
+                    else:
+                        angle_x = 270  # Prevents crossing over
+                if keys [pygame.K_LEFT]:
+                    angle_y = (angle_y + 1.5 * 100 * step) % 360
+                if keys[pygame.K_RIGHT]:
+                    angle_y = (angle_y - 1.5 * 100 * step) % 360
+
+                if angle_x > 360:
+                    angle_x = 0
+                if angle_y > 360:
+                    angle_y = 0
+                if angle_x < 0:
+                    angle_x = 360
+                if angle_y < 0:
+                    angle_y = 360
+            profiler.lap("simulation")
 
             glClear(GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT)
-            glPushMatrix()
-            glRotatef(angle_x, 1, 0, 0)
-            glRotatef(angle_y, 0, 1, 0)
-            glBindTexture(GL_TEXTURE_2D, texture)
-            glEnable(GL_TEXTURE_2D)
-            glBindTexture(GL_TEXTURE_2D, texture)
-            draw_object(vertices, faces, texture_coords)
-            if is_visible([0, 0, -5], 2.0):
-                glCallList(display_list)
-            glPopMatrix()
-
+            # Draw the view between the last two simulation steps
+            alpha = simulation.alpha
+            camera.orbit((lerp(previous[2], pan_x, alpha), lerp(previous[3], pan_y, alpha), lerp(previous[4], pan_z, alpha)),
+                         lerp(previous[5], zoom, alpha),
+                         lerp_angle(previous[0], angle_x, alpha), lerp_angle(previous[1], angle_y, alpha))
+            if renderer is None:
+                camera.load()  # no-op while the view stands still
+            # Skip everything, texture binds included, when the mesh is out of view
+            if scene is not None:
+                scene.draw(height, camera)
+            elif levels is not None and bounds.visible(camera.planes):
+                # Detail level from the size the mesh covers on screen
+                radius = lod.screen_radii(bounds.center, bounds.radius, camera.gl_projection, camera.gl_view, height)
+                wanted_level = int(lod.select_levels(level_triangles, radius)[0])
+                if renderer is not None:
+                    renderer.begin(camera.projection, camera.view)
+                else:
+                    glEnable(GL_TEXTURE_2D)
+                glBindTexture(GL_TEXTURE_2D, texture)
+                if draw_levels[wanted_level] is None:
+                    streamed = len(streams)
+                    draw_levels[wanted_level], release = create_render_path(render_path, *levels[wanted_level],
+                                                                            streams if args.upload_budget > 0 else None)
+                    level_buffers[wanted_level] = streams[-1] if len(streams) > streamed else None
+                    released_meshes.append(release)
+                # A level that is still streaming in would draw partially, a complete one stands in until it's done
+                lod_level = nearest_ready_level(wanted_level, draw_levels, level_buffers)
+                draw_levels[lod_level]()
+            profiler.lap("draw")
+
+            scene_stats = f" | draws: {scene.draw_calls} | binds: {scene.texture_binds} | instances: {scene.visible_instances}/{scene.instance_count}" if scene is not None else ""
             if wireframe_mode == True:
-                pygame.display.set_caption(f"py3d | mode: wireframe | FPS: {fps:.2f} ")
+                pygame.display.set_caption(f"py3d | mode: wireframe | FPS: {fps:.2f} | jitter: {pacer.jitter:.2f} ms{scene_stats}")
             else:
-                pygame.display.set_caption(f"py3d | mode: solid | FPS: {fps:.2f} ")
+                pygame.display.set_caption(f"py3d | mode: solid | FPS: {fps:.2f} | jitter: {pacer.jitter:.2f} ms{scene_stats}")
 
             window_size = pygame.display.get_surface().get_size()
             glPolygonMode(GL_FRONT_AND_BACK, GL_FILL)
-            draw_overlay(font, window_size, fps, angle_x, angle_y, anti_aliasing_samples, texture, wireframe_mode, mm, delta_time, fov, refresh_rate, view_mode)
+            shown_path = f"{render_path}, LOD {lod_level}" if scene is None and len(draw_levels) > 1 else render_path
+            if scene is not None:
+                mesh_lines = []
+            elif levels is None:
+                mesh_lines = ["Mesh: loading..."]
+            elif mesh_error is not None:
+                mesh_lines = ["Mesh: load failed, cube"]
+            elif streams:
+                mesh_lines = [f"Mesh: {min(mesh_buffer.progress for mesh_buffer in streams):.0%} uploaded"]
+            else:
+                mesh_lines = [f"Mesh: {level_triangles[lod_level]:,} triangles"]
+            draw_overlay(hud, window_size, fps, angle_x, angle_y, anti_aliasing_samples, texture, wireframe_mode, mm, delta_time, camera.fov, refresh_rate, camera.mode_name, shown_path,
+                         mesh_lines + profiler.overlay_lines() + gl_stats.overlay_lines(), renderer)
             glBindTexture(GL_TEXTURE_2D, texture)
             if wireframe_mode == True:
                 glPolygonMode(GL_FRONT_AND_BACK, GL_LINE)
+            profiler.lap("overlay")
 
+            # Waiting on the GPU mostly shows up here
             pygame.display.flip()
+            if args.fast_gl:
+                check_errors(gl_errors)
+            profiler.lap("flip")
+            profiler.end_frame()
+            gl_stats.end_frame()
+            if not startup.reported:
+                if first_frame:
+                    startup.mark("first frame")
+                    first_frame = False
+                if scene is not None or levels is not None:
+                    startup.report()  # once the mesh has arrived too
     except KeyboardInterrupt:
         print(f"\nRecieved keyboard interrupt. Exiting...")
         cleanup()
         print(f"please wait while the program cleans the leaked memory")
-        pygame.quit()
+        if pygame is not None:
+            pygame.quit()
         quit()
     except Exception as e:
         print(f"An error occurred: {e}")
@@ -597,7 +993,8 @@ def main():
         print(f"Vendor: {glGetString(GL_VENDOR).decode()}")
         print(f"Version: {glGetString(GL_VERSION).decode()}")
         cleanup()
-        pygame.quit()
+        if pygame is not None:
+            pygame.quit()
         quit()
 
         
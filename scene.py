@@ -0,0 +1,291 @@
+"""
+Multi-object scenes.
+
+A scene file is JSON with a list of objects, each an object spec (like -o) with a
+texture (like -t) and a transform. An entry can also be repeated over a grid:
+
+    {"objects": [
+        {"object": "cube", "texture": "1.jpg", "position": [0, -2, 0], "scale": 0.4,
+         "grid": [10, 1, 10], "spacing": 1.2},
+        {"object": "sphere:lat=40,long=40", "texture": "2.jpg", "rotation": [0, 45, 0]}
+    ]}
+
+rotation is in degrees around x, y, z (applied in that order), scale is a number
+or [x, y, z]. Every mesh is loaded and uploaded once however often it is used.
+Instances are grouped into one batch per (texture, mesh), and batches are sorted
+by texture, so each texture is bound once per frame. With a texture atlas (see
+atlas.py) meshes get their uvs moved onto their texture's tile, and all of a
+page's batches draw back to back without a bind in between. Each batch is one instanced
+draw call per detail level in use, covering its visible instances. Draw calls
+grow with the number of unique meshes, not with the number of instances.
+"""
+import ctypes
+import json
+import math
+import numpy as np
+from OpenGL.GL import *
+from OpenGL.GL.shaders import compileShader
+import lod
+from atlas import remap_uvs
+from culling import Bounds, current_matrices, extract_planes
+from transforms import gl_matrix, scale
+from vbo import MeshBuffer
+
+INSTANCE_ATTRIBUTE = 10  # mat4, takes 10-13 (clear of the attributes NVIDIA aliases to fixed-function arrays)
+MATRIX_BYTES = 16 * 4
+
+VERTEX_SHADER = """
+#version 120
+attribute mat4 instance_matrix;
+varying vec2 uv;
+
+void main() {
+    gl_Position = gl_ModelViewProjectionMatrix * (instance_matrix * gl_Vertex);
+    uv = gl_MultiTexCoord0.xy;
+}
+"""
+
+FRAGMENT_SHADER = """
+#version 120
+uniform sampler2D texture0;
+varying vec2 uv;
+
+void main() {
+    gl_FragColor = texture2D(texture0, uv);
+}
+"""
+
+
+def instance_matrix(position=(0, 0, 0), rotation=(0, 0, 0), scale=1.0):
+    """translate * rotate z * rotate y * rotate x * scale, as a row-major 4x4 array"""
+    rx, ry, rz = (math.radians(a) for a in rotation)
+    cx, sx, cy, sy, cz, sz = math.cos(rx), math.sin(rx), math.cos(ry), math.sin(ry), math.cos(rz), math.sin(rz)
+    rotate_x = np.array([[1, 0, 0], [0, cx, -sx], [0, sx, cx]])
+    rotate_y = np.array([[cy, 0, sy], [0, 1, 0], [-sy, 0, cy]])
+    rotate_z = np.array([[cz, -sz, 0], [sz, cz, 0], [0, 0, 1]])
+    matrix = np.eye(4)
+    matrix[:3, :3] = rotate_z @ rotate_y @ rotate_x * np.broadcast_to(np.asarray(scale, dtype=np.float64), 3)
+    matrix[:3, 3] = position
+    return matrix
+
+
+def grid_offsets(counts, spacing):
+    """Offsets of a counts[0] x counts[1] x counts[2] grid, centered on the origin"""
+    axes = [(np.arange(n) - (n - 1) / 2) * spacing for n in counts]
+    return np.stack(np.meshgrid(*axes, indexing="ij"), axis=-1).reshape(-1, 3)
+
+
+def read_scene(path, default_texture=None):
+    """
+    Expand a scene file into instances.
+    :param default_texture: Texture name of the entries that don't give one.
+    :return: List of (object spec, texture name (default_texture if missing), row-major 4x4 matrix).
+    """
+    with open(path) as f:
+        description = json.load(f)
+
+    instances = []
+    for entry in description.get("objects", []):
+        matrix = instance_matrix(entry.get("position", (0, 0, 0)), entry.get("rotation", (0, 0, 0)),
+                                 entry.get("scale", 1.0))
+        offsets = grid_offsets(entry["grid"], entry.get("spacing", 2.0)) if "grid" in entry else np.zeros((1, 3))
+        for offset in offsets:
+            placed = matrix.copy()
+            placed[:3, 3] += offset
+            instances.append((entry["object"], entry.get("texture") or default_texture, placed))
+    return instances
+
+
+def _link_program(vertex_source, fragment_source, attributes):
+    program = glCreateProgram()
+    for source, kind in ((vertex_source, GL_VERTEX_SHADER), (fragment_source, GL_FRAGMENT_SHADER)):
+        glAttachShader(program, compileShader(source, kind))
+    for name, location in attributes.items():
+        glBindAttribLocation(program, location, name)
+    glLinkProgram(program)
+    if not glGetProgramiv(program, GL_LINK_STATUS):
+        raise RuntimeError(glGetProgramInfoLog(program).decode())
+    return program
+
+
+class Batch:
+    def __init__(self, meshes, triangle_counts, bounds, texture, matrices):
+        self.meshes = meshes  # one MeshBuffer per detail level, finest first
+        self.triangle_counts = triangle_counts
+        self.texture = texture
+        self.matrices = np.asarray(matrices, dtype=np.float64)
+        # Column-major float32, laid out the way the instance attribute reads it
+        self.gl_matrices = np.ascontiguousarray(self.matrices.transpose(0, 2, 1), dtype=np.float32)
+
+        # World-space bounding spheres, for culling instances without touching their meshes
+        center = np.append(bounds.center, 1.0)
+        self.centers = (self.matrices @ center)[:, :3]
+        self.radii = bounds.radius * np.linalg.norm(self.matrices[:, :3, :3], axis=1).max(axis=1)
+
+        self.instance_buffer = glGenBuffers(1)
+        glBindBuffer(GL_ARRAY_BUFFER, self.instance_buffer)
+        glBufferData(GL_ARRAY_BUFFER, self.gl_matrices.nbytes, self.gl_matrices, GL_DYNAMIC_DRAW)
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+        self.uploaded = np.arange(len(self.matrices))  # which instances the buffer holds, in order
+
+    def visible(self, planes):
+        distances = self.centers @ planes[:, :3].T + planes[:, 3]
+        return (distances >= -self.radii[:, None]).all(axis=1)
+
+    def levels(self, visible, projection, modelview, viewport_height):
+        """Detail level of every visible instance"""
+        if len(self.meshes) == 1:
+            return np.zeros(int(visible.sum()), dtype=np.int64)
+        radii = lod.screen_radii(self.centers[visible], self.radii[visible], projection, modelview, viewport_height)
+        return lod.select_levels(self.triangle_counts, radii)
+
+    def draw_instanced(self, visible, levels):
+        """One instanced draw per detail level in use, returns the number of draw calls"""
+        # Instances sorted by level, so each level is one contiguous run of the buffer
+        order = np.flatnonzero(visible)[np.argsort(levels, kind="stable")]
+        glBindBuffer(GL_ARRAY_BUFFER, self.instance_buffer)
+        # Only re-upload when the visible instances or their levels changed
+        if not np.array_equal(order, self.uploaded):
+            matrices = self.gl_matrices[order]
+            glBufferSubData(GL_ARRAY_BUFFER, 0, matrices.nbytes, matrices)
+            self.uploaded = order
+
+        draws = 0
+        first = 0
+        for level, count in enumerate(np.bincount(levels, minlength=len(self.meshes))):
+            if not count:
+                continue
+            glBindBuffer(GL_ARRAY_BUFFER, self.instance_buffer)
+            for column in range(4):
+                location = INSTANCE_ATTRIBUTE + column
+                glEnableVertexAttribArray(location)
+                glVertexAttribPointer(location, 4, GL_FLOAT, GL_FALSE, MATRIX_BYTES,
+                                      ctypes.c_void_p(int(first) * MATRIX_BYTES + column * 16))
+                glVertexAttribDivisor(location, 1)
+            self.meshes[level].draw(instances=int(count))
+            first += count
+            draws += 1
+        for column in range(4):
+            glVertexAttribDivisor(INSTANCE_ATTRIBUTE + column, 0)
+            glDisableVertexAttribArray(INSTANCE_ATTRIBUTE + column)
+        return draws
+
+    def draw_each(self, visible, levels):
+        """Fallback without instancing support, one draw call per visible instance"""
+        for matrix, level in zip(self.gl_matrices[visible], levels):
+            glPushMatrix()
+            glMultMatrixf(matrix)
+            self.meshes[level].draw()
+            glPopMatrix()
+        return len(levels)
+
+    def delete(self):
+        glDeleteBuffers(1, [self.instance_buffer])
+
+
+class Scene:
+    def __init__(self, instances, load_mesh, load_texture, view_radius=2.0, atlas=None, release_texture=None):
+        """
+        :param instances: As returned by read_scene.
+        :param load_mesh: spec -> list of (positions, indices, uvs) detail levels, finest first
+        :param load_texture: texture name or None -> GL texture, which has to stay valid until it's released
+                             (e.g. TextureManager.get + acquire)
+        :param release_texture: Called with every load_texture texture on delete()
+        :param view_radius: The scene is scaled to fit a sphere of this radius (the size of the bundled objects).
+        :param atlas: Optional TextureAtlas, textures on it are drawn from its pages instead of load_texture's.
+        """
+        loaded = {}    # spec -> detail levels, finest first
+        meshes = {}    # (spec, atlas rect or ()) -> (buffers per level, triangle counts, bounds)
+        textures = {}
+        groups = {}
+        for spec, texture_name, matrix in instances:
+            if spec not in loaded:
+                loaded[spec] = load_mesh(spec)
+            levels = loaded[spec]
+            placed = atlas.place(texture_name, *[uvs for _, _, uvs in levels]) if atlas is not None else None
+            if placed is not None:
+                texture, rect = placed
+            else:
+                if texture_name not in textures:
+                    textures[texture_name] = load_texture(texture_name)
+                texture, rect = textures[texture_name], ()
+            key = (spec, rect)  # a mesh on a tile has uvs of its own
+            if key not in meshes:
+                meshes[key] = ([MeshBuffer(positions, remap_uvs(uvs, rect) if rect else uvs, indices)
+                                for positions, indices, uvs in levels],
+                               [len(indices) for _, indices, _ in levels], Bounds(levels[0][0]))
+            groups.setdefault((texture, key), []).append(matrix)
+
+        self.meshes = [mesh for levels, _, _ in meshes.values() for mesh in levels]
+        self.textures = list(textures.values())  # from load_texture, handed back on delete()
+        self.release_texture = release_texture
+        # Sorted by texture, so binds only happen between texture groups
+        self.batches = [Batch(*meshes[key], texture, matrices) for (texture, key), matrices in sorted(groups.items())]
+        self.instance_count = len(instances)
+
+        centers = np.concatenate([batch.centers for batch in self.batches]) if self.batches else np.zeros((1, 3))
+        radii = np.concatenate([batch.radii for batch in self.batches]) if self.batches else np.zeros(1)
+        extent = (np.linalg.norm(centers, axis=1) + radii).max()
+        self.view_scale = view_radius / extent if extent > view_radius else 1.0
+
+        self.program = None
+        if bool(glDrawElementsInstanced) and bool(glVertexAttribDivisor):
+            try:
+                self.program = _link_program(VERTEX_SHADER, FRAGMENT_SHADER, {"instance_matrix": INSTANCE_ATTRIBUTE})
+            except Exception as e:
+                print(f"Instanced drawing unavailable, drawing instances one by one: {e}")
+        self.render_path = "instanced" if self.program is not None else "per instance"
+
+        # Stats of the last frame
+        self.draw_calls = 0
+        self.texture_binds = 0
+        self.visible_instances = 0
+
+    def draw(self, viewport_height, camera=None):
+        """
+        Draw the visible instances, each at the detail level its size on screen calls for.
+        :param camera: Source of the current matrices, read back from GL without one.
+        """
+        glPushMatrix()
+        glScalef(self.view_scale, self.view_scale, self.view_scale)
+        if camera is not None:
+            projection, modelview = camera.gl_projection, gl_matrix(camera.view @ scale(self.view_scale))
+        else:
+            projection, modelview = current_matrices()
+        planes = extract_planes(projection, modelview)
+        glEnable(GL_TEXTURE_2D)  # the HUD turns it off every frame, the per instance fallback needs it
+        if self.program is not None:
+            glUseProgram(self.program)
+
+        self.draw_calls = self.texture_binds = self.visible_instances = 0
+        bound = None
+        for batch in self.batches:
+            visible = batch.visible(planes)
+            if not visible.any():
+                continue  # no bind, no draw call
+            if batch.texture != bound:
+                glBindTexture(GL_TEXTURE_2D, batch.texture)
+                bound = batch.texture
+                self.texture_binds += 1
+            levels = batch.levels(visible, projection, modelview, viewport_height)
+            self.visible_instances += len(levels)
+            if self.program is not None:
+                self.draw_calls += batch.draw_instanced(visible, levels)
+            else:
+                self.draw_calls += batch.draw_each(visible, levels)
+
+        if self.program is not None:
+            glUseProgram(0)
+        glPopMatrix()
+
+    def delete(self):
+        for batch in self.batches:
+            batch.delete()
+        for mesh in self.meshes:
+            mesh.delete()
+        if self.release_texture is not None:
+            for texture in self.textures:
+                self.release_texture(texture)
+        self.textures = []
+        if self.program is not None:
+            glDeleteProgram(self.program)
@@ -0,0 +1,61 @@
+"""
+Startup timeline.
+
+py3d.py marks the end of each import group and initialization step (window,
+GL state, mesh, HUD, ...) up to the first presented frame, and --profile-startup
+prints them as a timeline: milliseconds since the process started and since
+the previous mark. On Linux the interpreter's own startup, before py3d.py runs
+its first line, is included as well. For a per-module import breakdown run
+python -X importtime py3d.py ...
+When the flag is off the marks go to a NullStartupTimeline and cost nothing.
+"""
+import os
+import sys
+import time
+
+
+def process_age():
+    """Seconds since the process was created (Linux only, 0 elsewhere), with clock tick resolution"""
+    try:
+        with open("/proc/self/stat") as stat, open("/proc/uptime") as uptime:
+            # starttime is field 22, counted after the parenthesized command name which may hold spaces
+            started = int(stat.read().rpartition(")")[2].split()[19]) / os.sysconf("SC_CLK_TCK")
+            return max(float(uptime.read().split()[0]) - started, 0.0)
+    except (OSError, ValueError, IndexError):
+        return 0.0
+
+
+class StartupTimeline:
+    enabled = True
+
+    def __init__(self):
+        now = time.perf_counter()
+        self.start = now - process_age()
+        self.marks = [("python startup", now)] if now > self.start else []
+        self.reported = False
+
+    def mark(self, name):
+        """Close the step that ran since the previous mark"""
+        self.marks.append((name, time.perf_counter()))
+
+    def report(self, file=sys.stderr):
+        """Print the timeline, once"""
+        if self.reported:
+            return
+        self.reported = True
+        print("Startup timeline (ms since process start, ms for the step):", file=file)
+        last = self.start
+        for name, at in self.marks:
+            print(f"  {(at - self.start) * 1000:8.1f} {(at - last) * 1000:+8.1f}  {name}", file=file)
+            last = at
+
+
+class NullStartupTimeline:
+    enabled = False
+    reported = True
+
+    def mark(self, name):
+        pass
+
+    def report(self, file=sys.stderr):
+        pass
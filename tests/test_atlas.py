@@ -0,0 +1,87 @@
+import json
+import os
+import random
+import numpy as np
+from atlas import PADDING, load_layout, pack_skyline, remap_uvs
+
+
+def padded_rects(sizes, placed, padding=PADDING):
+    """{name: (page, x0, y0, x1, y1)} of every tile including its padding"""
+    rects = {}
+    for name, (page, x, y) in placed.items():
+        width, height = (-(-v // padding) * padding for v in sizes[name])
+        rects[name] = (page, x - padding, y - padding, x + width + padding, y + height + padding)
+    return rects
+
+
+def check_packing(sizes, page_size, padding=PADDING):
+    pages, placed = pack_skyline(sizes, page_size, padding)
+    assert placed.keys() == sizes.keys()
+    rects = padded_rects(sizes, placed, padding)
+    for name, (page, x0, y0, x1, y1) in rects.items():
+        assert x0 >= 0 and y0 >= 0 and x1 <= pages[page][0] and y1 <= pages[page][1] <= page_size
+        assert placed[name][1] % padding == 0 and placed[name][2] % padding == 0
+    items = list(rects.values())
+    for i, a in enumerate(items):
+        for b in items[i + 1:]:
+            overlap = a[0] == b[0] and a[1] < b[3] and b[1] < a[3] and a[2] < b[4] and b[2] < a[4]
+            assert not overlap, (a, b)
+    return pages, placed
+
+
+def test_single_tile():
+    pages, placed = check_packing({"a": (100, 50)}, 1024)
+    assert placed == {"a": (0, PADDING, PADDING)}
+    assert pages == [(104 + 2 * PADDING, 56 + 2 * PADDING)]
+
+
+def test_random_tiles_never_overlap():
+    rng = random.Random(1)
+    sizes = {f"t{i}": (rng.randint(1, 300), rng.randint(1, 300)) for i in range(200)}
+    pages, _ = check_packing(sizes, 1024)
+    assert len(pages) > 1
+    # The packing is dense enough that the tiles don't all go to separate pages
+    assert len(pages) < len(sizes) // 4
+
+
+def test_new_page_when_full():
+    size = 512 - 2 * PADDING
+    pages, placed = check_packing({name: (size, size) for name in "abcde"}, 1024)
+    assert len(pages) == 2
+    assert sorted(page for page, _, _ in placed.values()) == [0, 0, 0, 0, 1]
+    assert pages[1] == (512, 512)
+
+
+def test_deterministic():
+    sizes = {f"t{i}": (16 * (i % 5 + 1), 8 * (i % 7 + 1)) for i in range(40)}
+    assert pack_skyline(sizes, 256) == pack_skyline(dict(reversed(list(sizes.items()))), 256)
+
+
+def test_remap_uvs():
+    rect = (0.25, 0.5, 0.5, 0.25)
+    uvs = remap_uvs([(0, 0), (1, 1), (0.5, 0.5), (2, -1)], rect)
+    np.testing.assert_allclose(uvs, [(0.25, 0.5), (0.75, 0.75), (0.5, 0.625), (0.75, 0.5)])
+    assert uvs.dtype == np.float32
+
+
+def test_scene_with_untextured_entries(tmp_path):
+    from PIL import Image
+    from scene import read_scene
+    for name, size in (("a.png", (32, 16)), ("b.png", (8, 8))):
+        Image.new("RGBA", size, (255, 0, 0, 255)).save(tmp_path / name)
+    scene = tmp_path / "mixed.json"
+    scene.write_text(json.dumps({"objects": [
+        {"object": "cube", "texture": "b.png"},
+        {"object": "sphere"},
+        {"object": "cube", "texture": "a.png", "grid": [2, 1, 1]},
+    ]}))
+    instances = read_scene(str(scene), "a.png")
+    assert [name for _, name, _ in instances] == ["b.png", "a.png", "a.png", "a.png"]
+
+    paths = {name: str(tmp_path / name) for _, name, _ in instances}
+    cache_dir = str(tmp_path / "atlas")
+    key, layout = load_layout(paths, 256, cache_dir)
+    assert sorted(layout["tiles"]) == ["a.png", "b.png"]
+    # The cached layout comes back with the same tile names
+    assert load_layout(paths, 256, cache_dir) == (key, layout)
+    assert os.listdir(cache_dir) == [key + ".json"]
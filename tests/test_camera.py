@@ -0,0 +1,64 @@
+import numpy as np
+from camera import Camera
+from culling import extract_planes
+from transforms import projection_matrix, model_matrix, gl_matrix
+
+
+def test_matrices_match_transforms():
+    camera = Camera(fov=45, aspect=1.5, near=0.5, far=20, distance=3)
+    camera.orbit((1, 0, 0), 2, 30, 60)
+    for mode in range(5):
+        camera.mode = mode
+        np.testing.assert_array_equal(camera.projection, projection_matrix(mode, 1.5, 3, 45, 0.5, 20))
+        np.testing.assert_array_equal(camera.gl_projection, gl_matrix(camera.projection))
+    np.testing.assert_array_equal(camera.view, model_matrix((1, 0, 0), 2, 30, 60))
+    np.testing.assert_array_equal(camera.gl_view, gl_matrix(camera.view))
+
+
+def test_matrices_are_cached_until_an_input_changes():
+    camera = Camera()
+    projection, view, planes = camera.projection, camera.view, camera.planes
+    version = camera.version
+    assert camera.projection is projection and camera.view is view and camera.planes is planes
+
+    # Setting the same values is not a change
+    camera.fov = camera.fov
+    camera.orbit()
+    assert camera.version == version
+    assert camera.projection is projection and camera.planes is planes
+
+    camera.fov = 30
+    assert camera.version == version + 1
+    assert camera.projection is not projection and camera.view is view and camera.planes is not planes
+
+    projection, planes = camera.projection, camera.planes
+    camera.orbit(angle_y=10)
+    assert camera.version == version + 2
+    assert camera.view is not view and camera.projection is projection and camera.planes is not planes
+
+
+def test_every_projection_input_marks_it_stale():
+    camera = Camera()
+    for name, value in (("fov", 30), ("aspect", 2.0), ("near", 1.0), ("far", 10.0), ("mode", 1), ("distance", 8)):
+        projection, version = camera.projection, camera.version
+        setattr(camera, name, value)
+        assert camera.version == version + 1, name
+        assert camera.projection is not projection, name
+
+
+def test_planes():
+    camera = Camera(aspect=1.0, distance=5)
+    np.testing.assert_array_equal(camera.planes, extract_planes(camera.gl_projection, camera.gl_view))
+    # The origin sits 5 units in front of the camera, inside; a point behind the camera is not
+    assert (camera.planes @ [0, 0, 0, 1] >= 0).all()
+    assert (camera.planes @ [0, 0, 6, 1] < 0).any()
+    camera.orbit(pan=(0, 0, 10))
+    assert (camera.planes @ [0, 0, 0, 1] < 0).any()
+
+
+def test_resize():
+    camera = Camera()
+    camera.resize(800, 400)
+    assert camera.aspect == 2.0
+    camera.resize(800, 0)  # minimized window
+    assert camera.aspect == 800.0
@@ -0,0 +1,93 @@
+import importlib
+import numpy as np
+import pytest
+from mesh_tools import compile_mesh, fan_triangulate, flatten_faces, uv_layout
+
+# Unit cube, one quad per side
+CUBE_VERTICES = [(x, y, z) for x in (0, 1) for y in (0, 1) for z in (0, 1)]
+CUBE_FACES = [(0, 1, 3, 2), (4, 6, 7, 5), (0, 4, 5, 1), (2, 3, 7, 6), (0, 2, 6, 4), (1, 5, 7, 3)]
+QUAD_UVS = [(0, 0), (1, 0), (1, 1), (0, 1)]
+
+
+def corner_positions(positions, indices):
+    return np.asarray(positions)[np.asarray(indices)]
+
+
+def test_fan_triangulate():
+    np.testing.assert_array_equal(fan_triangulate(np.array([3, 4])), [[0, 1, 2], [3, 4, 5], [3, 5, 6]])
+
+
+def test_vertex_layout_keeps_vertices():
+    uvs = [(x, y) for x, y, _ in CUBE_VERTICES]
+    positions, out_uvs, indices = compile_mesh(CUBE_VERTICES, CUBE_FACES, uvs)
+    np.testing.assert_array_equal(positions, CUBE_VERTICES)
+    np.testing.assert_array_equal(out_uvs, uvs)
+    assert indices.dtype == np.uint32 and indices.shape == (12, 3)
+
+
+def test_face_layout_splits_vertices_on_uv_seams():
+    positions, uvs, indices = compile_mesh(CUBE_VERTICES, CUBE_FACES, QUAD_UVS)
+    # One vertex per cube corner and quad corner it's used at
+    flat, sizes = flatten_faces(CUBE_FACES)
+    assert len(positions) == len({(vertex, i % 4) for i, vertex in enumerate(flat)})
+    expected = corner_positions(CUBE_VERTICES, flat[fan_triangulate(sizes)])
+    np.testing.assert_array_equal(corner_positions(positions, indices), expected)
+    np.testing.assert_array_equal(uvs[indices[:2]], [[QUAD_UVS[i] for i in tri] for tri in ((0, 1, 2), (0, 2, 3))])
+
+
+def test_corner_layout_merges_identical_corners():
+    # Two quads sharing an edge with continuous uvs: the shared corners become one vertex each
+    vertices = [(0, 0, 0), (1, 0, 0), (2, 0, 0), (0, 1, 0), (1, 1, 0), (2, 1, 0)]
+    faces = [(0, 1, 4, 3), (1, 2, 5, 4)]
+    uvs = [(0, 0), (0.5, 0), (0.5, 1), (0, 1), (0.5, 0), (1, 0), (1, 1), (0.5, 1)]
+    positions, out_uvs, indices = compile_mesh(vertices, faces, uvs)
+    assert len(positions) == 6
+    np.testing.assert_array_equal(out_uvs[indices], [[uvs[i] for i in tri] for tri in ((0, 1, 2), (0, 2, 3),
+                                                                                     (4, 5, 6), (4, 6, 7))])
+    # A seam (different uvs on the shared edge) keeps one vertex per side
+    uvs[4], uvs[7] = (0, 0), (0, 1)
+    positions, _, _ = compile_mesh(vertices, faces, uvs)
+    assert len(positions) == 8
+
+
+def test_corner_count_wins_over_face_layout():
+    # 4 triangles with 12 uvs: per corner, even though a face has fewer corners than there are uvs
+    vertices = [(0, 0, 0), (1, 0, 0), (0, 1, 0), (0, 0, 1)]
+    faces = [(0, 1, 2), (0, 1, 3), (0, 2, 3), (1, 2, 3)]
+    flat, sizes = flatten_faces(faces)
+    assert uv_layout(len(vertices), flat, sizes, 12) == "corner"
+    assert uv_layout(len(vertices), flat, sizes, 4) == "vertex"
+    assert uv_layout(len(vertices), flat, sizes, 3) == "face"
+    with pytest.raises(ValueError, match="face layout needs 3"):
+        uv_layout(len(vertices), flat, sizes, 4, layout="face")
+
+
+def test_explicit_layout():
+    vertices = [(0, 0, 0), (1, 0, 0), (0, 1, 0)]
+    uvs = [(0, 0), (1, 0), (0, 1)]
+    # 3 uvs fit all three layouts of a single triangle, the given one decides
+    _, out_uvs, indices = compile_mesh(vertices, [(2, 0, 1)], uvs, layout="vertex")
+    np.testing.assert_array_equal(out_uvs[indices], [[(0, 1), (0, 0), (1, 0)]])
+    _, out_uvs, indices = compile_mesh(vertices, [(2, 0, 1)], uvs, layout="corner")
+    np.testing.assert_array_equal(out_uvs[indices], [uvs])
+    with pytest.raises(ValueError, match="corner layout needs 3"):
+        compile_mesh(vertices, [(2, 0, 1)], uvs[:2], layout="corner")
+
+
+def test_bad_faces():
+    with pytest.raises(ValueError, match="vertex 8"):
+        compile_mesh(CUBE_VERTICES, [(0, 1, 8)], QUAD_UVS[:3])
+    with pytest.raises(ValueError, match="fit neither"):
+        compile_mesh(CUBE_VERTICES, CUBE_FACES, QUAD_UVS[:3])
+
+
+@pytest.mark.parametrize("name", ["octahedron", "diamond", "prism", "cube"])
+def test_generated_meshes_keep_their_uvs(name):
+    module = importlib.import_module("objects." + name)
+    # Unsubdivided triangle meshes have as many vertices as corners, the layout must not be guessed from that
+    positions, uvs, indices = compile_mesh(*module.generate(size=2))
+    flat, sizes = flatten_faces(module.faces)
+    triangles = fan_triangulate(sizes)
+    np.testing.assert_allclose(positions[indices], 2 * np.asarray(module.vertices, dtype=np.float32)[flat[triangles]])
+    expected = compile_mesh(module.vertices, module.faces, module.texture_coords)
+    np.testing.assert_array_equal(uvs[indices], expected[1][expected[2]])
@@ -0,0 +1,101 @@
+import numpy as np
+import pytest
+import obj_loader
+from obj_loader import parse_obj
+
+QUAD = b"""# two triangles
+v 0 0 0
+v 1 0 0
+v 1 1 0
+v 0 1 0 1.0
+vt 0 0
+vt 1 0
+vt 1 1 0
+vt 0 1
+vn 0 0 1
+f 1/1/1 2/2/1 3/3/1 4/4/1
+"""
+
+
+def test_parse_obj():
+    parsed = parse_obj(QUAD)
+    np.testing.assert_array_equal(parsed["positions"], [[0, 0, 0], [1, 0, 0], [1, 1, 0], [0, 1, 0]])
+    np.testing.assert_array_equal(parsed["texcoords"], [[0, 0], [1, 0], [1, 1], [0, 1]])
+    np.testing.assert_array_equal(parsed["normals"], [[0, 0, 1]])
+    np.testing.assert_array_equal(parsed["triangles"][:, :, 0], [[0, 1, 2], [0, 2, 3]])
+    np.testing.assert_array_equal(parsed["triangles"][:, :, 1], [[0, 1, 2], [0, 2, 3]])
+    assert (parsed["triangles"][:, :, 2] == 0).all()
+
+
+def test_corner_formats():
+    parsed = parse_obj(b"v 0 0 0\nv 1 0 0\nv 0 1 0\nvn 0 0 1\nf 1 2 3\nf 1//1 2//1 3//1\nf 1/ 2 3//1\n")
+    np.testing.assert_array_equal(parsed["triangles"][:, :, 0], [[0, 1, 2]] * 3)
+    np.testing.assert_array_equal(parsed["triangles"][:, :, 1], -1)
+    np.testing.assert_array_equal(parsed["triangles"][:, :, 2], [[-1, -1, -1], [0, 0, 0], [-1, -1, 0]])
+
+
+def test_relative_indices_count_back_from_the_face():
+    data = (b"v 0 0 0\nv 1 0 0\nv 0 1 0\nvt 0 0\n"
+            b"f -3/-1 -2/-1 -1/-1\n"
+            b"v 5 5 5\nvt 1 1\n"
+            b"f -4/-2 -2/-1 -1/-1\n")
+    triangles = parse_obj(data)["triangles"]
+    np.testing.assert_array_equal(triangles[:, :, 0], [[0, 1, 2], [0, 2, 3]])
+    np.testing.assert_array_equal(triangles[:, :, 1], [[0, 0, 0], [0, 1, 1]])
+
+
+def test_short_and_long_texture_coordinates():
+    parsed = parse_obj(b"v 0 0 0\nv 1 0 0\nv 0 1 0\nvt 0.5\nvt 0.25 0.75 1\nvt 1 0\nf 1/1 2/2 3/3\n")
+    np.testing.assert_array_equal(parsed["texcoords"], [[0.5, 0], [0.25, 0.75], [1, 0]])
+
+
+@pytest.mark.parametrize("data, message", [
+    (b"v 0 0\nf 1 1 1\n", "malformed vertex record"),
+    (b"v 0 0 0\nv 1 0 0\nf 1 2\n", "fewer than 3 corners"),
+    (b"v 0 0 0\n", "no faces"),
+    (b"v 0 0 0\nv 1 0 0\nv 0 1 0\nf 1 2 4\n", "out of range"),
+])
+def test_malformed_files(data, message):
+    with pytest.raises(ValueError, match=message):
+        parse_obj(data)
+
+
+def grid_obj(rows, cols):
+    """A grid of quads written strip by strip, faces using absolute and relative indices"""
+    lines = []
+    for row in range(rows + 1):
+        lines += [f"v {col} {row} 0" for col in range(cols + 1)]
+        lines += [f"vt {col / cols} {row / rows}" for col in range(cols + 1)]
+        if row:
+            for col in range(cols):
+                a = (row - 1) * (cols + 1) + col + 1
+                if col % 2:
+                    lines.append("f " + " ".join(f"{i}/{i}" for i in (a, a + 1, a + cols + 2, a + cols + 1)))
+                else:
+                    back = cols + 1 - col  # v/vt of this strip seen so far
+                    lines.append("f " + " ".join(f"{i}/{i}" for i in (-back - cols - 1, -back - cols, -back + 1, -back)))
+    return ("\n".join(lines) + "\n").encode()
+
+
+def assert_same(a, b):
+    assert a.keys() == b.keys()
+    for key in a:
+        np.testing.assert_array_equal(a[key], b[key], err_msg=key)
+
+
+@pytest.mark.parametrize("count", [2, 3, 7, 50])
+def test_chunks_merge_like_one_parse(count):
+    data = grid_obj(12, 9)
+    ranges = obj_loader.split_ranges(data, count)
+    assert ranges[0][0] == 0 and ranges[-1][1] == len(data)
+    assert all(data[end - 1:end] == b"\n" for _, end in ranges)
+    chunks = [obj_loader._parse_chunk(data[start:end]) for start, end in ranges]
+    assert_same(obj_loader._merge(chunks), parse_obj(data))
+
+
+def test_parallel_parse_matches_serial(tmp_path, monkeypatch):
+    path = tmp_path / "grid.obj"
+    path.write_bytes(grid_obj(40, 30))
+    monkeypatch.setattr(obj_loader, "PARALLEL_MIN_BYTES", 0)
+    monkeypatch.setattr(obj_loader, "RANGE_BYTES", 4096)  # several ranges per worker
+    assert_same(obj_loader.parse_obj_file(str(path), workers=2), obj_loader.parse_obj_file(str(path), workers=1))
@@ -0,0 +1,148 @@
+import threading
+import numpy as np
+import pytest
+import texture_cache
+from texture_cache import BC1, BC3, RGBA8, BakedTexture, compress, read_texture, write_texture
+
+
+def decode_colors(blocks, four_color_only=False):
+    """Reference BC1 decoder, (N, 8) uint8 -> (N, 16, 4) float RGBA"""
+    c0 = blocks[:, 0:2].copy().view("<u2")[:, 0]
+    c1 = blocks[:, 2:4].copy().view("<u2")[:, 0]
+    bits = blocks[:, 4:8].copy().view("<u4")[:, 0]
+    p0, p1 = texture_cache._unpack_565(c0), texture_cache._unpack_565(c1)
+    four = (c0 > c1) | four_color_only
+    palette = np.empty((len(blocks), 4, 4), dtype=np.float64)
+    palette[:, :, 3] = 255
+    palette[:, 0, :3], palette[:, 1, :3] = p0, p1
+    palette[:, 2, :3] = np.where(four[:, None], (2 * p0 + p1) / 3, (p0 + p1) / 2)
+    palette[:, 3, :3] = np.where(four[:, None], (p0 + 2 * p1) / 3, 0)
+    palette[~four, 3, 3] = 0
+    codes = (bits[:, None] >> (2 * np.arange(16, dtype=np.uint32))) & 3
+    return np.take_along_axis(palette, codes[:, :, None].astype(np.int64), axis=1)
+
+
+def decode_alpha(blocks):
+    """Reference BC3 alpha decoder, (N, 8) uint8 -> (N, 16) float"""
+    a0, a1 = blocks[:, 0].astype(np.float64), blocks[:, 1].astype(np.float64)
+    bits = np.zeros(len(blocks), dtype=np.uint64)
+    for i in range(6):
+        bits |= blocks[:, 2 + i].astype(np.uint64) << np.uint64(8 * i)
+    eight = a0 > a1
+    palette = np.empty((len(blocks), 8))
+    palette[:, 0], palette[:, 1] = a0, a1
+    for i in range(1, 7):
+        palette[:, i + 1] = np.where(eight, ((7 - i) * a0 + i * a1) / 7,
+                                     ((5 - i) * a0 + i * a1) / 5 if i < 5 else (0 if i == 5 else 255))
+    codes = (bits[:, None] >> (3 * np.arange(16, dtype=np.uint64))) & np.uint64(7)
+    return np.take_along_axis(palette, codes.astype(np.int64), axis=1)
+
+
+def decode(data, fmt, width, height):
+    """Blocks back to a (height, width, 4) image"""
+    blocks = np.frombuffer(data, dtype=np.uint8).reshape(-1, texture_cache.BLOCK_BYTES[fmt])
+    if fmt == BC1:
+        pixels = decode_colors(blocks)
+    else:
+        pixels = decode_colors(blocks[:, 8:], four_color_only=True)
+        pixels[:, :, 3] = decode_alpha(blocks[:, :8])
+    rows, columns = -(-height // 4), -(-width // 4)
+    image = pixels.reshape(rows, columns, 4, 4, 4).transpose(0, 2, 1, 3, 4).reshape(rows * 4, columns * 4, 4)
+    return image[:height, :width]
+
+
+def gradient(width, height, alpha=None):
+    y, x = np.mgrid[0:height, 0:width]
+    image = np.empty((height, width, 4), dtype=np.uint8)
+    image[..., 0] = x * 255 // max(width - 1, 1)
+    image[..., 1] = y * 255 // max(height - 1, 1)
+    image[..., 2] = (x + y) * 255 // max(width + height - 2, 1)
+    image[..., 3] = 255 if alpha is None else alpha
+    return image
+
+
+@pytest.mark.parametrize("color", [(255, 0, 0), (0, 255, 255), (255, 255, 255), (0, 0, 0), (132, 130, 132)])
+def test_solid_565_colors_are_exact(color):
+    image = np.empty((8, 8, 4), dtype=np.uint8)
+    image[...] = (*color, 255)
+    np.testing.assert_array_equal(decode(compress(image, BC1), BC1, 8, 8), image)
+
+
+@pytest.mark.parametrize("fmt", [BC1, BC3])
+def test_gradient_round_trip(fmt):
+    image = gradient(256, 256)
+    decoded = decode(compress(image, fmt), fmt, 256, 256)
+    error = np.abs(decoded[..., :3] - image[..., :3])
+    assert error.mean() < 2 and error.max() <= 8
+    np.testing.assert_array_equal(decoded[..., 3], 255)
+
+
+def test_noise_round_trip():
+    image = np.random.default_rng(3).integers(0, 256, (32, 32, 4), dtype=np.uint8)
+    image[..., 3] = 255
+    error = np.abs(decode(compress(image, BC1), BC1, 32, 32)[..., :3] - image[..., :3])
+    assert error.mean() < 48  # 4 colors for 16 random ones, but still well under a random guess (~85)
+
+
+def test_bc3_alpha():
+    y, x = np.mgrid[0:16, 0:16]
+    image = gradient(16, 16, alpha=np.where((x + y) % 2, 255, 0))
+    decoded = decode(compress(image, BC3), BC3, 16, 16)
+    np.testing.assert_array_equal(decoded[..., 3], image[..., 3])  # two values per block are exact
+    image[..., 3] = x * 17
+    decoded = decode(compress(image, BC3), BC3, 16, 16)
+    assert np.abs(decoded[..., 3] - image[..., 3]).max() <= 255 / 14 + 1
+
+
+def test_partial_blocks_repeat_the_edge():
+    image = gradient(6, 5)
+    data = compress(image, BC1)
+    assert len(data) == texture_cache.level_bytes(BC1, 6, 5) == 2 * 2 * 8
+    assert data == compress(np.pad(image, ((0, 3), (0, 2), (0, 0)), mode="edge"), BC1)
+
+
+def test_bake_image():
+    from PIL import Image
+    opaque = texture_cache.bake_image(Image.fromarray(gradient(16, 8)))
+    assert opaque.format == BC1
+    assert [level[:2] for level in opaque.levels] == [(16, 8), (8, 4), (4, 2), (2, 1), (1, 1)]
+    assert opaque.nbytes == len(opaque.data) == 8 * (8 + 2 + 1 + 1 + 1)
+    assert texture_cache.bake_image(Image.fromarray(gradient(16, 8, alpha=128))).format == BC3
+    plain = texture_cache.bake_image(Image.fromarray(gradient(16, 8)), compression=False, max_levels=2)
+    assert plain.format == RGBA8 and len(plain.levels) == 2
+    np.testing.assert_array_equal(plain.level_data(0), gradient(16, 8).reshape(-1))
+
+
+def test_cancel():
+    cancel = threading.Event()
+    cancel.set()
+    with pytest.raises(texture_cache.BakeCancelled):
+        compress(gradient(8, 8), BC1, cancel)
+
+
+def test_file_round_trip(tmp_path):
+    data = np.frombuffer(compress(gradient(8, 8), BC1) + compress(gradient(4, 4), BC1) * 3, dtype=np.uint8)
+    baked = BakedTexture(BC1, 8, 8, data, level_count=4)
+    path = str(tmp_path / "a.tex")
+    write_texture(path, baked)
+    loaded = read_texture(path)
+    assert (loaded.format, loaded.width, loaded.height, loaded.levels) == (BC1, 8, 8, baked.levels)
+    np.testing.assert_array_equal(loaded.data, data)
+    del loaded  # unmap it before cutting the file
+
+    with open(path, "r+b") as f:
+        f.truncate(len(data))  # cut short
+    assert read_texture(path) is None
+
+
+def test_load_baked(tmp_path):
+    made = []
+
+    def make():
+        made.append(1)
+        return BakedTexture(RGBA8, 2, 2, np.arange(16, dtype=np.uint8), level_count=1)
+
+    first = texture_cache.load_baked("key", make, str(tmp_path))
+    second = texture_cache.load_baked("key", make, str(tmp_path))
+    assert len(made) == 1
+    np.testing.assert_array_equal(second.data, first.data)
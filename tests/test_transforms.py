@@ -0,0 +1,88 @@
+import math
+import numpy as np
+import pytest
+from transforms import (perspective, ortho, frustum, translate, scale, rotate,
+                        projection_matrix, model_matrix, gl_matrix)
+
+# fov 90 gives a focal length of 1, near 1 / far 3 keep the depth terms small
+FOV, ASPECT, DISTANCE, NEAR, FAR = 90, 2.0, 5.0, 1.0, 3.0
+
+# Worked out by hand from the gluPerspective/glOrtho/glFrustum formulas times the pull back
+EXPECTED = {
+    0: [[0.5, 0, 0, 0], [0, 1, 0, 0], [0, 0, -2, 7], [0, 0, -1, 5]],
+    1: [[0.25, 0, 0, 0], [0, 0.5, 0, 0], [0, 0, -1, 3], [0, 0, 0, 1]],
+    3: [[0.25, 0, 0, 0], [0.25, 0.5, 0, 0], [0, 0, -1, 3], [0, 0, 0, 1]],
+    4: [[0.5, 0, 0, 0], [0, 1, 0, 0], [0, 0, -2, 1], [0, 0, -1, 2]],  # fixed distance of 2
+}
+
+
+def project(mode):
+    return projection_matrix(mode, ASPECT, DISTANCE, FOV, NEAR, FAR)
+
+
+@pytest.mark.parametrize("mode", sorted(EXPECTED))
+def test_projection_matrix(mode):
+    np.testing.assert_allclose(project(mode), EXPECTED[mode], atol=1e-12)
+
+
+def test_isometric_projection():
+    c, s = math.cos(math.radians(35.26)), math.sin(math.radians(35.26))
+    tilt = [[1, 0, 0, 0], [0, c, -s, 0], [0, s, c, 0], [0, 0, 0, 1]]
+    h = math.sqrt(0.5)
+    turn = [[h, 0, h, 0], [0, 1, 0, 0], [-h, 0, h, 0], [0, 0, 0, 1]]
+    np.testing.assert_allclose(project(2), np.array(EXPECTED[1]) @ tilt @ turn, atol=1e-12)
+    # The three axes come out the same length on screen (in pixels, x is squeezed by the aspect)
+    lengths = np.linalg.norm(project(2)[:2, :3] * [[ASPECT], [1]], axis=0)
+    np.testing.assert_allclose(lengths, lengths[0], rtol=1e-4)
+
+
+@pytest.mark.parametrize("mode", [0, 1, 3, 4])  # isometric turns the square away
+@pytest.mark.parametrize("aspect", [1.0, 4 / 3, 0.5])
+def test_unit_edges_keep_their_length_on_screen(mode, aspect):
+    # The x and y edges of a unit square facing the camera cover as many pixels, whatever the window shape
+    width, height = 1000 * aspect, 1000
+    corners = projection_matrix(mode, aspect, DISTANCE, FOV, NEAR, FAR) @ [[0, 1, 0], [0, 0, 1], [0, 0, 0], [1, 1, 1]]
+    ndc = corners[:2] / corners[3]
+    across = abs(ndc[0, 1] - ndc[0, 0]) * width / 2
+    up = abs(ndc[1, 2] - ndc[1, 0]) * height / 2
+    assert across == pytest.approx(up)
+
+
+def test_unknown_mode_is_identity():
+    np.testing.assert_array_equal(project(5), np.eye(4))
+
+
+def test_perspective_maps_near_and_far_to_the_depth_range():
+    matrix = perspective(60, 1.5, NEAR, FAR)
+    for z, depth in ((-NEAR, -1), (-FAR, 1)):
+        clip = matrix @ [0, 0, z, 1]
+        assert clip[2] / clip[3] == pytest.approx(depth)
+
+
+def test_ortho_and_frustum_map_their_box_to_the_unit_cube():
+    corner = [-1, -2, -NEAR, 1]
+    np.testing.assert_allclose(ortho(-1, 3, -2, 2, NEAR, FAR) @ corner, [-1, -1, -1, 1])
+    clip = frustum(-1, 3, -2, 2, NEAR, FAR) @ corner
+    np.testing.assert_allclose(clip[:3] / clip[3], [-1, -1, -1])
+
+
+def test_rotate_is_counterclockwise_around_the_axis():
+    np.testing.assert_allclose(rotate(90, 0, 0, 2) @ [1, 0, 0, 1], [0, 1, 0, 1], atol=1e-12)
+    np.testing.assert_allclose(rotate(90, 1, 0, 0) @ [0, 1, 0, 1], [0, 0, 1, 1], atol=1e-12)
+
+
+def test_model_matrix():
+    expected = [[2, 0, 0, 1], [0, 0, -2, 2], [0, 2, 0, 3], [0, 0, 0, 1]]
+    np.testing.assert_allclose(model_matrix((1, 2, 3), 2, 90, 0), expected, atol=1e-12)
+    np.testing.assert_allclose(model_matrix(), np.eye(4))
+    # Rotation around y comes first, then x
+    np.testing.assert_allclose(model_matrix(angle_x=90, angle_y=90) @ [1, 0, 0, 1], [0, 1, 0, 1], atol=1e-12)
+    np.testing.assert_allclose(model_matrix((1, 2, 3), 2), translate(1, 2, 3) @ scale(2))
+
+
+def test_gl_matrix_is_column_major_float32():
+    matrix = gl_matrix(translate(1, 2, 3))
+    assert matrix.dtype == np.float32 and matrix.flags.c_contiguous
+    np.testing.assert_array_equal(matrix.reshape(-1)[12:15], [1, 2, 3])
+    for mode in range(5):
+        np.testing.assert_allclose(gl_matrix(project(mode)).T, project(mode), rtol=1e-6, atol=1e-6)
@@ -0,0 +1,310 @@
+"""
+Baked texture cache.
+
+The first load of an image decodes it once, builds the whole mip chain on the
+CPU (box filter, like glGenerateMipmap) and writes every level to
+.py3d_cache/textures, either as raw RGBA8 or block-compressed:
+- BC1 (DXT1, 4 bits per pixel) for opaque images
+- BC3 (DXT5, 8 bits per pixel) when there is alpha
+Later loads memory-map that file and hand the levels straight to GL, so there
+is no image decode and no mip generation, and compressed textures take 1/8
+(BC1) or 1/4 (BC3) of the VRAM of RGBA8.
+
+Entries are keyed by the image's content hash, the format and the format
+version. The least recently used files are deleted once the cache grows past
+its size limit. `viewer.py bake` fills the cache ahead of time; the texture
+manager bakes on a background thread instead, see TextureManager.
+
+The BC encoder is a plain vectorized range fit along each block's principal
+axis, nowhere near a real offline compressor but good enough for viewing.
+"""
+import hashlib
+import os
+import numpy as np
+
+CACHE_DIR = os.path.join(".py3d_cache", "textures")
+MAX_CACHE_BYTES = 1024 * 1024 * 1024
+FORMAT_VERSION = 1
+
+RGBA8 = "rgba8"
+BC1 = "bc1"
+BC3 = "bc3"
+FORMAT_CODES = {RGBA8: 0, BC1: 1, BC3: 3}
+BLOCK_BYTES = {BC1: 8, BC3: 16}
+
+_MAGIC = b"PY3DTEX\0"
+_HEADER_SIZE = 32  # magic, version, format, width, height, level count, padding
+_ENCODE_BLOCKS = 1 << 16  # blocks encoded per batch, bounds the temporary arrays
+
+
+def level_sizes(width, height):
+    """(width, height) of every mip level, down to 1x1"""
+    sizes = [(width, height)]
+    while width > 1 or height > 1:
+        width, height = max(width // 2, 1), max(height // 2, 1)
+        sizes.append((width, height))
+    return sizes
+
+
+def level_bytes(fmt, width, height):
+    if fmt == RGBA8:
+        return width * height * 4
+    return ((width + 3) // 4) * ((height + 3) // 4) * BLOCK_BYTES[fmt]
+
+
+class BakedTexture:
+    """Mip levels of one texture, back to back in data (usually a memory map of the cache file)"""
+
+    def __init__(self, fmt, width, height, data, level_count=None):
+        self.format = fmt
+        self.width = width
+        self.height = height
+        self.data = data
+        self.levels = []  # (width, height, offset, size)
+        offset = 0
+        for w, h in level_sizes(width, height)[:level_count]:
+            size = level_bytes(fmt, w, h)
+            self.levels.append((w, h, offset, size))
+            offset += size
+        self.nbytes = offset
+
+    def level_data(self, level):
+        _, _, offset, size = self.levels[level]
+        return self.data[offset:offset + size]
+
+
+def _pack_565(colors):
+    """(..., 3) 0-255 floats -> (..., ) uint16 RGB565"""
+    r = np.rint(colors[..., 0] * (31 / 255)).astype(np.uint16)
+    g = np.rint(colors[..., 1] * (63 / 255)).astype(np.uint16)
+    b = np.rint(colors[..., 2] * (31 / 255)).astype(np.uint16)
+    return (r << 11) | (g << 5) | b
+
+
+def _unpack_565(packed):
+    r, g, b = (packed >> 11) & 31, (packed >> 5) & 63, packed & 31
+    return np.stack([(r << 3) | (r >> 2), (g << 2) | (g >> 4), (b << 3) | (b >> 2)], axis=-1).astype(np.float32)
+
+
+def _encode_colors(pixels):
+    """
+    BC1 color blocks, always in 4-color mode.
+    :param pixels: (N, 16, 3) float32 0-255, row-major 4x4 blocks
+    :return: (N, 8) uint8
+    """
+    mean = pixels.mean(axis=1, keepdims=True)
+    centered = pixels - mean
+    # Principal axis by a few power iterations, starting from the luminance-ish diagonal
+    covariance = np.matmul(centered.transpose(0, 2, 1), centered)
+    axis = np.ones((len(pixels), 3, 1), dtype=np.float32)
+    for _ in range(4):
+        axis = np.matmul(covariance, axis)
+        axis /= np.maximum(np.abs(axis).max(axis=1, keepdims=True), 1e-12)
+    axis /= np.maximum(np.sqrt((axis * axis).sum(axis=1, keepdims=True)), 1e-12)
+    t = np.matmul(centered, axis)[:, :, 0]
+    low, high = t.min(axis=1), t.max(axis=1)
+    inset = (high - low) / 16  # pull the ends in a little, the palette covers the middle better
+    end0 = np.clip(mean[:, 0] + (high - inset)[:, None] * axis[:, :, 0], 0, 255)
+    end1 = np.clip(mean[:, 0] + (low + inset)[:, None] * axis[:, :, 0], 0, 255)
+
+    c0, c1 = _pack_565(end0), _pack_565(end1)
+    swap = c0 < c1  # 4-color mode needs c0 > c1
+    c0, c1 = np.where(swap, c1, c0), np.where(swap, c0, c1)
+    p0, p1 = _unpack_565(c0), _unpack_565(c1)
+    # The palette is 4 evenly spaced points from p0 to p1, so the nearest one follows from the projection
+    line = p1 - p0
+    length = np.maximum((line * line).sum(axis=1), 1e-12)
+    steps = np.matmul(pixels - p0[:, None, :], line[:, :, None])[:, :, 0] / length[:, None]
+    steps = np.clip(np.rint(steps * 3), 0, 3).astype(np.uint32)
+    codes = np.array([0, 2, 3, 1], dtype=np.uint32)[steps]  # p0, 2/3 p0 + 1/3 p1, 1/3 p0 + 2/3 p1, p1
+    codes[c0 == c1] = 0  # one color (3-color mode, where code 3 would be black)
+    bits = (codes << (2 * np.arange(16, dtype=np.uint32))).sum(axis=1, dtype=np.uint32)
+
+    out = np.empty((len(pixels), 8), dtype=np.uint8)
+    out[:, 0:2] = c0.astype("<u2").view(np.uint8).reshape(-1, 2)
+    out[:, 2:4] = c1.astype("<u2").view(np.uint8).reshape(-1, 2)
+    out[:, 4:8] = bits.astype("<u4").view(np.uint8).reshape(-1, 4)
+    return out
+
+
+def _encode_alpha(alpha):
+    """
+    BC3 alpha blocks, in 8-value mode.
+    :param alpha: (N, 16) float32 0-255
+    :return: (N, 8) uint8
+    """
+    a0 = alpha.max(axis=1).round()
+    a1 = alpha.min(axis=1).round()
+    weights = np.array([0, 7, 1, 2, 3, 4, 5, 6], dtype=np.float32) / 7  # code -> share of a1
+    palette = a0[:, None] * (1 - weights) + a1[:, None] * weights
+    codes = np.abs(alpha[:, :, None] - palette[:, None, :]).argmin(axis=2).astype(np.uint64)
+    codes[a0 == a1] = 0
+    bits = (codes << (3 * np.arange(16, dtype=np.uint64))).sum(axis=1, dtype=np.uint64)
+
+    out = np.empty((len(alpha), 8), dtype=np.uint8)
+    out[:, 0] = a0
+    out[:, 1] = a1
+    out[:, 2:8] = bits.astype("<u8").view(np.uint8).reshape(-1, 8)[:, :6]
+    return out
+
+
+class BakeCancelled(Exception):
+    pass
+
+
+def compress(rgba, fmt, cancel=None):
+    """
+    Block-compress one image.
+    :param rgba: (height, width, 4) uint8, first row first
+    :param cancel: Optional threading.Event, checked between batches, raises BakeCancelled once it's set.
+    :return: bytes, blocks in row-major order
+    """
+    height, width = rgba.shape[:2]
+    # Partial blocks at the edges repeat the last row/column
+    padded = np.pad(rgba, ((0, -height % 4), (0, -width % 4), (0, 0)), mode="edge")
+    rows, columns = padded.shape[0] // 4, padded.shape[1] // 4
+    blocks = padded.reshape(rows, 4, columns, 4, 4).transpose(0, 2, 1, 3, 4).reshape(-1, 16, 4)
+    out = []
+    for start in range(0, len(blocks), _ENCODE_BLOCKS):
+        if cancel is not None and cancel.is_set():
+            raise BakeCancelled()
+        batch = blocks[start:start + _ENCODE_BLOCKS].astype(np.float32)
+        colors = _encode_colors(batch[:, :, :3])
+        out.append(colors if fmt == BC1 else np.concatenate([_encode_alpha(batch[:, :, 3]), colors], axis=1))
+    return np.concatenate(out).tobytes()
+
+
+def bake_image(image, compression=True, max_levels=None, cancel=None):
+    """
+    Build the mip chain of a PIL image.
+    :param image: RGBA, bottom row first (as GL wants it)
+    :param compression: Block-compress the levels (BC1, or BC3 for images with alpha).
+    :param max_levels: Stop the chain early (texture atlases, so tiles don't bleed into each other).
+    :param cancel: See compress().
+    :return: BakedTexture holding the levels in memory
+    """
+    from PIL import Image
+    opaque = image.getextrema()[3][0] == 255
+    fmt = (BC1 if opaque else BC3) if compression else RGBA8
+    width, height = image.size
+    levels = []
+    for size in level_sizes(width, height)[:max_levels]:
+        if size != image.size:
+            image = image.resize(size, Image.BOX)  # from the previous level, same as a 2x2 average
+        levels.append(image.tobytes() if fmt == RGBA8 else compress(np.asarray(image), fmt, cancel))
+    return BakedTexture(fmt, width, height, np.frombuffer(b"".join(levels), dtype=np.uint8), len(levels))
+
+
+def bake(path, compression=True, cancel=None):
+    """Decode an image file and build its mip chain, see bake_image()"""
+    from PIL import Image
+    with Image.open(path) as image:
+        image = image.transpose(Image.FLIP_TOP_BOTTOM).convert("RGBA")
+    return bake_image(image, compression, cancel=cancel)
+
+
+def file_digest(path):
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def cache_key(digest, compression):
+    return hashlib.blake2b(f"{digest}:{compression}:{FORMAT_VERSION}".encode(), digest_size=16).hexdigest()
+
+
+def write_texture(path, baked):
+    """Write a baked texture to path (atomically, via a temp file)"""
+    header = np.zeros(_HEADER_SIZE, dtype=np.uint8)
+    header[:8] = np.frombuffer(_MAGIC, dtype=np.uint8)
+    header[8:24] = np.frombuffer(np.array([FORMAT_VERSION, FORMAT_CODES[baked.format], baked.width, baked.height],
+                                          dtype='<u4').tobytes(), dtype=np.uint8)
+    header[24:28] = np.frombuffer(np.uint32(len(baked.levels)).astype('<u4').tobytes(), dtype=np.uint8)
+    tmp = f"{path}.{os.getpid()}.tmp"  # decode workers and other viewers may bake at the same time
+    with open(tmp, 'wb') as f:
+        f.write(header.tobytes())
+        f.write(baked.data)
+    os.replace(tmp, path)
+
+
+def read_texture(path):
+    """
+    Memory-map a baked texture file.
+    :return: BakedTexture whose data is a read-only view of the file, or None if it is corrupt or outdated.
+    """
+    if os.path.getsize(path) < _HEADER_SIZE:
+        return None
+    data = np.memmap(path, dtype=np.uint8, mode='r')
+    if data[:8].tobytes() != _MAGIC:
+        return None
+    version, code, width, height, level_count = (int(n) for n in data[8:28].view('<u4'))
+    formats = {code: fmt for fmt, code in FORMAT_CODES.items()}
+    if version != FORMAT_VERSION or code not in formats:
+        return None
+    baked = BakedTexture(formats[code], width, height, data[_HEADER_SIZE:], level_count)
+    if len(baked.levels) != level_count or baked.nbytes != len(data) - _HEADER_SIZE:
+        return None
+    return baked
+
+
+def _evict(cache_dir, keep, max_bytes):
+    """Delete the least recently used files until the cache fits in max_bytes"""
+    files = []
+    for name in os.listdir(cache_dir):
+        if name.endswith(".tex"):
+            stat = os.stat(os.path.join(cache_dir, name))
+            files.append((stat.st_mtime, stat.st_size, name))
+    total = sum(size for _, size, _ in files)
+    for _, size, name in sorted(files):
+        if total <= max_bytes:
+            break
+        if name != keep:
+            os.remove(os.path.join(cache_dir, name))
+            total -= size
+
+
+def load_baked(key, make, cache_dir=CACHE_DIR, max_bytes=MAX_CACHE_BYTES):
+    """
+    Return the baked texture cached under key, calling make() to bake it on a miss.
+    :param cache_dir: None bakes every time.
+    """
+    if cache_dir is None:
+        return make()
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+    except OSError as e:
+        print(f"Texture cache unavailable: {e}")
+        return make()
+    name = key + ".tex"
+    cached = os.path.join(cache_dir, name)
+
+    baked = read_texture(cached) if os.path.exists(cached) else None
+    if baked is not None:
+        os.utime(cached)  # recently used, see _evict()
+        return baked
+    baked = make()
+    try:
+        write_texture(cached, baked)
+        _evict(cache_dir, name, max_bytes)
+    except OSError as e:
+        print(f"Could not write texture cache: {e}")
+    return baked
+
+
+def load_texture(path, compression=True, cache_dir=CACHE_DIR, max_bytes=MAX_CACHE_BYTES, cancel=None):
+    """
+    Return the baked mip chain of an image, baking and caching it on a miss. Safe to call from worker threads.
+    :param compression: Whether the levels should be block-compressed, part of the cache key.
+    :param cancel: See compress().
+    """
+    key = cache_key(file_digest(path), compression)
+    return load_baked(key, lambda: bake(path, compression, cancel), cache_dir, max_bytes)
+
+
+def is_cached(path, compression=True, cache_dir=CACHE_DIR):
+    """Whether load_texture() would find the image in the cache (without validating the file)"""
+    if cache_dir is None:
+        return False
+    return os.path.exists(os.path.join(cache_dir, cache_key(file_digest(path), compression) + ".tex"))
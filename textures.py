@@ -0,0 +1,313 @@
+"""
+Texture manager.
+
+Textures are keyed by path + mtime, so asking for a texture that is already
+resident is just a dictionary lookup and the caller only has to bind it. Decoded
+pixels are kept in a CPU-side cache as well, and the least recently used GL
+textures are deleted once their estimated VRAM use goes over the budget.
+Textures that are still drawn with have to be pinned with acquire() (and
+handed back with release()), eviction skips them.
+
+request()/poll() load textures without blocking the render thread: images are
+decoded on a worker thread pool, and poll() (called once per frame on the GL
+thread) uploads finished ones through a pixel buffer object.
+
+Images go through the baked texture cache (see texture_cache.py), so after the
+first load there is no decode and no glGenerateMipmap: every mip level is
+uploaded as is, block-compressed when the GL supports S3TC. Baking is several
+times slower than a plain decode, so on a miss the manager uploads the decoded
+image right away (mipmaps from GL) and bakes it on a background thread for the
+next load.
+"""
+import ctypes
+import os
+import threading
+from collections import Counter, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from OpenGL.GL import *
+# The raw entry point instead of the wrapper, which measures its data argument and so can't take an offset
+# into a pixel buffer object. It keeps the GL name so GLStats counts it like any other call.
+from OpenGL.raw.GL.VERSION.GL_1_3 import glCompressedTexImage2D
+import texture_cache
+from texture_cache import BakedTexture, RGBA8, BC1, BC3
+
+DEFAULT_VRAM_BUDGET = 256 * 1024 * 1024
+DEFAULT_CPU_BUDGET = 256 * 1024 * 1024
+COMPRESSION_EXTENSION = "GL_EXT_texture_compression_s3tc"
+
+GL_FORMATS = {BC1: 0x83F1, BC3: 0x83F3}  # GL_COMPRESSED_RGBA_S3TC_DXT1_EXT, GL_COMPRESSED_RGBA_S3TC_DXT5_EXT
+
+
+def decode_image(path):
+    """
+    Decode an image file for upload.
+    :return: (width, height, RGBA bytes flipped bottom-up for OpenGL)
+    """
+    from PIL import Image  # on first use, most runs never decode anything before the first frame
+    with Image.open(path) as image:
+        image = image.transpose(Image.FLIP_TOP_BOTTOM)
+        return image.width, image.height, image.convert("RGBA").tobytes()
+
+
+def load_image(path, compression=True, cache_dir=texture_cache.CACHE_DIR, bake_later=None):
+    """
+    Everything upload_texture() needs for an image file, safe to call from worker threads.
+    :param cache_dir: Baked texture cache, None to decode the image every time (mipmaps are then made by GL).
+    :param bake_later: Called as bake_later(path, compression) on a cache miss instead of baking,
+                       the image is then only decoded.
+    :return: BakedTexture
+    """
+    if bake_later is not None and not texture_cache.is_cached(path, compression, cache_dir):
+        if cache_dir is not None:
+            bake_later(path, compression)
+        cache_dir = None
+    if cache_dir is None:
+        width, height, pixels = decode_image(path)
+        return BakedTexture(RGBA8, width, height, np.frombuffer(pixels, dtype=np.uint8), level_count=1)
+    return texture_cache.load_texture(path, compression, cache_dir)
+
+
+def has_extension(name):
+    if bool(glGetStringi):
+        return any(glGetStringi(GL_EXTENSIONS, i).decode() == name for i in range(glGetIntegerv(GL_NUM_EXTENSIONS)))
+    return name in (glGetString(GL_EXTENSIONS) or b"").decode().split()
+
+
+def upload_texture(baked, mipmaps=True, pbo=None):
+    """
+    Create a GL texture from a BakedTexture, leaves it bound.
+    Every level it has is uploaded as is, a single level gets the rest of its mip chain from glGenerateMipmap.
+    :param pbo: Optional pixel buffer object to stage the pixels in, so the driver
+                can copy them to the texture without stalling on client memory.
+    """
+    texture = glGenTextures(1)
+    glBindTexture(GL_TEXTURE_2D, texture)
+    if pbo is not None:
+        glBindBuffer(GL_PIXEL_UNPACK_BUFFER, pbo)
+        # Orphan the previous contents so we never wait for an upload still in flight
+        glBufferData(GL_PIXEL_UNPACK_BUFFER, baked.nbytes, None, GL_STREAM_DRAW)
+        ctypes.memmove(glMapBuffer(GL_PIXEL_UNPACK_BUFFER, GL_WRITE_ONLY), baked.data.ctypes.data, baked.nbytes)
+        glUnmapBuffer(GL_PIXEL_UNPACK_BUFFER)
+    for level, (width, height, offset, size) in enumerate(baked.levels):
+        if pbo is not None:
+            pixels = ctypes.c_void_p(offset)
+        else:
+            pixels = np.ascontiguousarray(baked.level_data(level))
+        if baked.format == RGBA8:
+            glTexImage2D(GL_TEXTURE_2D, level, GL_RGBA, width, height, 0, GL_RGBA, GL_UNSIGNED_BYTE, pixels)
+        else:
+            if pbo is None:
+                pixels = pixels.ctypes.data_as(ctypes.c_void_p)
+            glCompressedTexImage2D(GL_TEXTURE_2D, level, GL_FORMATS[baked.format], width, height, 0, size, pixels)
+    if pbo is not None:
+        glBindBuffer(GL_PIXEL_UNPACK_BUFFER, 0)
+    if len(baked.levels) > 1:
+        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAX_LEVEL, len(baked.levels) - 1)
+        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_LINEAR_MIPMAP_LINEAR)
+    elif mipmaps:
+        glGenerateMipmap(GL_TEXTURE_2D)
+        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_LINEAR_MIPMAP_LINEAR)
+    else:
+        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_LINEAR)
+    glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_LINEAR)
+    return texture
+
+
+def texture_bytes(baked, mipmaps=True):
+    """Estimated VRAM use, a generated mip chain adds about a third"""
+    if len(baked.levels) > 1 or not mipmaps:
+        return baked.nbytes
+    return baked.nbytes * 4 // 3
+
+
+def texture_key(path):
+    path = os.path.abspath(path)
+    return path, os.stat(path).st_mtime_ns
+
+
+class TextureManager:
+    def __init__(self, vram_budget=DEFAULT_VRAM_BUDGET, cpu_budget=DEFAULT_CPU_BUDGET, decode_workers=2):
+        self.vram_budget = vram_budget
+        self.cpu_budget = cpu_budget
+        self.decode_workers = decode_workers
+        self.resident = OrderedDict()  # key -> (texture id, bytes), least recently used first
+        self.pins = Counter()          # texture id -> acquire() count, pinned textures are never evicted
+        self.decoded = OrderedDict()   # key -> BakedTexture
+        self.pending = {}              # key -> future of a background decode
+        self.baking = set()            # (path, compression) of the cache misses baked in the background
+        self.bake_queue = []           # the ones not started yet, see _start_bakes()
+        self.vram_used = 0
+        self.cpu_used = 0
+        self.executor = None
+        self.baker = None              # a single thread, so bakes never hold up the decode workers
+        self.cancel_bakes = threading.Event()
+        self.bake_lock = threading.Lock()  # _bake_later() runs on the decode workers
+        self.pbo = None
+        self.cache_dir = texture_cache.CACHE_DIR  # None = decode every time
+        self.compression = "auto"  # "bc" (BC1/BC3), "none" (RGBA8) or "auto" (bc when the GL has S3TC)
+        self.compressed = None
+
+    def get(self, path):
+        """Return the GL texture for path, decoding and uploading it only if it isn't resident"""
+        key = texture_key(path)
+        if key in self.resident:
+            self.resident.move_to_end(key)
+            return self.resident[key][0]
+        return self._upload(key, self.pixels(key))
+
+    def request(self, path):
+        """
+        Non-blocking get(): returns the texture if it is resident (or only an upload
+        away), otherwise starts decoding it in the background and returns None.
+        """
+        key = texture_key(path)
+        if key in self.resident or key in self.decoded:
+            return self.get(path)
+        if key not in self.pending:
+            if self.executor is None:
+                self.executor = ThreadPoolExecutor(max_workers=self.decode_workers)
+            self.pending[key] = self.executor.submit(load_image, key[0], self.use_compression(), self.cache_dir,
+                                                     self._bake_later)
+        return None
+
+    def acquire(self, texture):
+        """
+        Pin a texture, it won't be evicted until it's released as many times.
+        :return: texture, so get() calls can be wrapped
+        """
+        self.pins[texture] += 1
+        return texture
+
+    def release(self, texture):
+        """Unpin a texture from acquire(), it can be evicted again once nothing holds it"""
+        self.pins[texture] -= 1
+        if self.pins[texture] <= 0:
+            del self.pins[texture]
+            self._evict_textures()
+
+    def poll(self):
+        """
+        Upload the background decodes that finished, must run on the GL thread.
+        :return: list of (absolute path, texture id or None if decoding failed)
+        """
+        finished = []
+        for key, future in list(self.pending.items()):
+            if not future.done():
+                continue
+            del self.pending[key]
+            try:
+                decoded = future.result()
+            except Exception as e:
+                print(f"An error occurred while loading the texture: {e}")
+                finished.append((key[0], None))
+                continue
+            self._remember(key, decoded)
+            finished.append((key[0], self._upload(key, decoded, evict=False)))
+        # After all uploads, none of this frame's textures goes before the caller could pin it
+        self._evict_textures(keep={key for key in self.resident if key[0] in {path for path, _ in finished}})
+        return finished
+
+    def _upload(self, key, decoded, evict=True):
+        self._forget_stale(key)
+        if self.pbo is None:
+            self.pbo = glGenBuffers(1)
+        texture = upload_texture(decoded, pbo=self.pbo)
+        size = texture_bytes(decoded)
+        self.resident[key] = (texture, size)
+        self.vram_used += size
+        if evict:
+            self._evict_textures(keep={key})
+        self._start_bakes()
+        return texture
+
+    def use_compression(self):
+        """Whether images are block-compressed, decided on the GL thread the first time it's needed"""
+        if self.compressed is None:
+            supported = has_extension(COMPRESSION_EXTENSION)
+            if self.compression == "bc" and not supported:
+                print(f"{COMPRESSION_EXTENSION} unavailable, textures stay uncompressed")
+            self.compressed = supported and self.compression != "none"
+        return self.compressed
+
+    def pixels(self, key):
+        """Decoded pixels (a BakedTexture) for a texture key, from the CPU cache when possible"""
+        if key in self.decoded:
+            self.decoded.move_to_end(key)
+            return self.decoded[key]
+        decoded = load_image(key[0], self.use_compression(), self.cache_dir, self._bake_later)
+        self._remember(key, decoded)
+        return decoded
+
+    def _bake_later(self, path, compression):
+        """Fill the baked texture cache for an image in the background, see load_image()"""
+        with self.bake_lock:
+            if (path, compression) not in self.baking:
+                self.baking.add((path, compression))
+                self.bake_queue.append((path, compression))
+
+    def _start_bakes(self):
+        """Hand the queued bakes to the baker thread, once the textures they're for are uploaded"""
+        with self.bake_lock:
+            if self.bake_queue and self.baker is None:
+                self.baker = ThreadPoolExecutor(max_workers=1)
+            for path, compression in self.bake_queue:
+                self.baker.submit(self._bake, path, compression, self.cache_dir, self.cancel_bakes)
+            self.bake_queue.clear()
+
+    @staticmethod
+    def _bake(path, compression, cache_dir, cancel):
+        try:
+            texture_cache.load_texture(path, compression, cache_dir, cancel=cancel)
+        except texture_cache.BakeCancelled:
+            pass
+        except Exception as e:
+            print(f"Could not bake {path}: {e}")
+
+    def _remember(self, key, decoded):
+        self.decoded[key] = decoded
+        self.cpu_used += decoded.nbytes
+        while self.cpu_used > self.cpu_budget and len(self.decoded) > 1:
+            _, forgotten = self.decoded.popitem(last=False)
+            self.cpu_used -= forgotten.nbytes
+
+    def _forget_stale(self, key):
+        """Drop everything cached for an older version (mtime) of the same file"""
+        for old in [k for k in self.resident if k[0] == key[0] and k != key and self.resident[k][0] not in self.pins]:
+            self._delete(old)  # pinned ones are evicted later, once released
+        for old in [k for k in self.decoded if k[0] == key[0] and k != key]:
+            self.cpu_used -= self.decoded.pop(old).nbytes
+
+    def _evict_textures(self, keep=()):
+        for key in list(self.resident):
+            if self.vram_used <= self.vram_budget:
+                break
+            if key not in keep and self.resident[key][0] not in self.pins:
+                self._delete(key)
+
+    def _delete(self, key):
+        texture, size = self.resident.pop(key)
+        glDeleteTextures(1, [texture])
+        self.vram_used -= size
+
+    def release_all(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
+        with self.bake_lock:
+            if self.baker is not None:
+                self.cancel_bakes.set()  # stops a running bake at its next batch, so exiting doesn't wait for it
+                self.baker.shutdown(wait=False, cancel_futures=True)
+                self.baker = None
+                self.cancel_bakes = threading.Event()
+            self.baking.clear()
+            self.bake_queue.clear()
+        self.pending.clear()
+        for key in list(self.resident):
+            self._delete(key)
+        if self.pbo is not None:
+            glDeleteBuffers(1, [self.pbo])
+            self.pbo = None
+        self.decoded.clear()
+        self.cpu_used = 0
+        self.pins.clear()
@@ -0,0 +1,109 @@
+"""
+Transform matrices in NumPy.
+
+Same math as the fixed-function calls they replace (gluPerspective, glOrtho,
+glFrustum, glTranslatef, glRotatef, glScalef), as row-major 4x4 float64 arrays
+acting on column vectors: clip = projection @ modelview @ point. Nothing here
+touches GL, so the view state can be built and checked in plain Python.
+gl_matrix() converts to the column-major float32 layout GL loads and
+glGetFloatv returns.
+"""
+import math
+import numpy as np
+
+NEAR = 0.1
+FAR = 50.0
+ORTHO_EXTENT = 2.0
+
+# Oblique shear, y' = y + 0.5 x
+OBLIQUE_SHEAR = np.array([
+    [1, 0, 0, 0],
+    [0.5, 1, 0, 0],
+    [0, 0, 1, 0],
+    [0, 0, 0, 1],
+], dtype=np.float64)
+
+
+def perspective(fov_y, aspect, near=NEAR, far=FAR):
+    """gluPerspective, fov_y in degrees"""
+    f = 1.0 / math.tan(math.radians(fov_y) / 2)
+    return np.array([
+        [f / aspect, 0, 0, 0],
+        [0, f, 0, 0],
+        [0, 0, (far + near) / (near - far), 2 * far * near / (near - far)],
+        [0, 0, -1, 0],
+    ], dtype=np.float64)
+
+
+def ortho(left, right, bottom, top, near=NEAR, far=FAR):
+    """glOrtho"""
+    return np.array([
+        [2 / (right - left), 0, 0, -(right + left) / (right - left)],
+        [0, 2 / (top - bottom), 0, -(top + bottom) / (top - bottom)],
+        [0, 0, -2 / (far - near), -(far + near) / (far - near)],
+        [0, 0, 0, 1],
+    ], dtype=np.float64)
+
+
+def frustum(left, right, bottom, top, near=NEAR, far=FAR):
+    """glFrustum"""
+    return np.array([
+        [2 * near / (right - left), 0, (right + left) / (right - left), 0],
+        [0, 2 * near / (top - bottom), (top + bottom) / (top - bottom), 0],
+        [0, 0, -(far + near) / (far - near), -2 * far * near / (far - near)],
+        [0, 0, -1, 0],
+    ], dtype=np.float64)
+
+
+def translate(x, y, z):
+    matrix = np.eye(4)
+    matrix[:3, 3] = x, y, z
+    return matrix
+
+
+def scale(x, y=None, z=None):
+    """Uniform when only x is given"""
+    return np.diag([x, x if y is None else y, x if z is None else z, 1.0])
+
+
+def rotate(angle, x, y, z):
+    """glRotatef, angle in degrees around the axis (x, y, z)"""
+    axis = np.array([x, y, z], dtype=np.float64)
+    axis /= np.linalg.norm(axis)
+    c, s = math.cos(math.radians(angle)), math.sin(math.radians(angle))
+    cross = np.array([[0, -axis[2], axis[1]], [axis[2], 0, -axis[0]], [-axis[1], axis[0], 0]])
+    matrix = np.eye(4)
+    matrix[:3, :3] = c * np.eye(3) + s * cross + (1 - c) * np.outer(axis, axis)
+    return matrix
+
+
+def projection_matrix(mode, aspect=1024 / 768, distance=0.0, fov=60, near=NEAR, far=FAR):
+    """
+    Projection of a view mode, the camera pulled back by distance.
+    Every mode keeps its vertical extent and widens (or narrows) the horizontal one by aspect.
+    :param mode: 0 = Perspective, 1 = Ortho, 2 = Isometric, 3 = Oblique, 4 = Fisheye
+    """
+    pull_back = translate(0, 0, -distance)
+    box = ortho(-ORTHO_EXTENT * aspect, ORTHO_EXTENT * aspect, -ORTHO_EXTENT, ORTHO_EXTENT, near, far)
+    if mode == 0:
+        return perspective(fov, aspect, near, far) @ pull_back
+    if mode == 1:
+        return box @ pull_back
+    if mode == 2:
+        return box @ pull_back @ rotate(35.26, 1, 0, 0) @ rotate(45, 0, 1, 0)
+    if mode == 3:
+        return box @ pull_back @ OBLIQUE_SHEAR
+    if mode == 4:
+        # Wide frustum for distortion, at a fixed short distance
+        return frustum(-aspect, aspect, -1, 1, near, far) @ translate(0, 0, -2)
+    return np.eye(4)
+
+
+def model_matrix(pan=(0.0, 0.0, 0.0), zoom=1.0, angle_x=0.0, angle_y=0.0):
+    """The viewer's object transform: pan, then zoom, then rotate around x and y"""
+    return translate(*pan) @ scale(zoom) @ rotate(angle_x, 1, 0, 0) @ rotate(angle_y, 0, 1, 0)
+
+
+def gl_matrix(matrix):
+    """Column-major float32 copy, for glLoadMatrixf/glMultMatrixf and uniform buffers"""
+    return np.ascontiguousarray(np.asarray(matrix).T, dtype=np.float32)
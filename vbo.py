@@ -0,0 +1,136 @@
+"""
+Indexed vertex buffer rendering.
+
+Positions and texture coordinates are interleaved into one vertex buffer and
+the triangles go into an element buffer, so a whole mesh is drawn with a single
+glDrawElements call no matter how many triangles it has.
+
+Huge meshes can be streamed instead: the buffers are allocated empty and
+upload() fills them a chunk at a time with glBufferSubData, within a time budget
+per frame. Meshes come out of mesh_optimizer with their vertices numbered in
+order of first use, so the first n triangles only need a prefix of the vertex
+buffer. draw() draws every triangle whose vertices have arrived, the mesh fills
+in while the viewer keeps running.
+"""
+import ctypes
+import time
+import numpy as np
+from OpenGL.GL import *
+
+VERTEX_STRIDE = 5 * 4  # x, y, z, u, v as float32
+UPLOAD_CHUNK = 1 << 18  # bytes per glBufferSubData call when streaming
+
+
+def interleave(positions, uvs):
+    """Pack (N, 3) positions and (N, 2) uvs into one (N, 5) float32 array"""
+    vertices = np.empty((len(positions), 5), dtype=np.float32)
+    vertices[:, :3] = positions
+    vertices[:, 3:] = uvs
+    return vertices
+
+
+class MeshBuffer:
+    def __init__(self, positions, uvs, indices, stream=False):
+        """
+        :param stream: Allocate the buffers empty and leave the data to upload(), nothing is drawn before that
+        """
+        self.index_count = int(np.size(indices))
+        self.vbo, self.ebo = glGenBuffers(2)
+        vertices = interleave(positions, uvs)
+        indices = np.ascontiguousarray(indices, dtype=np.uint32).reshape(-1)
+
+        glBindBuffer(GL_ARRAY_BUFFER, self.vbo)
+        glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, self.ebo)
+        if stream:
+            glBufferData(GL_ARRAY_BUFFER, vertices.nbytes, None, GL_STATIC_DRAW)
+            glBufferData(GL_ELEMENT_ARRAY_BUFFER, indices.nbytes, None, GL_STATIC_DRAW)
+            self._vertices = vertices.view(np.uint8).reshape(-1)
+            self._indices = indices
+            # Highest vertex used by the first n triangles, the drawable triangles for a vertex prefix are a search away
+            self._needed = np.maximum.accumulate(indices.reshape(-1, 3).max(axis=1)) if len(indices) else indices
+            self.uploaded_vertices = self.uploaded_indices = 0
+            self.drawable = 0  # indices, whole triangles whose vertices are all uploaded
+        else:
+            glBufferData(GL_ARRAY_BUFFER, vertices, GL_STATIC_DRAW)
+            glBufferData(GL_ELEMENT_ARRAY_BUFFER, indices, GL_STATIC_DRAW)
+            self._vertices = self._indices = None
+            self.drawable = self.index_count
+
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+        glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, 0)
+
+    @property
+    def complete(self):
+        return self._vertices is None
+
+    @property
+    def progress(self):
+        """Uploaded fraction of the mesh's bytes"""
+        if self.complete:
+            return 1.0
+        total = len(self._vertices) + self._indices.nbytes
+        return (self.uploaded_vertices * VERTEX_STRIDE + self.uploaded_indices * 4) / max(total, 1)
+
+    def upload(self, deadline):
+        """
+        Stream the next chunks of a stream=True buffer, at least one.
+        :param deadline: time.perf_counter() value to stop at
+        """
+        if self.complete:
+            return
+        vertex_total = len(self._vertices) // VERTEX_STRIDE
+        vertex_chunk = max(UPLOAD_CHUNK // VERTEX_STRIDE, 1)
+        index_chunk = max(UPLOAD_CHUNK // 12, 1) * 3  # whole triangles
+        while True:
+            started = time.perf_counter()
+            # Feed whichever buffer holds the drawable count back
+            if self.uploaded_indices < self.index_count and (
+                    self.uploaded_vertices == vertex_total or self.drawable == self.uploaded_indices):
+                start = self.uploaded_indices
+                chunk = self._indices[start:start + index_chunk]
+                glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, self.ebo)
+                glBufferSubData(GL_ELEMENT_ARRAY_BUFFER, start * 4, chunk.nbytes, chunk)
+                glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, 0)
+                self.uploaded_indices += len(chunk)
+            else:
+                start = self.uploaded_vertices
+                chunk = self._vertices[start * VERTEX_STRIDE:(start + vertex_chunk) * VERTEX_STRIDE]
+                glBindBuffer(GL_ARRAY_BUFFER, self.vbo)
+                glBufferSubData(GL_ARRAY_BUFFER, start * VERTEX_STRIDE, chunk.nbytes, chunk)
+                glBindBuffer(GL_ARRAY_BUFFER, 0)
+                self.uploaded_vertices += len(chunk) // VERTEX_STRIDE
+            triangles = int(np.searchsorted(self._needed, self.uploaded_vertices))
+            self.drawable = min(triangles * 3, self.uploaded_indices)
+
+            if self.uploaded_indices == self.index_count and self.uploaded_vertices == vertex_total:
+                self._vertices = self._indices = self._needed = None
+                self.drawable = self.index_count
+                return
+            # Stop before a chunk that would likely run past the deadline
+            now = time.perf_counter()
+            if now + (now - started) >= deadline:
+                return
+
+    def draw(self, instances=None):
+        """Draw the mesh, or `instances` copies of it with the instanced attributes already set up"""
+        if not self.drawable:
+            return
+        glBindBuffer(GL_ARRAY_BUFFER, self.vbo)
+        glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, self.ebo)
+        glEnableClientState(GL_VERTEX_ARRAY)
+        glEnableClientState(GL_TEXTURE_COORD_ARRAY)
+        glVertexPointer(3, GL_FLOAT, VERTEX_STRIDE, ctypes.c_void_p(0))
+        glTexCoordPointer(2, GL_FLOAT, VERTEX_STRIDE, ctypes.c_void_p(12))
+
+        if instances is None:
+            glDrawElements(GL_TRIANGLES, self.drawable, GL_UNSIGNED_INT, ctypes.c_void_p(0))
+        else:
+            glDrawElementsInstanced(GL_TRIANGLES, self.drawable, GL_UNSIGNED_INT, ctypes.c_void_p(0), instances)
+
+        glDisableClientState(GL_TEXTURE_COORD_ARRAY)
+        glDisableClientState(GL_VERTEX_ARRAY)
+        glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, 0)
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+
+    def delete(self):
+        glDeleteBuffers(2, [self.vbo, self.ebo])